@@ -19,12 +19,17 @@ from core.enums import AgentCapability
 from core.response_format import ResponseFormat, TaskStatus, ResponseType, QualityMetrics
 from core.function_calling import FunctionCallingAgent, ToolCall, ToolResult
 from llm_integration.enhanced_llm_client import EnhancedLLMClient
+from llm_integration.call_context import time_remaining
+from llm_integration.batch_jobs import create_batch_queue
+from llm_integration.json_repair import parse_llm_json
 from config.config import FrameworkConfig
 
 
 class RealCodeReviewAgent(FunctionCallingAgent, BaseAgent):
     """真实LLM驱动的代码审查智能体"""
     
+    llm_purpose = "review"
+    
     def __init__(self, config: FrameworkConfig = None):
         # Initialize BaseAgent first
         BaseAgent.__init__(self, 
@@ -45,6 +50,11 @@ class RealCodeReviewAgent(FunctionCallingAgent, BaseAgent):
         # 初始化LLM客户端
         self.config = config or FrameworkConfig.from_env()
         self.llm_client = EnhancedLLMClient(self.config.llm)
+        # 多文件审查的并发度（端点级限流仍由LLM客户端统一控制）
+        self.review_concurrency = 4
+        # 批处理作业队列：离线/夜间驱动程序跨多次审查累积文件审查，统一flush_batch_reviews()
+        self.batch_queue = create_batch_queue(self.llm_client)
+        self._queued_reviews: List[Tuple[str, str, asyncio.Future]] = []
         
         self.logger.info(f"🔍 真实代码审查智能体(支持Function Calling)初始化完成")
     
@@ -318,32 +328,6 @@ class RealCodeReviewAgent(FunctionCallingAgent, BaseAgent):
                 result=None,
                 error=str(e)
             )
-    async def _call_llm(self, conversation: List[Dict[str, str]]) -> str:
-        """调用LLM"""
-        # 构建完整的prompt
-        full_prompt = ""
-        system_prompt = None
-        
-        for msg in conversation:
-            if msg["role"] == "system":
-                system_prompt = msg["content"]
-            elif msg["role"] == "user":
-                full_prompt += f"User: {msg['content']}\n\n"
-            elif msg["role"] == "assistant":
-                full_prompt += f"Assistant: {msg['content']}\n\n"
-        
-        try:
-            response = await self.llm_client.send_prompt(
-                prompt=full_prompt.strip(),
-                system_prompt=system_prompt,
-                temperature=0.3,
-                max_tokens=3000
-            )
-            return response
-        except Exception as e:
-            self.logger.error(f"❌ LLM调用失败: {str(e)}")
-            raise
-    
     def get_capabilities(self) -> Set[AgentCapability]:
         return {
             AgentCapability.CODE_REVIEW,
@@ -377,13 +361,7 @@ class RealCodeReviewAgent(FunctionCallingAgent, BaseAgent):
                 return {"formatted_response": error_response}
             
             # 2. 执行详细的代码审查
-            review_results = []
-            for file_path, code_content in code_to_review.items():
-                self.logger.info(f"📝 审查文件: {file_path}")
-                review_result = await self._perform_detailed_review(
-                    file_path, code_content, enhanced_prompt
-                )
-                review_results.append(review_result)
+            review_results = await self._perform_detailed_reviews(code_to_review, enhanced_prompt)
             
             # 3. 生成综合审查报告
             comprehensive_report = await self._generate_comprehensive_report(review_results)
@@ -443,11 +421,82 @@ class RealCodeReviewAgent(FunctionCallingAgent, BaseAgent):
         
         return code_files
     
-    async def _perform_detailed_review(self, file_path: str, code_content: str, 
-                                     task_context: str) -> Dict[str, Any]:
-        """执行详细的代码审查"""
+    async def _perform_detailed_reviews(self, code_files: Dict[str, str],
+                                        task_context: str) -> List[Dict[str, Any]]:
+        """并发审查多个文件，结果顺序与输入文件顺序一致"""
+        file_items = list(code_files.items())
+        for file_path, _ in file_items:
+            self.logger.info(f"📝 审查文件: {file_path}")
+        
+        prompts = [self._build_review_request(file_path, code_content, task_context)
+                   for file_path, code_content in file_items]
+        batch_results = await self.llm_client.send_prompts_batch(
+            prompts, max_concurrency=self.review_concurrency)
+        
+        review_results = []
+        for (file_path, code_content), result in zip(file_items, batch_results):
+            if result.success:
+                review_results.append(self._parse_review_response(file_path, code_content, result.response))
+            else:
+                self.logger.warning(f"⚠️ LLM审查失败，使用基础审查: {result.error}")
+                review_results.append(self._basic_code_review(file_path, code_content))
+        return review_results
+    
+    def queue_batch_reviews(self, code_files: Dict[str, str], task_context: str = "") -> int:
+        """将文件审查加入批处理队列但不提交，返回累积的审查数
+        
+        供离线/夜间驱动程序使用：跨多个模块多次调用后，以flush_batch_reviews()
+        统一提交，使数千个文件审查合并为少量批处理作业。
+        """
+        for file_path, code_content in code_files.items():
+            future = self.batch_queue.submit_prompt(
+                self._build_review_request(file_path, code_content, task_context))
+            self._queued_reviews.append((file_path, code_content, future))
+        return len(self._queued_reviews)
+    
+    async def flush_batch_reviews(self) -> List[Dict[str, Any]]:
+        """提交所有累积的文件审查并等待作业完成，按加入顺序返回 {"file_path", "review"}"""
+        queued, self._queued_reviews = self._queued_reviews, []
+        if not queued:
+            return []
+        self.logger.info(f"📦 提交批处理审查: {len(queued)} 个文件")
+        await self.batch_queue.flush()
         
-        review_prompt = f"""
+        results = []
+        for file_path, code_content, future in queued:
+            try:
+                review = self._parse_review_response(file_path, code_content, future.result())
+            except Exception as e:
+                self.logger.warning(f"⚠️ 批处理审查失败，使用基础审查 {file_path}: {str(e)}")
+                review = self._basic_code_review(file_path, code_content)
+            results.append({"file_path": file_path, "review": review})
+        return results
+    
+    def _build_review_request(self, file_path: str, code_content: str,
+                              task_context: str) -> Dict[str, Any]:
+        """单个文件审查的请求参数（send_prompts_batch与批处理队列通用）"""
+        return {
+            "prompt": self._build_review_prompt(file_path, code_content, task_context),
+            "temperature": 0.3,
+            "max_tokens": 3000,
+            "json_mode": True,
+            "purpose": "review"
+        }
+    
+    def _parse_review_response(self, file_path: str, code_content: str,
+                               response: str) -> Dict[str, Any]:
+        """解析LLM审查结果，解析失败时回退到基础审查"""
+        try:
+            review_result = parse_llm_json(response)
+            self.logger.info(f"✅ 文件审查完成: {file_path}")
+            return review_result
+        except Exception as e:
+            self.logger.warning(f"⚠️ 审查结果解析失败，使用基础审查: {str(e)}")
+            return self._basic_code_review(file_path, code_content)
+    
+    def _build_review_prompt(self, file_path: str, code_content: str, task_context: str) -> str:
+        """构建单个文件的详细审查提示"""
+        return f"""
 你是一位拥有15年经验的资深Verilog/FPGA设计专家和代码审查员。请对以下代码进行全面、深入的审查。
 
 文件路径: {file_path}
@@ -555,22 +604,6 @@ class RealCodeReviewAgent(FunctionCallingAgent, BaseAgent):
 
 请确保审查结果专业、详细、可操作：
 """
-        
-        try:
-            response = await self.llm_client.send_prompt(
-                prompt=review_prompt,
-                temperature=0.3,
-                max_tokens=3000,
-                json_mode=True
-            )
-            
-            review_result = json.loads(response)
-            self.logger.info(f"✅ 文件审查完成: {file_path}")
-            return review_result
-            
-        except Exception as e:
-            self.logger.warning(f"⚠️ LLM审查失败，使用基础审查: {str(e)}")
-            return self._basic_code_review(file_path, code_content)
     
     def _basic_code_review(self, file_path: str, code_content: str) -> Dict[str, Any]:
         """基础代码审查（备用方案）"""
@@ -665,7 +698,8 @@ class RealCodeReviewAgent(FunctionCallingAgent, BaseAgent):
             comprehensive_report = await self.llm_client.send_prompt(
                 prompt=report_prompt,
                 temperature=0.4,
-                max_tokens=2500
+                max_tokens=2500,
+                purpose="review"
             )
             
             self.logger.info("📊 综合审查报告生成完成")
@@ -1145,23 +1179,13 @@ testbench应该：
 - 能够在iverilog中正确编译和运行
 """
             
-            response = await self.llm_client.send_prompt(
+            testbench_data = await self.llm_client.send_json_prompt(
                 prompt=testbench_prompt,
                 temperature=0.4,
                 max_tokens=4000,
-                json_mode=True
+                purpose="generation"
             )
             
-            # 清理响应中的转义字符
-            cleaned_response = response.strip()
-            if cleaned_response.startswith('```json'):
-                cleaned_response = cleaned_response[7:]
-            if cleaned_response.endswith('```'):
-                cleaned_response = cleaned_response[:-3]
-            cleaned_response = cleaned_response.strip()
-            
-            testbench_data = json.loads(cleaned_response)
-            
             # 保存测试台到文件
             testbench_file = await self._save_testbench_file(
                 module_info['module_name'], testbench_data['testbench_code']
@@ -1237,6 +1261,36 @@ testbench应该：
         self.logger.info(f"💾 测试台已保存: {testbench_file}")
         return str(testbench_file)
     
+    async def _run_subprocess(self, cmd: List[str], timeout: float,
+                              cwd: str) -> subprocess.CompletedProcess:
+        """异步运行子进程，超时时间受对话截止时间约束；超时或任务取消时终止子进程"""
+        remaining = time_remaining()
+        if remaining is not None:
+            timeout = max(0.0, min(timeout, remaining))
+        
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=cwd
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise subprocess.TimeoutExpired(cmd, timeout)
+        except asyncio.CancelledError:
+            process.kill()
+            await process.wait()
+            raise
+        
+        return subprocess.CompletedProcess(
+            cmd, process.returncode,
+            stdout.decode('utf-8', errors='replace'),
+            stderr.decode('utf-8', errors='replace')
+        )
+    
     async def _run_iverilog_simulation(self, module_file: str, module_code: str, 
                                      testbench_code: str) -> Dict[str, Any]:
         """运行iverilog仿真"""
@@ -1273,13 +1327,7 @@ testbench应该：
                 
                 self.logger.info(f"🔨 编译命令: {' '.join(compile_cmd)}")
                 
-                compile_process = subprocess.run(
-                    compile_cmd,
-                    capture_output=True,
-                    text=True,
-                    timeout=30,
-                    cwd=temp_dir
-                )
+                compile_process = await self._run_subprocess(compile_cmd, timeout=30, cwd=temp_dir)
                 
                 if compile_process.returncode != 0:
                     result['error'] = f"编译失败: {compile_process.stderr}"
@@ -1294,13 +1342,7 @@ testbench应该：
                 
                 self.logger.info(f"▶️ 仿真命令: {' '.join(sim_cmd)}")
                 
-                sim_process = subprocess.run(
-                    sim_cmd,
-                    capture_output=True,
-                    text=True,
-                    timeout=60,
-                    cwd=temp_dir
-                )
+                sim_process = await self._run_subprocess(sim_cmd, timeout=60, cwd=temp_dir)
                 
                 result['output'] = sim_process.stdout
                 result['execution_success'] = sim_process.returncode == 0
@@ -1417,14 +1459,12 @@ testbench应该：
 }}
 """
         
-        response = await self.llm_client.send_prompt(
+        return await self.llm_client.send_json_prompt(
             prompt=analysis_prompt,
             temperature=0.3,
             max_tokens=2000,
-            json_mode=True
+            purpose="simulation_analysis"
         )
-        
-        return json.loads(response)
     
     def _basic_test_analysis(self, simulation_output: str, 
                            expected_results: List[Dict[str, Any]]) -> Dict[str, Any]:
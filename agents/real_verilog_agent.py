@@ -142,14 +142,12 @@ class RealVerilogDesignAgent(BaseAgent):
 """
         
         try:
-            response = await self.llm_client.send_prompt(
+            analysis = await self.llm_client.send_json_prompt(
                 prompt=analysis_prompt,
                 temperature=0.3,
                 max_tokens=1500,
-                json_mode=True
+                purpose="analysis"
             )
-            
-            analysis = json.loads(response)
             self.logger.info(f"📋 LLM需求分析完成: {analysis.get('module_type')} - 复杂度{analysis.get('complexity')}")
             return analysis
             
@@ -299,7 +297,8 @@ class RealVerilogDesignAgent(BaseAgent):
             verilog_code = await self.llm_client.send_prompt(
                 prompt=design_prompt,
                 temperature=0.4,
-                max_tokens=4000
+                max_tokens=4000,
+                purpose="generation"
             )
             
             self.logger.info(f"✅ LLM Verilog代码生成完成: {len(verilog_code)} 字符")
@@ -373,15 +372,13 @@ class RealVerilogDesignAgent(BaseAgent):
 """
         
         try:
-            response = await self.llm_client.send_prompt(
+            quality_data = await self.llm_client.send_json_prompt(
                 prompt=quality_prompt,
                 temperature=0.2,
                 max_tokens=1500,
-                json_mode=True
+                purpose="review"
             )
             
-            quality_data = json.loads(response)
-            
             # 计算总体质量分数
             scores = [
                 quality_data.get('syntax_score', 0.8),
@@ -239,14 +239,12 @@ class VerilogDesignAgent(BaseAgent):
 """
         
         try:
-            response = await self.llm_client.send_prompt(
+            spec = await self.llm_client.send_json_prompt(
                 prompt=analysis_prompt,
                 temperature=0.3,
                 max_tokens=1500,
-                json_mode=True
+                purpose="analysis"
             )
-            
-            spec = json.loads(response)
             self.logger.info(f"📋 需求分析完成: {spec.get('module_name', 'Unknown')}")
             return spec
             
@@ -318,7 +316,8 @@ class VerilogDesignAgent(BaseAgent):
             verilog_code = await self.llm_client.send_prompt(
                 prompt=code_prompt,
                 temperature=0.4,
-                max_tokens=3000
+                max_tokens=3000,
+                purpose="generation"
             )
             
             self.logger.info(f"✅ Verilog代码生成完成 ({len(verilog_code)} 字符)")
@@ -171,14 +171,12 @@ Verilog代码:
 """
         
         try:
-            response = await self.llm_client.send_prompt(
+            analysis = await self.llm_client.send_json_prompt(
                 prompt=analysis_prompt,
                 temperature=0.2,
                 max_tokens=2000,
-                json_mode=True
+                purpose="analysis"
             )
-            
-            analysis = json.loads(response)
             analysis["source_file"] = verilog_file
             analysis["source_code"] = verilog_content
             
@@ -313,7 +311,8 @@ DUT信息:
             testbench_code = await self.llm_client.send_prompt(
                 prompt=testbench_prompt,
                 temperature=0.3,
-                max_tokens=4000
+                max_tokens=4000,
+                purpose="generation"
             )
             
             self.logger.info(f"✅ Testbench生成完成 ({len(testbench_code)} 字符)")
@@ -6,8 +6,8 @@ Configuration Management for Centralized Agent Framework
 """
 
 import os
-from dataclasses import dataclass
-from typing import Dict, Any, Optional
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional, List
 from pathlib import Path
 
 
@@ -24,6 +24,83 @@ class LLMConfig:
     retry_attempts: int = 3
     retry_delay: float = 1.0
     
+    # 连接池配置
+    connection_pool_size: int = 100
+    connections_per_host: int = 20
+    keepalive_timeout: float = 60.0
+    dns_cache_ttl: int = 300
+    
+    # 响应缓存配置（SQLite WAL，多进程共享）
+    enable_response_cache: bool = False
+    response_cache_path: str = "./output/llm_response_cache.db"
+    response_cache_ttl: int = 86400
+    response_cache_max_entries: int = 5000
+    
+    # 合并并发的相同请求（single-flight），仅对temperature为0的确定性请求生效
+    enable_request_coalescing: bool = True
+    
+    # 端点限流配置，同一端点+密钥的所有客户端共享；
+    # max_concurrent_requests为0时并发槽位数取connections_per_host，速率限制为0表示不限制
+    max_concurrent_requests: int = 0
+    requests_per_minute: int = 0
+    tokens_per_minute: int = 0
+    
+    # 排队优先级：调用类型 -> 优先级（数值越小越优先），覆盖默认的
+    # 控制面(routing/decision/analysis)=0、交互=1、批量(generation/review/simulation_analysis)=2；
+    # 并发槽位与速率令牌均按此优先级排队
+    purpose_priorities: Dict[str, int] = field(default_factory=dict)
+    
+    # 多端点池：每项为 {"base_url", "api_key", "provider", "model_name", ...}，
+    # 为空时只使用 api_base_url；失败的端点在冷却期内不参与路由
+    endpoints: List[Dict[str, Any]] = field(default_factory=list)
+    endpoint_failure_cooldown: float = 30.0
+    
+    # 端点熔断：连续N次连接错误或5xx后快速失败，冷却后放行单个探针（0表示不启用）
+    circuit_breaker_threshold: int = 5
+    circuit_breaker_cooldown: float = 30.0
+    
+    # 模型档位：档位名 -> {"model_name", "base_url"/"endpoints", "api_key", "provider"}；
+    # purpose_tiers 将调用类型（routing/decision/analysis/generation/review/
+    # simulation_analysis/function_calling）映射到档位，未映射的调用使用默认模型
+    model_tiers: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    purpose_tiers: Dict[str, str] = field(default_factory=dict)
+    
+    # Ollama模型常驻：keep_alive为时长（如"30m"）或秒数（-1为常驻，空值使用服务端默认）；
+    # warm_up_on_start启用时在协调者初始化/智能体注册（或首次请求）时于后台预加载默认模型及各档位模型
+    ollama_keep_alive: str = "30m"
+    warm_up_on_start: bool = False
+    
+    # 原生工具调用（OpenAI兼容tools/tool_calls）；关闭时使用文本工具目录+输出解析
+    native_tool_calling: bool = False
+    
+    # 对冲请求：耗时超过该端点/调用类型近期p分位仍未完成时发送副本，取先返回者
+    enable_hedging: bool = False
+    hedge_percentile: float = 95.0
+    hedge_min_samples: int = 20
+    
+    # 自适应生成上限：按调用点（智能体+调用类型）历史输出的p分位×余量收紧max_tokens，
+    # 被截断时自动续写（最多max_continuations次，总量不超过调用方给出的max_tokens）
+    adaptive_max_tokens: bool = False
+    max_tokens_percentile: float = 95.0
+    max_tokens_headroom: float = 1.2
+    max_tokens_min_samples: int = 10
+    max_continuations: int = 2
+    
+    # 批处理作业：离线/夜间驱动程序将评审请求累积为JSONL作业文件，经提供商批处理接口（openai）
+    # 或本地替代处理器（local）执行；交互式对话中的评审不经过批处理作业
+    batch_processor: str = "local"
+    batch_job_dir: str = "./output/batch_jobs"
+    batch_max_size: int = 1000
+    batch_poll_interval: float = 30.0
+    
+    # 录制/回放磁带：off | record | replay（回放时不访问网络）
+    cassette_mode: str = "off"
+    cassette_path: str = "./output/llm_cassette.jsonl"
+    
+    # 成本核算（每1K token价格，0表示不计费）
+    prompt_token_price: float = 0.0
+    completion_token_price: float = 0.0
+    
     def __post_init__(self):
         """后初始化处理"""
         # 从环境变量读取API密钥
@@ -56,6 +133,25 @@ class CoordinatorConfig:
     # 任务分析配置
     analysis_temperature: float = 0.3
     analysis_max_tokens: int = 1500
+    
+    # 路由规则：任务类型 -> 智能体ID，命中时不经LLM直接路由
+    routing_rules: Dict[str, str] = field(default_factory=dict)
+    
+    # 任务分析缓存：按归一化任务描述持久化缓存LLM分析结果（独立的SQLite文件，不与LLM响应缓存共用）
+    enable_analysis_cache: bool = False
+    analysis_cache_path: str = "./output/task_analysis_cache.db"
+    analysis_cache_ttl: int = 604800  # 7天
+    analysis_cache_max_entries: int = 1000
+    
+    # 任务分解配置：将大任务拆成子任务依赖图（DAG），独立分支并行执行
+    enable_task_decomposition: bool = False
+    max_parallel_subtasks: int = 4
+    decomposition_max_tokens: int = 2000
+    
+    # 设计→评审流水线：设计智能体每保存一个模块文件，评审智能体即开始处理
+    enable_review_pipeline: bool = False
+    pipeline_file_types: List[str] = field(default_factory=lambda: ["verilog"])
+    pipeline_max_workers: int = 2
 
 
 @dataclass
@@ -112,13 +208,59 @@ class FrameworkConfig:
             provider=os.getenv("CAF_LLM_PROVIDER", "dashscope"),
             model_name=os.getenv("CAF_LLM_MODEL", "qwen-turbo"),
             temperature=float(os.getenv("CAF_LLM_TEMPERATURE", "0.7")),
-            max_tokens=int(os.getenv("CAF_LLM_MAX_TOKENS", "4096"))
+            max_tokens=int(os.getenv("CAF_LLM_MAX_TOKENS", "4096")),
+            timeout=int(os.getenv("CAF_LLM_TIMEOUT", "120")),
+            connection_pool_size=int(os.getenv("CAF_LLM_POOL_SIZE", "100")),
+            connections_per_host=int(os.getenv("CAF_LLM_POOL_PER_HOST", "20")),
+            keepalive_timeout=float(os.getenv("CAF_LLM_KEEPALIVE_TIMEOUT", "60.0")),
+            dns_cache_ttl=int(os.getenv("CAF_LLM_DNS_CACHE_TTL", "300")),
+            enable_response_cache=os.getenv("CAF_LLM_CACHE_ENABLED", "false").lower() == "true",
+            response_cache_path=os.getenv("CAF_LLM_CACHE_PATH", "./output/llm_response_cache.db"),
+            response_cache_ttl=int(os.getenv("CAF_LLM_CACHE_TTL", "86400")),
+            response_cache_max_entries=int(os.getenv("CAF_LLM_CACHE_MAX_ENTRIES", "5000")),
+            max_concurrent_requests=int(os.getenv("CAF_LLM_MAX_CONCURRENT", "0")),
+            requests_per_minute=int(os.getenv("CAF_LLM_RPM", "0")),
+            tokens_per_minute=int(os.getenv("CAF_LLM_TPM", "0")),
+            purpose_priorities={purpose: int(priority) for purpose, priority in
+                                cls._parse_mapping(os.getenv("CAF_LLM_PURPOSE_PRIORITIES", "")).items()},
+            endpoints=cls._parse_endpoints(os.getenv("CAF_LLM_ENDPOINTS", "")),
+            endpoint_failure_cooldown=float(os.getenv("CAF_LLM_ENDPOINT_COOLDOWN", "30.0")),
+            circuit_breaker_threshold=int(os.getenv("CAF_LLM_BREAKER_THRESHOLD", "5")),
+            circuit_breaker_cooldown=float(os.getenv("CAF_LLM_BREAKER_COOLDOWN", "30.0")),
+            model_tiers=cls._parse_model_tiers(os.getenv("CAF_LLM_MODEL_TIERS", "")),
+            purpose_tiers=cls._parse_mapping(os.getenv("CAF_LLM_PURPOSE_TIERS", "")),
+            ollama_keep_alive=os.getenv("CAF_LLM_OLLAMA_KEEP_ALIVE", "30m"),
+            warm_up_on_start=os.getenv("CAF_LLM_WARM_UP", "false").lower() == "true",
+            native_tool_calling=os.getenv("CAF_LLM_NATIVE_TOOLS", "false").lower() == "true",
+            enable_hedging=os.getenv("CAF_LLM_HEDGING", "false").lower() == "true",
+            hedge_percentile=float(os.getenv("CAF_LLM_HEDGE_PERCENTILE", "95.0")),
+            hedge_min_samples=int(os.getenv("CAF_LLM_HEDGE_MIN_SAMPLES", "20")),
+            adaptive_max_tokens=os.getenv("CAF_LLM_ADAPTIVE_MAX_TOKENS", "false").lower() == "true",
+            max_tokens_percentile=float(os.getenv("CAF_LLM_MAX_TOKENS_PERCENTILE", "95.0")),
+            max_tokens_headroom=float(os.getenv("CAF_LLM_MAX_TOKENS_HEADROOM", "1.2")),
+            max_tokens_min_samples=int(os.getenv("CAF_LLM_MAX_TOKENS_MIN_SAMPLES", "10")),
+            max_continuations=int(os.getenv("CAF_LLM_MAX_CONTINUATIONS", "2")),
+            batch_processor=os.getenv("CAF_LLM_BATCH_PROCESSOR", "local"),
+            batch_job_dir=os.getenv("CAF_LLM_BATCH_JOB_DIR", "./output/batch_jobs"),
+            batch_max_size=int(os.getenv("CAF_LLM_BATCH_MAX_SIZE", "1000")),
+            batch_poll_interval=float(os.getenv("CAF_LLM_BATCH_POLL_INTERVAL", "30.0")),
+            cassette_mode=os.getenv("CAF_LLM_CASSETTE_MODE", "off"),
+            cassette_path=os.getenv("CAF_LLM_CASSETTE_PATH", "./output/llm_cassette.jsonl")
         )
         
         # 协调者配置
         coordinator_config = CoordinatorConfig(
             max_conversation_iterations=int(os.getenv("CAF_MAX_ITERATIONS", "20")),
-            quality_threshold=float(os.getenv("CAF_QUALITY_THRESHOLD", "0.7"))
+            quality_threshold=float(os.getenv("CAF_QUALITY_THRESHOLD", "0.7")),
+            routing_rules=cls._parse_mapping(os.getenv("CAF_ROUTING_RULES", "")),
+            enable_analysis_cache=os.getenv("CAF_ANALYSIS_CACHE", "false").lower() == "true",
+            analysis_cache_path=os.getenv("CAF_ANALYSIS_CACHE_PATH", "./output/task_analysis_cache.db"),
+            analysis_cache_ttl=int(os.getenv("CAF_ANALYSIS_CACHE_TTL", "604800")),
+            analysis_cache_max_entries=int(os.getenv("CAF_ANALYSIS_CACHE_MAX_ENTRIES", "1000")),
+            enable_task_decomposition=os.getenv("CAF_TASK_DECOMPOSITION", "false").lower() == "true",
+            max_parallel_subtasks=int(os.getenv("CAF_MAX_PARALLEL_SUBTASKS", "4")),
+            enable_review_pipeline=os.getenv("CAF_REVIEW_PIPELINE", "false").lower() == "true",
+            pipeline_max_workers=int(os.getenv("CAF_PIPELINE_WORKERS", "2"))
         )
         
         # 智能体配置
@@ -220,4 +362,46 @@ class FrameworkConfig:
                 print(f"⚠️ 加载.env文件失败: {str(e)}")
         else:
             print(f"⚠️ 环境配置文件不存在: {env_path}")
-            print("💡 提示: 复制 .env.template 到 .env 并配置您的设置")
\ No newline at end of file
+            print("💡 提示: 复制 .env.template 到 .env 并配置您的设置")
+    
+    @staticmethod
+    def _parse_endpoints(value: str) -> List[Dict[str, Any]]:
+        """解析端点列表：逗号分隔，每项为 base_url[|api_key[|model_name]]"""
+        endpoints = []
+        for item in value.split(','):
+            item = item.strip()
+            if not item:
+                continue
+            parts = [part.strip() for part in item.split('|')]
+            endpoint = {"base_url": parts[0]}
+            if len(parts) > 1 and parts[1]:
+                endpoint["api_key"] = parts[1]
+            if len(parts) > 2 and parts[2]:
+                endpoint["model_name"] = parts[2]
+            endpoints.append(endpoint)
+        return endpoints
+    
+    @staticmethod
+    def _parse_mapping(value: str) -> Dict[str, str]:
+        """解析 key=value 逗号分隔映射"""
+        mapping = {}
+        for item in value.split(','):
+            if '=' in item:
+                key, val = item.split('=', 1)
+                if key.strip() and val.strip():
+                    mapping[key.strip()] = val.strip()
+        return mapping
+    
+    @classmethod
+    def _parse_model_tiers(cls, value: str) -> Dict[str, Dict[str, Any]]:
+        """解析模型档位：逗号分隔，每项为 name=model_name[|base_url[|api_key]]"""
+        tiers = {}
+        for name, spec in cls._parse_mapping(value).items():
+            parts = [part.strip() for part in spec.split('|')]
+            tier = {"model_name": parts[0]}
+            if len(parts) > 1 and parts[1]:
+                tier["base_url"] = parts[1]
+            if len(parts) > 2 and parts[2]:
+                tier["api_key"] = parts[2]
+            tiers[name] = tier
+        return tiers
\ No newline at end of file
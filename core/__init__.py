@@ -5,18 +5,29 @@
 Core Components Module for Centralized Agent Framework
 """
 
-from .centralized_coordinator import CentralizedCoordinator, AgentInfo, ConversationRecord
+from .centralized_coordinator import CentralizedCoordinator, AgentInfo, ConversationRecord, ConversationContext
 from .base_agent import BaseAgent, TaskMessage, FileReference
-from .enums import AgentCapability, AgentStatus, ConversationState
+from .enums import AgentCapability, AgentStatus, ConversationState, SubTaskStatus
+from .task_graph import TaskGraph, SubTask, TaskGraphError
+from .review_pipeline import ReviewPipeline
+from .task_analysis_cache import TaskAnalysisCache, normalize_task_description
 
 __all__ = [
     'CentralizedCoordinator',
     'AgentInfo', 
     'ConversationRecord',
+    'ConversationContext',
     'BaseAgent',
     'TaskMessage',
     'FileReference', 
     'AgentCapability',
     'AgentStatus',
-    'ConversationState'
+    'ConversationState',
+    'SubTaskStatus',
+    'TaskGraph',
+    'SubTask',
+    'TaskGraphError',
+    'ReviewPipeline',
+    'TaskAnalysisCache',
+    'normalize_task_description'
 ]
\ No newline at end of file
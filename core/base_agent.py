@@ -11,7 +11,7 @@ import os
 import json
 import time
 from pathlib import Path
-from typing import Dict, Any, List, Optional, Set
+from typing import Dict, Any, List, Optional, Set, Callable
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 
@@ -23,6 +23,8 @@ from .response_format import (
 )
 from tools.tool_registry import ToolRegistry, ToolPermission
 from .agent_prompts import agent_prompt_manager
+from llm_integration.call_context import (DeadlineExceededError, llm_call_scope, time_remaining,
+                                          get_call_context)
 
 
 @dataclass
@@ -88,6 +90,9 @@ class BaseAgent(ABC):
         # 任务历史
         self.task_history: List[Dict[str, Any]] = []
         
+        # 文件监听器：每保存一个文件即通知（用于设计→评审流水线的流式交接）
+        self._file_listeners: List[Callable[[FileReference], None]] = []
+        
         # 生成system prompt
         self.system_prompt = agent_prompt_manager.get_system_prompt(self.role, self._capabilities)
         
@@ -197,17 +202,35 @@ class BaseAgent(ABC):
                 metadata={
                     "size": len(content),
                     "created_by": self.agent_id,
-                    "creation_time": time.time()
+                    "creation_time": time.time(),
+                    "conversation_id": get_call_context().conversation_id
                 }
             )
             
             self.logger.info(f"💾 成功保存文件: {file_path}")
+            self._notify_file_listeners(file_ref)
             return file_ref
             
         except Exception as e:
             self.logger.error(f"❌ 保存文件失败 {file_path}: {str(e)}")
             raise
     
+    def add_file_listener(self, listener: Callable[[FileReference], None]):
+        """注册文件监听器，save_result_to_file保存文件后同步调用（监听器不应阻塞）"""
+        self._file_listeners.append(listener)
+    
+    def remove_file_listener(self, listener: Callable[[FileReference], None]):
+        """注销文件监听器"""
+        if listener in self._file_listeners:
+            self._file_listeners.remove(listener)
+    
+    def _notify_file_listeners(self, file_ref: FileReference):
+        for listener in list(self._file_listeners):
+            try:
+                listener(file_ref)
+            except Exception as e:
+                self.logger.warning(f"⚠️ 文件监听器处理失败 {file_ref.file_path}: {str(e)}")
+    
     def _clean_file_content(self, content: str, file_type: str) -> str:
         """清理文件内容，移除不必要的格式标记"""
         cleaned_content = content.strip()
@@ -255,53 +278,83 @@ class BaseAgent(ABC):
         self.logger.info(f"📨 收到任务消息: {task_message.message_type}")
         self.status = AgentStatus.WORKING
         
-        try:
-            # 1. 自主读取所有引用的文件
-            file_contents = {}
-            if task_message.file_references:
-                self.logger.info(f"📁 开始读取 {len(task_message.file_references)} 个引用文件")
+        # LLM调用按智能体和对话归属（用于token账本），并继承协调者下发的截止时间
+        deadline = (task_message.metadata or {}).get("deadline")
+        with llm_call_scope(agent_id=self.agent_id, conversation_id=task_message.task_id,
+                            deadline=deadline):
+            try:
+                # 1. 自主读取所有引用的文件
+                file_contents = {}
+                if task_message.file_references:
+                    self.logger.info(f"📁 开始读取 {len(task_message.file_references)} 个引用文件")
+                    
+                    for file_ref in task_message.file_references:
+                        content = await self.autonomous_file_read(file_ref)
+                        if content:
+                            file_contents[file_ref.file_path] = {
+                                "content": content,
+                                "type": file_ref.file_type,
+                                "description": file_ref.description
+                            }
                 
-                for file_ref in task_message.file_references:
-                    content = await self.autonomous_file_read(file_ref)
-                    if content:
-                        file_contents[file_ref.file_path] = {
-                            "content": content,
-                            "type": file_ref.file_type,
-                            "description": file_ref.description
-                        }
-            
-            # 2. 生成增强的prompt
-            enhanced_prompt = self.create_file_enhanced_prompt(
-                base_message=task_message.content,
-                file_contents=file_contents
-            )
-            
-            # 3. 执行任务处理
-            result = await self.execute_enhanced_task(
-                enhanced_prompt=enhanced_prompt,
-                original_message=task_message,
-                file_contents=file_contents
-            )
-            
-            # 4. 记录任务历史
-            self.task_history.append({
-                "timestamp": time.time(),
-                "task_id": task_message.task_id,
-                "message_type": task_message.message_type,
-                "result": result
-            })
-            
-            self.status = AgentStatus.COMPLETED if result.get("success", False) else AgentStatus.FAILED
-            return result
+                # 2. 生成增强的prompt
+                enhanced_prompt = self.create_file_enhanced_prompt(
+                    base_message=task_message.content,
+                    file_contents=file_contents
+                )
+                
+                # 3. 执行任务处理（超过截止时间即取消）
+                result = await asyncio.wait_for(
+                    self.execute_enhanced_task(
+                        enhanced_prompt=enhanced_prompt,
+                        original_message=task_message,
+                        file_contents=file_contents
+                    ),
+                    timeout=time_remaining()
+                )
+                
+                # 4. 记录任务历史
+                self.task_history.append({
+                    "timestamp": time.time(),
+                    "task_id": task_message.task_id,
+                    "message_type": task_message.message_type,
+                    "result": result
+                })
+                
+                self.status = AgentStatus.COMPLETED if result.get("success", False) else AgentStatus.FAILED
+                return result
             
-        except Exception as e:
-            self.logger.error(f"❌ 任务处理失败: {str(e)}")
-            self.status = AgentStatus.FAILED
-            return {
-                "success": False,
-                "error": str(e),
-                "agent_id": self.agent_id
-            }
+            except asyncio.TimeoutError as e:
+                remaining = time_remaining()
+                if isinstance(e, DeadlineExceededError) or (remaining is not None and remaining <= 0):
+                    self.logger.warning(f"⏰ 任务超过截止时间，已取消: {task_message.task_id}")
+                    self.status = AgentStatus.FAILED
+                    return {
+                        "success": False,
+                        "error": "任务超过截止时间",
+                        "timed_out": True,
+                        "agent_id": self.agent_id
+                    }
+                # 子进程、HTTP读取等内部操作自身的超时，按普通失败处理
+                self.logger.error(f"❌ 任务处理失败: 操作超时 {str(e)}")
+                self.status = AgentStatus.FAILED
+                return {
+                    "success": False,
+                    "error": f"操作超时: {str(e) or type(e).__name__}",
+                    "agent_id": self.agent_id
+                }
+            except asyncio.CancelledError:
+                self.logger.warning(f"⏹️ 任务被取消: {task_message.task_id}")
+                self.status = AgentStatus.FAILED
+                raise
+            except Exception as e:
+                self.logger.error(f"❌ 任务处理失败: {str(e)}")
+                self.status = AgentStatus.FAILED
+                return {
+                    "success": False,
+                    "error": str(e),
+                    "agent_id": self.agent_id
+                }
     
     def create_file_enhanced_prompt(self, base_message: str, 
                                   file_contents: Dict[str, Dict]) -> str:
@@ -9,16 +9,22 @@ import asyncio
 import json
 import logging
 import time
+import uuid
 from typing import Dict, Any, List, Optional, Set
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
 
 from .base_agent import BaseAgent, TaskMessage, FileReference
 from .enums import AgentCapability, AgentStatus, ConversationState
 from .response_format import ResponseFormat, StandardizedResponse
 from .response_parser import ResponseParser, ResponseParseError
+from .task_graph import TaskGraph, SubTask, TaskGraphError
+from .review_pipeline import ReviewPipeline
+from .task_analysis_cache import TaskAnalysisCache
 from config.config import FrameworkConfig, CoordinatorConfig
 from llm_integration.enhanced_llm_client import EnhancedLLMClient
+from llm_integration.call_context import llm_call_scope
+from llm_integration.token_ledger import token_ledger
 
 
 @dataclass
@@ -69,6 +75,40 @@ class ConversationRecord:
         }
 
 
+@dataclass
+class ConversationContext:
+    """单个对话的运行状态，协调者为每次coordinate_task_execution创建独立实例"""
+    conversation_id: str
+    initial_task: str
+    deadline: float
+    state: ConversationState = ConversationState.ACTIVE
+    started_at: float = field(default_factory=time.time)
+    current_speaker: Optional[str] = None
+    iteration_count: int = 0
+    history: List[ConversationRecord] = field(default_factory=list)
+    file_references: List[FileReference] = field(default_factory=list)
+    repetition_tracker: List[str] = field(default_factory=list)
+    # 流水线中负责评审的智能体：流水线运行期间不再被选为对话发言者，避免同一文件评审两次
+    pipelined_agents: Set[str] = field(default_factory=set)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "conversation_id": self.conversation_id,
+            "state": self.state.value,
+            "started_at": self.started_at,
+            "deadline": self.deadline,
+            "current_speaker": self.current_speaker,
+            "iteration_count": self.iteration_count,
+            "rounds": len(self.history),
+            "file_references": len(self.file_references)
+        }
+
+
+def new_conversation_id() -> str:
+    """生成对话ID：秒级时间戳加随机后缀，同一秒内启动的对话也不会冲突"""
+    return f"conv_{int(time.time())}_{uuid.uuid4().hex[:8]}"
+
+
 class CentralizedCoordinator(BaseAgent):
     """
     中心化协调智能体 - 系统的大脑
@@ -97,12 +137,17 @@ class CentralizedCoordinator(BaseAgent):
         # 团队管理
         self.registered_agents: Dict[str, AgentInfo] = {}
         self.agent_instances: Dict[str, BaseAgent] = {}
+        # 能力索引：能力 -> 具备该能力的智能体ID，随注册/注销维护
+        self.capability_index: Dict[AgentCapability, Set[str]] = {}
+        self.routing_stats = {"fast_path": 0, "rule": 0, "llm": 0, "simple": 0}
         
-        # 对话管理
+        # 对话管理：每个进行中的对话持有独立的ConversationContext，
+        # conversation_history为所有对话的汇总记录（用于统计与日志导出）
+        self.conversations: Dict[str, ConversationContext] = {}
         self.conversation_history: List[ConversationRecord] = []
-        self.current_conversation_id = None
-        self.conversation_state = ConversationState.IDLE
-        
+        self.current_conversation_id = None  # 最近启动的对话
+        self._last_conversation_state = ConversationState.IDLE
+
         # 任务管理
         self.active_tasks: Dict[str, Dict[str, Any]] = {}
         self.task_results: Dict[str, List[Dict[str, Any]]] = {}
@@ -111,16 +156,39 @@ class CentralizedCoordinator(BaseAgent):
         self.max_conversation_iterations = self.coordinator_config.max_conversation_iterations
         self.conversation_timeout = self.coordinator_config.conversation_timeout
         
-        # 循环检测
-        self.repetition_tracker: Dict[str, List[str]] = {}  # 跟踪对话重复模式
+        # 循环检测（重复模式记录在各对话的ConversationContext中）
         self.last_agent_messages: Dict[str, str] = {}  # 跟踪上一条消息
         
+        # 任务分析缓存（同一模板的任务跳过LLM分析）
+        self.analysis_cache: Optional[TaskAnalysisCache] = None
+        if self.coordinator_config.enable_analysis_cache and llm_client:
+            # 以分析调用实际路由到的模型作为键，模型分层配置变化时旧结果自然失效
+            get_model_name = getattr(llm_client, "_get_model_name", None)
+            analysis_model = (get_model_name("analysis") if callable(get_model_name) else
+                              getattr(getattr(llm_client, "config", None), "model_name", None))
+            self.analysis_cache = TaskAnalysisCache(
+                db_path=self.coordinator_config.analysis_cache_path,
+                ttl_seconds=self.coordinator_config.analysis_cache_ttl,
+                max_entries=self.coordinator_config.analysis_cache_max_entries,
+                model_name=analysis_model
+            )
+        
         # 响应解析器
         self.response_parser = ResponseParser()
         self.preferred_response_format = ResponseFormat.JSON
         
+        # 已在事件循环中创建时立即开始后台预热模型（warm_up_on_start）
+        self._start_warm_up()
+        
         self.logger.info("🧠 中心化协调智能体初始化完成")
     
+    @property
+    def conversation_state(self) -> ConversationState:
+        """协调者整体对话状态：有进行中的对话时为ACTIVE，否则为最近结束对话的状态"""
+        if self.conversations:
+            return ConversationState.ACTIVE
+        return self._last_conversation_state
+
     def get_capabilities(self) -> Set[AgentCapability]:
         """获取协调者能力"""
         return {AgentCapability.TASK_COORDINATION, 
@@ -146,9 +214,13 @@ class CentralizedCoordinator(BaseAgent):
                 last_activity=time.time()
             )
             
+            self._unindex_agent(agent.agent_id)
             self.registered_agents[agent.agent_id] = agent_info
             self.agent_instances[agent.agent_id] = agent
+            for capability in agent_info.capabilities:
+                self.capability_index.setdefault(capability, set()).add(agent.agent_id)
             
+            self._start_warm_up(agent)
             self.logger.info(f"✅ 智能体注册成功: {agent.agent_id} ({agent.role})")
             return True
             
@@ -156,9 +228,44 @@ class CentralizedCoordinator(BaseAgent):
             self.logger.error(f"❌ 智能体注册失败 {agent.agent_id}: {str(e)}")
             return False
     
+    def _llm_clients(self) -> List[EnhancedLLMClient]:
+        """协调者及已注册智能体使用的LLM客户端（按实例去重）"""
+        clients: Dict[int, EnhancedLLMClient] = {}
+        for owner in [self, *self.agent_instances.values()]:
+            client = getattr(owner, "llm_client", None)
+            if isinstance(client, EnhancedLLMClient):
+                clients.setdefault(id(client), client)
+        return list(clients.values())
+    
+    def _start_warm_up(self, owner: Optional[BaseAgent] = None):
+        """在后台启动owner（默认为协调者）客户端的模型预热
+        （仅warm_up_on_start启用且有运行中的事件循环时生效）"""
+        client = getattr(owner or self, "llm_client", None)
+        if isinstance(client, EnhancedLLMClient):
+            client.start_warm_up()
+    
+    async def warm_up(self) -> Dict[str, Dict[str, Any]]:
+        """预热协调者及已注册智能体的模型，返回 {端点标识: 预热结果}
+        
+        启动时await该方法可让首个任务不承担模型加载延迟；
+        已在后台预热的客户端等待其预热任务完成。
+        """
+        results: Dict[str, Dict[str, Any]] = {}
+        outcomes = await asyncio.gather(
+            *(client.start_warm_up() or client.warm_up() for client in self._llm_clients()),
+            return_exceptions=True
+        )
+        for outcome in outcomes:
+            if isinstance(outcome, Exception):
+                self.logger.warning(f"⚠️ 模型预热失败: {str(outcome)}")
+            elif outcome:
+                results.update(outcome)
+        return results
+    
     def unregister_agent(self, agent_id: str) -> bool:
         """注销智能体"""
         if agent_id in self.registered_agents:
+            self._unindex_agent(agent_id)
             del self.registered_agents[agent_id]
             if agent_id in self.agent_instances:
                 del self.agent_instances[agent_id]
@@ -166,6 +273,18 @@ class CentralizedCoordinator(BaseAgent):
             return True
         return False
     
+    def _unindex_agent(self, agent_id: str):
+        """从能力索引中移除智能体"""
+        info = self.registered_agents.get(agent_id)
+        if info is None:
+            return
+        for capability in info.capabilities:
+            agent_ids = self.capability_index.get(capability)
+            if agent_ids is not None:
+                agent_ids.discard(agent_id)
+                if not agent_ids:
+                    del self.capability_index[capability]
+    
     def get_team_status(self) -> Dict[str, Any]:
         """获取团队状态"""
         return {
@@ -177,6 +296,7 @@ class CentralizedCoordinator(BaseAgent):
             "agents": {agent_id: info.to_dict() 
                       for agent_id, info in self.registered_agents.items()},
             "conversation_state": self.conversation_state.value,
+            "active_conversations": len(self.conversations),
             "active_tasks": len(self.active_tasks)
         }
     
@@ -191,6 +311,15 @@ class CentralizedCoordinator(BaseAgent):
             # 简单的规则分析
             return self._simple_task_analysis(task_description)
         
+        # 同一模板的任务（仅位宽、标识符或空白不同）复用缓存的分析结果
+        if self.analysis_cache is not None:
+            cached_analysis = await self.analysis_cache.aget(task_description)
+            if cached_analysis is not None:
+                if context:
+                    cached_analysis['context'] = context
+                self.logger.info(f"📦 任务分析缓存命中: 复杂度={cached_analysis.get('complexity', 'N/A')}")
+                return cached_analysis
+        
         # 使用LLM进行深度分析
         analysis_prompt = f"""
 Analyze the following task requirements and return a detailed analysis in JSON format.
@@ -219,17 +348,17 @@ Task to analyze: {task_description}
 """
         
         try:
-            response = await self.llm_client.send_prompt(
+            analysis = await self.llm_client.send_json_prompt(
                 prompt=analysis_prompt,
                 temperature=self.coordinator_config.analysis_temperature,
                 max_tokens=self.coordinator_config.analysis_max_tokens,
-                json_mode=True
+                purpose="analysis"
             )
             
-            analysis = json.loads(response)
-            
             # 规范化分析结果，处理可能的中文字段名
             normalized_analysis = self._normalize_task_analysis(analysis)
+            if self.analysis_cache is not None:
+                await self.analysis_cache.aput(task_description, normalized_analysis)
             
             # 包含原始上下文
             if context:
@@ -381,17 +510,65 @@ Task to analyze: {task_description}
             self.logger.warning("⚠️ 没有可用的智能体")
             return None
         
+        # 路由规则或能力唯一匹配时直接确定，不经LLM
+        fast_path_agent = self._fast_path_agent_selection(task_analysis, available_agents)
+        if fast_path_agent:
+            return fast_path_agent
+        
         self.logger.info(f"🔍 DEBUG: LLM client available: {self.llm_client is not None}")
         
         if not self.llm_client:
             # 简单选择策略
             self.logger.info(f"🔍 DEBUG: Using simple agent selection strategy")
+            self.routing_stats["simple"] += 1
             return self._simple_agent_selection(task_analysis, available_agents)
         
-        # 使用LLM进行智能选择
+        # 使用LLM进行智能选择（仅在存在多个候选时）
         self.logger.info(f"🔍 DEBUG: Using LLM agent selection strategy")
+        self.routing_stats["llm"] += 1
         return await self._llm_agent_selection(task_analysis, available_agents)
     
+    # 任务类型对应的默认能力（任务分析未给出可识别的能力时使用）
+    TASK_TYPE_CAPABILITIES = {
+        "design": [AgentCapability.CODE_GENERATION],
+        "testing": [AgentCapability.TEST_GENERATION],
+        "review": [AgentCapability.CODE_REVIEW],
+        "optimization": [AgentCapability.PERFORMANCE_OPTIMIZATION]
+    }
+    
+    def _fast_path_agent_selection(self, task_analysis: Dict[str, Any],
+                                   available_agents: Dict[str, AgentInfo]) -> Optional[str]:
+        """本地确定性路由：命中路由规则，或按能力索引只有唯一候选时返回智能体ID，否则返回None"""
+        task_type = task_analysis.get("task_type", "unknown")
+        
+        # 1. 配置的路由规则
+        rule_agent = self.coordinator_config.routing_rules.get(task_type)
+        if rule_agent in available_agents:
+            self.routing_stats["rule"] += 1
+            self.logger.info(f"🎯 路由规则选择智能体: {task_type} -> {rule_agent}")
+            return rule_agent
+        
+        # 2. 能力索引：具备全部所需能力的候选唯一，或仅一个智能体具备任一所需能力
+        capabilities = []
+        for value in task_analysis.get("required_capabilities", []) or []:
+            try:
+                capabilities.append(AgentCapability(value))
+            except ValueError:
+                continue
+        capabilities = capabilities or self.TASK_TYPE_CAPABILITIES.get(task_type, [])
+        if not capabilities:
+            return None
+        
+        matches = [self.capability_index.get(capability, set()) & available_agents.keys()
+                   for capability in capabilities]
+        candidates = set.intersection(*matches) or set.union(*matches)
+        if len(candidates) == 1:
+            agent_id = next(iter(candidates))
+            self.routing_stats["fast_path"] += 1
+            self.logger.info(f"🎯 能力唯一匹配选择智能体: {agent_id} ({[cap.value for cap in capabilities]})")
+            return agent_id
+        return None
+    
     def _simple_agent_selection(self, task_analysis: Dict[str, Any], 
                               available_agents: Dict[str, AgentInfo]) -> str:
         """简单的智能体选择策略"""
@@ -488,7 +665,8 @@ Your selection:"""
             response = await self.llm_client.send_prompt(
                 prompt=selection_prompt,
                 temperature=self.coordinator_config.decision_temperature,
-                max_tokens=100
+                max_tokens=100,
+                purpose="routing"
             )
             
             # DEBUG: Log raw LLM response
@@ -532,54 +710,334 @@ Your selection:"""
     
     async def coordinate_task_execution(self, initial_task: str, 
                                       context: Dict[str, Any] = None) -> Dict[str, Any]:
-        """协调任务执行"""
-        self.conversation_state = ConversationState.ACTIVE
-        conversation_id = f"conv_{int(time.time())}"
+        """协调任务执行
+
+        每次调用使用独立的ConversationContext，同一协调者上可并发运行多个对话。
+        """
+        conversation_id = new_conversation_id()
+        # 整个对话的截止时间，向下传递给智能体、LLM请求与仿真子进程
+        conversation = ConversationContext(
+            conversation_id=conversation_id,
+            initial_task=initial_task,
+            deadline=time.time() + self.conversation_timeout
+        )
+        self.conversations[conversation_id] = conversation
         self.current_conversation_id = conversation_id
-        
-        self.logger.info(f"🚀 开始任务协调: {conversation_id}")
-        
-        try:
-            # 1. 分析任务
-            task_analysis = await self.analyze_task_requirements(initial_task, context)
-            
-            # 2. 选择初始智能体
-            selected_agent_id = await self.select_best_agent(task_analysis)
-            if not selected_agent_id:
+
+        self.logger.info(f"🚀 开始任务协调: {conversation_id} (进行中对话: {len(self.conversations)})")
+        # 协调者在事件循环外创建时，于首个任务开始时预热全部客户端的模型
+        for client in self._llm_clients():
+            client.start_warm_up()
+
+        # 协调者自身的LLM调用归属到该对话
+        with llm_call_scope(agent_id=self.agent_id, conversation_id=conversation_id,
+                            deadline=conversation.deadline):
+            try:
+                # 1. 分析任务
+                task_analysis = await self.analyze_task_requirements(initial_task, context)
+
+                # 2. 启动设计→评审流水线（设计智能体每保存一个模块即开始评审）
+                pipeline = await self._start_review_pipeline(conversation)
+                try:
+                    conversation_results = await self._run_conversation(conversation, task_analysis)
+                except BaseException:
+                    if pipeline is not None:
+                        await pipeline.cancel()
+                    raise
+
+                if pipeline is not None:
+                    await self._collect_pipeline_results(conversation, pipeline, conversation_results)
+                return conversation_results
+
+            except Exception as e:
+                conversation.state = ConversationState.FAILED
+                self.logger.error(f"❌ 任务协调失败 {conversation_id}: {str(e)}")
                 return {
                     "success": False,
-                    "error": "没有找到合适的智能体",
+                    "error": str(e),
                     "conversation_id": conversation_id
                 }
-            
-            # 3. 开始多轮对话
-            conversation_results = await self._execute_multi_round_conversation(
-                conversation_id=conversation_id,
-                initial_task=initial_task,
-                initial_agent_id=selected_agent_id,
-                task_analysis=task_analysis
-            )
-            
-            self.conversation_state = ConversationState.COMPLETED
-            return conversation_results
-            
-        except Exception as e:
-            self.conversation_state = ConversationState.FAILED
-            self.logger.error(f"❌ 任务协调失败: {str(e)}")
+            finally:
+                if conversation.state == ConversationState.ACTIVE:
+                    conversation.state = ConversationState.FAILED  # 被取消
+                self._last_conversation_state = conversation.state
+                self.conversations.pop(conversation_id, None)
+
+    async def _run_conversation(self, conversation: ConversationContext,
+                                task_analysis: Dict[str, Any]) -> Dict[str, Any]:
+        """按子任务依赖图或多轮对话执行任务，并更新对话状态"""
+        # 可分解的大任务按子任务依赖图并行执行
+        if self.coordinator_config.enable_task_decomposition:
+            task_graph = await self.decompose_task(conversation.initial_task, task_analysis)
+            if task_graph is not None:
+                graph_results = await self._execute_task_graph(conversation, task_graph, task_analysis)
+                conversation.state = (ConversationState.COMPLETED if graph_results["success"]
+                                      else ConversationState.FAILED)
+                return graph_results
+
+        # 选择初始智能体
+        selected_agent_id = await self.select_best_agent(task_analysis)
+        if not selected_agent_id:
+            conversation.state = ConversationState.FAILED
             return {
                 "success": False,
-                "error": str(e),
-                "conversation_id": conversation_id
+                "error": "没有找到合适的智能体",
+                "conversation_id": conversation.conversation_id
             }
-    
-    async def _execute_multi_round_conversation(self, conversation_id: str, 
-                                              initial_task: str, initial_agent_id: str,
+
+        # 开始多轮对话
+        conversation_results = await self._execute_multi_round_conversation(
+            conversation=conversation,
+            initial_agent_id=selected_agent_id,
+            task_analysis=task_analysis
+        )
+        conversation.state = ConversationState.COMPLETED
+        return conversation_results
+
+    # ==========================================================================
+    # 🔀 设计→评审流水线
+    # ==========================================================================
+
+    async def _start_review_pipeline(self, conversation: ConversationContext) -> Optional[ReviewPipeline]:
+        """启用流水线且团队中同时有设计与评审智能体时，启动该对话的流水线"""
+        if not self.coordinator_config.enable_review_pipeline:
+            return None
+
+        reviewer_id = next((agent_id for agent_id, info in self.registered_agents.items()
+                            if AgentCapability.CODE_REVIEW in info.capabilities), None)
+        if reviewer_id is None:
+            return None
+        designers = [self.agent_instances[agent_id] for agent_id, info in self.registered_agents.items()
+                     if agent_id != reviewer_id and AgentCapability.CODE_GENERATION in info.capabilities]
+        if not designers:
+            return None
+
+        async def review_file(file_ref: FileReference) -> Dict[str, Any]:
+            return await self._review_pipelined_file(conversation, reviewer_id, file_ref)
+
+        pipeline = ReviewPipeline(
+            conversation_id=conversation.conversation_id,
+            sources=designers,
+            handler=review_file,
+            file_types=self.coordinator_config.pipeline_file_types,
+            max_workers=self.coordinator_config.pipeline_max_workers
+        )
+        await pipeline.start()
+        conversation.pipelined_agents.add(reviewer_id)
+        self.logger.info(f"🔀 启动设计→评审流水线: {[agent.agent_id for agent in designers]} -> {reviewer_id}")
+        return pipeline
+
+    async def _review_pipelined_file(self, conversation: ConversationContext, reviewer_id: str,
+                                     file_ref: FileReference) -> Dict[str, Any]:
+        """评审流水线交来的单个模块文件"""
+        task_message = TaskMessage(
+            task_id=f"{conversation.conversation_id}.review_{Path(file_ref.file_path).stem}",
+            sender_id=self.agent_id,
+            receiver_id=reviewer_id,
+            message_type="task_execution",
+            content=f"审查并验证刚生成的模块文件 {file_ref.file_path}，报告问题和改进建议",
+            file_references=[file_ref],
+            metadata={"deadline": conversation.deadline, "pipeline": True}
+        )
+        raw_response = await self.agent_instances[reviewer_id].process_task_with_file_references(task_message)
+        parsed_response = await self._process_agent_response(
+            agent_id=reviewer_id,
+            raw_response=raw_response,
+            task_id=task_message.task_id
+        )
+
+        conversation_record = ConversationRecord(
+            conversation_id=conversation.conversation_id,
+            timestamp=time.time(),
+            speaker_id=reviewer_id,
+            receiver_id=self.agent_id,
+            message_content=task_message.content,
+            task_result=parsed_response,
+            file_references=parsed_response.get("file_references", [])
+        )
+        conversation.history.append(conversation_record)
+        self.conversation_history.append(conversation_record)
+        return parsed_response
+
+    async def _collect_pipeline_results(self, conversation: ConversationContext,
+                                        pipeline: ReviewPipeline, conversation_results: Dict[str, Any]):
+        """等待流水线中剩余的评审完成，并把评审结果与产出文件并入对话结果"""
+        reviews = await pipeline.finish()
+        conversation.pipelined_agents.clear()
+        review_files = [ref for review in reviews for ref in review.get("file_references", [])]
+        conversation_results["file_references"] = self._merge_file_references(
+            list(conversation_results.get("file_references", [])) + review_files)
+        conversation_results["conversation_history"] = [record.to_dict() for record in conversation.history]
+        conversation_results["pipeline_reviews"] = [
+            {
+                "file_path": review["file_path"],
+                "success": review.get("success", False),
+                "issues": len(review.get("issues", [])),
+                "file_references": [ref.file_path for ref in review.get("file_references", [])]
+            }
+            for review in reviews
+        ]
+        conversation_results["pipeline_stats"] = pipeline.get_stats()
+        # 评审的LLM调用记在"{对话ID}.review_*"下，随对话一并汇总
+        conversation_results["token_usage"] = token_ledger.get_conversation_usage(
+            conversation.conversation_id, include_children=True)
+        self.logger.info(f"🔀 流水线完成: 评审 {len(reviews)} 个文件")
+
+    # ==========================================================================
+    # 🕸️ 任务分解与并行执行
+    # ==========================================================================
+
+    async def decompose_task(self, task_description: str,
+                             task_analysis: Dict[str, Any] = None) -> Optional[TaskGraph]:
+        """将大任务分解为子任务依赖图；无法分解或只有一个子任务时返回None"""
+        if not self.llm_client:
+            return None
+
+        capabilities = sorted({cap.value for info in self.registered_agents.values()
+                               for cap in info.capabilities})
+        decomposition_prompt = f"""
+Decompose the following hardware design task into a dependency graph of subtasks.
+
+Task Description: {task_description}
+Task Type: {(task_analysis or {}).get('task_type', 'unknown')}
+Available Capabilities: {capabilities}
+
+Rules:
+1. Each subtask must be completable by a single agent (one module design, one testbench, one review...).
+2. "depends_on" lists the ids of subtasks whose output files this subtask needs as input.
+3. Independent subtasks must NOT depend on each other so that they can run in parallel.
+4. If the task cannot be meaningfully split, return a single subtask.
+
+Return JSON in this exact format:
+{{
+    "subtasks": [
+        {{"id": "uart", "description": "Design a UART module", "task_type": "design",
+          "required_capabilities": ["code_generation", "module_design"], "depends_on": []}},
+        {{"id": "top", "description": "Integrate the modules into a top module", "task_type": "design",
+          "required_capabilities": ["code_generation"], "depends_on": ["uart"]}}
+    ]
+}}
+"""
+        try:
+            decomposition = await self.llm_client.send_json_prompt(
+                prompt=decomposition_prompt,
+                temperature=self.coordinator_config.analysis_temperature,
+                max_tokens=self.coordinator_config.decomposition_max_tokens,
+                purpose="analysis"
+            )
+            task_graph = TaskGraph.from_dict(decomposition)
+        except (TaskGraphError, ValueError) as e:
+            self.logger.warning(f"⚠️ 任务分解失败，按单一任务执行: {str(e)}")
+            return None
+        except Exception as e:
+            self.logger.warning(f"⚠️ 任务分解请求失败，按单一任务执行: {str(e)}")
+            return None
+
+        if len(task_graph) < 2:
+            return None
+        self.logger.info(f"🕸️ 任务分解为 {len(task_graph)} 个子任务: {task_graph.topological_order()}")
+        return task_graph
+
+    async def _execute_task_graph(self, conversation: ConversationContext, task_graph: TaskGraph,
+                                  task_analysis: Dict[str, Any]) -> Dict[str, Any]:
+        """执行子任务依赖图
+
+        每个子任务作为独立的子对话运行（共享父对话的截止时间），
+        以上游子任务产出的文件作为输入；独立分支并发执行。
+        """
+        conversation_start = time.time()
+        child_conversations: List[ConversationContext] = []
+
+        async def run_subtask(subtask: SubTask, upstream: List[SubTask]) -> Dict[str, Any]:
+            subtask_analysis = {**task_analysis, **subtask.to_analysis()}
+            agent_id = await self.select_best_agent(subtask_analysis)
+            if not agent_id:
+                return {"success": False, "error": f"没有找到适合子任务 {subtask.task_id} 的智能体"}
+            subtask.agent_id = agent_id
+
+            child = ConversationContext(
+                conversation_id=f"{conversation.conversation_id}.{subtask.task_id}",
+                initial_task=self._build_subtask_prompt(conversation.initial_task, subtask, upstream),
+                deadline=conversation.deadline,
+                file_references=self._merge_file_references(
+                    ref for upstream_task in upstream for ref in upstream_task.file_references)
+            )
+            child_conversations.append(child)
+            self.conversations[child.conversation_id] = child
+            try:
+                with llm_call_scope(conversation_id=child.conversation_id):
+                    result = await self._execute_multi_round_conversation(
+                        conversation=child,
+                        initial_agent_id=agent_id,
+                        task_analysis=subtask_analysis
+                    )
+                child.state = ConversationState.COMPLETED if result["success"] else ConversationState.FAILED
+                conversation.history.extend(child.history)
+                return result
+            finally:
+                self.conversations.pop(child.conversation_id, None)
+
+        success = await task_graph.execute(run_subtask, self.coordinator_config.max_parallel_subtasks)
+
+        subtasks = [task_graph.subtasks[task_id] for task_id in task_graph.topological_order()]
+        file_references = self._merge_file_references(
+            ref for subtask in subtasks for ref in subtask.file_references)
+        self.logger.info(f"🕸️ 子任务依赖图执行{'完成' if success else '未全部成功'}: "
+                         f"{len(file_references)} 个文件, 耗时 {time.time() - conversation_start:.1f}s")
+
+        finished = [subtask for subtask in subtasks if subtask.finished_at]
+        return {
+            "success": success,
+            "conversation_id": conversation.conversation_id,
+            "total_iterations": sum(child.iteration_count for child in child_conversations),
+            "duration": time.time() - conversation_start,
+            "file_references": file_references,
+            "conversation_history": [record.to_dict() for record in conversation.history],
+            "final_speaker": max(finished, key=lambda subtask: subtask.finished_at).agent_id if finished else None,
+            "task_analysis": task_analysis,
+            "task_graph": task_graph.to_dict(),
+            "force_completed": any((subtask.result or {}).get("force_completed") for subtask in subtasks),
+            "timed_out": any((subtask.result or {}).get("timed_out") for subtask in subtasks),
+            "token_usage": token_ledger.get_conversation_usage(
+                conversation.conversation_id, include_children=True)
+        }
+
+    def _build_subtask_prompt(self, initial_task: str, subtask: SubTask, upstream: List[SubTask]) -> str:
+        """子任务的初始消息：子任务描述、所属整体任务以及上游产出"""
+        prompt = f"{subtask.description}\n\n该子任务属于整体任务：{initial_task}"
+        if upstream:
+            upstream_lines = "\n".join(
+                f"- {upstream_task.task_id}: {upstream_task.description} "
+                f"(文件: {', '.join(ref.file_path for ref in upstream_task.file_references) or '无'})"
+                for upstream_task in upstream
+            )
+            prompt += f"\n\n以下上游子任务已完成，其产出文件已作为引用附上：\n{upstream_lines}"
+        return prompt
+
+    @staticmethod
+    def _merge_file_references(file_references) -> List[FileReference]:
+        """按文件路径去重合并文件引用，保留最后出现的版本"""
+        merged: Dict[str, FileReference] = {}
+        for ref in file_references:
+            merged.pop(ref.file_path, None)
+            merged[ref.file_path] = ref
+        return list(merged.values())
+
+    async def _execute_multi_round_conversation(self, conversation: ConversationContext,
+                                              initial_agent_id: str,
                                               task_analysis: Dict[str, Any]) -> Dict[str, Any]:
-        """执行多轮对话"""
+        """执行多轮对话
+
+        对话状态（轮次、文件引用、循环检测、对话记录）均保存在conversation中；
+        超过conversation.deadline后取消正在执行的智能体任务。
+        """
+        conversation_id = conversation.conversation_id
+        initial_task = conversation.initial_task
+        deadline = conversation.deadline
         conversation_start = time.time()
         current_speaker = initial_agent_id
         iteration_count = 0
-        all_file_references = []
+        all_file_references = conversation.file_references
         task_completed = False
         
         # 从task_analysis中提取初始文件引用
@@ -597,17 +1055,17 @@ Your selection:"""
                     all_file_references.append(file_ref)
             self.logger.info(f"📁 初始化文件引用: {len(all_file_references)} 个文件")
         
-        # 初始化循环检测
-        self.repetition_tracker[conversation_id] = []
-        
         self.logger.info(f"💬 启动多轮对话: {conversation_id}")
         
+        timed_out = False
         while (iteration_count < self.max_conversation_iterations and 
-               time.time() - conversation_start < self.conversation_timeout and
+               time.time() < deadline and
                not task_completed):
             
             iteration_count += 1
-            self.logger.info(f"🔄 对话轮次 {iteration_count}: {current_speaker} 发言")
+            conversation.iteration_count = iteration_count
+            conversation.current_speaker = current_speaker
+            self.logger.info(f"🔄 [{conversation_id}] 对话轮次 {iteration_count}: {current_speaker} 发言")
             
             try:
                 # 1. 构建任务消息
@@ -624,13 +1082,22 @@ Your selection:"""
                     metadata={
                         "iteration": iteration_count, 
                         "task_analysis": serializable_task_analysis,
-                        "is_final_iteration": iteration_count >= self.max_conversation_iterations - 2
+                        "is_final_iteration": iteration_count >= self.max_conversation_iterations - 2,
+                        "deadline": deadline
                     }
                 )
                 
-                # 2. 智能体执行任务
+                # 2. 智能体执行任务（超过对话截止时间即取消）
                 agent_instance = self.agent_instances[current_speaker]
-                task_result = await agent_instance.process_task_with_file_references(task_message)
+                try:
+                    task_result = await asyncio.wait_for(
+                        agent_instance.process_task_with_file_references(task_message),
+                        timeout=max(0.0, deadline - time.time())
+                    )
+                except asyncio.TimeoutError:
+                    self.logger.warning(f"⏰ 对话超时，已取消 {current_speaker} 的执行: {conversation_id}")
+                    timed_out = True
+                    break
                 
                 # 3. 解析和处理标准化响应
                 parsed_response = await self._process_agent_response(
@@ -640,7 +1107,7 @@ Your selection:"""
                 )
                 
                 # 4. 循环检测
-                if self._detect_loop(conversation_id, current_speaker, parsed_response):
+                if self._detect_loop(conversation, current_speaker, parsed_response):
                     self.logger.warning(f"⚠️ 检测到循环，强制终止对话: {conversation_id}")
                     break
                 
@@ -654,6 +1121,7 @@ Your selection:"""
                     task_result=parsed_response,
                     file_references=parsed_response.get("file_references", [])
                 )
+                conversation.history.append(conversation_record)
                 self.conversation_history.append(conversation_record)
                 
                 # 6. 收集文件引用
@@ -675,8 +1143,9 @@ Your selection:"""
                 # 9. 决定下一个发言者
                 next_speaker = await self._decide_next_speaker(
                     current_result=parsed_response,
-                    conversation_history=self.conversation_history[-3:],
-                    task_analysis=task_analysis
+                    conversation_history=conversation.history[-3:],
+                    task_analysis=task_analysis,
+                    excluded_agents=conversation.pipelined_agents
                 )
                 
                 if next_speaker == current_speaker or not next_speaker:
@@ -695,10 +1164,6 @@ Your selection:"""
                 self.logger.error(f"❌ 对话轮次 {iteration_count} 失败: {str(e)}")
                 break
         
-        # 清理循环检测数据
-        if conversation_id in self.repetition_tracker:
-            del self.repetition_tracker[conversation_id]
-        
         # 生成最终结果
         total_duration = time.time() - conversation_start
         return {
@@ -707,18 +1172,21 @@ Your selection:"""
             "total_iterations": iteration_count,
             "duration": total_duration,
             "file_references": all_file_references,
-            "conversation_history": [record.to_dict() for record in self.conversation_history[-iteration_count:]],
+            "conversation_history": [record.to_dict() for record in conversation.history],
             "final_speaker": current_speaker,
             "task_analysis": task_analysis,
-            "force_completed": iteration_count >= self.max_conversation_iterations - 1
+            "force_completed": iteration_count >= self.max_conversation_iterations - 1,
+            "timed_out": timed_out or (not task_completed and time.time() >= deadline),
+            "token_usage": token_ledger.get_conversation_usage(conversation_id, include_children=True)
         }
     
     async def _decide_next_speaker(self, current_result: Dict[str, Any],
                                  conversation_history: List[ConversationRecord],
-                                 task_analysis: Dict[str, Any]) -> Optional[str]:
-        """决定下一个发言者"""
+                                 task_analysis: Dict[str, Any],
+                                 excluded_agents: Set[str] = frozenset()) -> Optional[str]:
+        """决定下一个发言者（excluded_agents中的智能体不参与选择，如流水线中的评审智能体）"""
         if not self.llm_client:
-            return self._simple_next_speaker_decision(current_result)
+            return self._simple_next_speaker_decision(current_result, excluded_agents)
         
         # 构建上下文信息
         history_summary = "\n".join([
@@ -730,7 +1198,7 @@ Your selection:"""
         available_agents = "\n".join([
             f"- {agent_id}: {info.role} | 能力: {[cap.value for cap in info.capabilities]}"
             for agent_id, info in self.registered_agents.items()
-            if info.status != AgentStatus.FAILED
+            if info.status != AgentStatus.FAILED and agent_id not in excluded_agents
         ])
         
         decision_prompt = f"""
@@ -760,7 +1228,8 @@ Your selection:"""
             response = await self.llm_client.send_prompt(
                 prompt=decision_prompt,
                 temperature=self.coordinator_config.decision_temperature,
-                max_tokens=self.coordinator_config.decision_max_tokens
+                max_tokens=self.coordinator_config.decision_max_tokens,
+                purpose="decision"
             )
             
             decision = response.strip().lower()
@@ -769,7 +1238,7 @@ Your selection:"""
                 return None  # 继续当前智能体
             elif decision == "complete":
                 return None  # 任务完成
-            elif decision in self.registered_agents:
+            elif decision in self.registered_agents and decision not in excluded_agents:
                 return decision
             else:
                 self.logger.warning(f"⚠️ LLM返回无效决策: {decision}")
@@ -777,7 +1246,7 @@ Your selection:"""
                 
         except Exception as e:
             self.logger.warning(f"⚠️ NextSpeaker决策失败: {str(e)}")
-            return self._simple_next_speaker_decision(current_result)
+            return self._simple_next_speaker_decision(current_result, excluded_agents)
     
     # ==========================================================================
     # 📝 标准化响应处理
@@ -1033,32 +1502,31 @@ Your main response message here
         else:
             return "请返回结构化的响应信息"
     
-    def _simple_next_speaker_decision(self, current_result: Dict[str, Any]) -> Optional[str]:
+    def _simple_next_speaker_decision(self, current_result: Dict[str, Any],
+                                      excluded_agents: Set[str] = frozenset()) -> Optional[str]:
         """简单的下一个发言者决策"""
         # 如果当前任务成功，可能需要测试智能体
         if current_result.get("success", False):
             for agent_id, info in self.registered_agents.items():
                 if (AgentCapability.TEST_GENERATION in info.capabilities and 
-                    info.status == AgentStatus.IDLE):
+                    info.status == AgentStatus.IDLE and agent_id not in excluded_agents):
                     return agent_id
         
         return None  # 继续当前智能体
 
-    def _detect_loop(self, conversation_id: str, agent_id: str, response: Dict[str, Any]) -> bool:
-        """检测循环模式"""
-        if conversation_id not in self.repetition_tracker:
-            self.repetition_tracker[conversation_id] = []
-        
+    def _detect_loop(self, conversation: ConversationContext, agent_id: str,
+                     response: Dict[str, Any]) -> bool:
+        """检测循环模式（基于该对话自身的发言记录）"""
         # 记录当前轮次信息
         message_key = f"{agent_id}:{response.get('message', '')[:100]}"
-        self.repetition_tracker[conversation_id].append(message_key)
+        conversation.repetition_tracker.append(message_key)
         
         # 只保留最近10轮记录
-        if len(self.repetition_tracker[conversation_id]) > 10:
-            self.repetition_tracker[conversation_id] = self.repetition_tracker[conversation_id][-10:]
+        if len(conversation.repetition_tracker) > 10:
+            del conversation.repetition_tracker[:-10]
         
         # 检测重复模式
-        recent_history = self.repetition_tracker[conversation_id]
+        recent_history = conversation.repetition_tracker
         if len(recent_history) < 3:
             return False
         
@@ -1154,9 +1622,14 @@ Your main response message here
                     "file_contents": file_contents}
         )
     
-    def get_conversation_statistics(self) -> Dict[str, Any]:
-        """获取对话统计"""
-        total_conversations = len(set(record.conversation_id for record in self.conversation_history))
+    def get_conversation_statistics(self, conversation_id: str = None) -> Dict[str, Any]:
+        """获取对话统计
+        
+        token_usage 来自全局token账本：指定conversation_id时返回该对话（含子任务与流水线评审）
+        按智能体/模型的明细，否则汇总本协调者经历的所有对话。
+        """
+        conversation_ids = set(record.conversation_id for record in self.conversation_history)
+        total_conversations = len(conversation_ids)
         total_rounds = len(self.conversation_history)
         
         agent_activity = {}
@@ -1174,7 +1647,13 @@ Your main response message here
             "average_rounds_per_conversation": total_rounds / max(total_conversations, 1),
             "agent_activity": agent_activity,
             "current_state": self.conversation_state.value,
-            "team_status": self.get_team_status()
+            "active_conversations": [conversation.to_dict() for conversation in self.conversations.values()],
+            "routing": dict(self.routing_stats),
+            "analysis_cache": self.analysis_cache.get_stats() if self.analysis_cache else None,
+            "team_status": self.get_team_status(),
+            "token_usage": (token_ledger.get_conversation_usage(conversation_id, include_children=True)
+                            if conversation_id
+                            else token_ledger.get_summary(conversation_ids, include_children=True))
         }
     
     def save_conversation_log(self, output_path: str = None) -> str:
@@ -41,6 +41,15 @@ class ConversationState(Enum):
     FAILED = "failed"
 
 
+class SubTaskStatus(Enum):
+    """子任务状态枚举"""
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    SKIPPED = "skipped"  # 上游子任务失败，未执行
+
+
 class MessageType(Enum):
     """消息类型枚举"""
     TASK_REQUEST = "task_request"
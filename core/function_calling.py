@@ -278,6 +278,37 @@ TOOL_CALL: 工具名称(参数名="参数值", 参数名2="参数值2")
 """
         return prompt
     
+    def get_openai_tools(self) -> List[Dict[str, Any]]:
+        """生成OpenAI兼容的tools定义（JSON Schema），用于原生工具调用"""
+        tools = []
+        for tool_name, desc in self.tool_descriptions.items():
+            properties = {}
+            required = []
+            for param_name, param_info in desc['parameters'].items():
+                schema = {
+                    "type": param_info.get('type', 'string'),
+                    "description": param_info.get('description', '')
+                }
+                if schema["type"] == "array":
+                    schema["items"] = param_info.get('items', {"type": "string"})
+                properties[param_name] = schema
+                if param_info.get('required', False):
+                    required.append(param_name)
+            
+            tools.append({
+                "type": "function",
+                "function": {
+                    "name": tool_name,
+                    "description": desc['description'],
+                    "parameters": {
+                        "type": "object",
+                        "properties": properties,
+                        "required": required
+                    }
+                }
+            })
+        return tools
+    
     async def execute_tool(self, tool_call: ToolCall) -> ToolResult:
         """执行工具调用"""
         if tool_call.tool_name not in self.tools:
@@ -316,6 +347,14 @@ TOOL_CALL: 工具名称(参数名="参数值", 参数名2="参数值2")
 class FunctionCallingAgent(ABC):
     """支持Function Calling的智能体基类"""
     
+    # 默认_call_llm使用的生成参数与调用类型
+    llm_temperature: float = 0.3
+    llm_max_tokens: int = 3000
+    llm_purpose: str = "function_calling"
+    
+    # 是否使用提供商原生的tools/tool_calls（None表示跟随LLMConfig.native_tool_calling）
+    native_tool_calling: Optional[bool] = None
+    
     def __init__(self):
         self.tool_parser = ToolCallParser()
         self.tool_registry = ToolRegistry()
@@ -331,10 +370,15 @@ class FunctionCallingAgent(ABC):
     
     async def process_with_function_calling(self, user_request: str, 
                                           max_iterations: int = 5) -> str:
-        """使用Function Calling处理请求"""
+        """使用Function Calling处理请求
+        
+        启用原生工具调用时通过tools字段传递工具定义，system prompt不再附带文本工具目录；
+        提供商拒绝原生工具请求（4xx）时自动退回文本解析模式。
+        """
+        native = self._use_native_tool_calling()
         
-        # 构建包含工具说明的system prompt
-        system_prompt = self._build_system_prompt()
+        # 构建system prompt（文本模式下包含工具说明）
+        system_prompt = self._build_system_prompt(include_tools=not native)
         
         # 初始对话
         conversation = [
@@ -345,10 +389,26 @@ class FunctionCallingAgent(ABC):
         for iteration in range(max_iterations):
             self.logger.info(f"🔄 Function Calling 迭代 {iteration + 1}/{max_iterations}")
             
-            # 调用LLM
-            llm_response = await self._call_llm(conversation)
+            if native:
+                try:
+                    llm_response, tool_calls = await self._call_llm_with_tools(conversation)
+                except Exception as e:
+                    # 只有提供商拒绝请求时才改用文本协议；5xx、熔断、截止时间等暂时性错误直接抛出
+                    if not self._is_tools_rejected(e):
+                        raise
+                    self.logger.warning(f"⚠️ 原生工具调用被拒绝，退回文本解析模式: {str(e)}")
+                    native = False
+                    conversation[:] = self._to_text_protocol(conversation)
+                
+                if native and tool_calls:
+                    await self._execute_native_tool_calls(conversation, llm_response, tool_calls)
+                    continue
+            
+            if not native:
+                # 调用LLM
+                llm_response = await self._call_llm(conversation)
             
-            # 解析工具调用
+            # 解析工具调用（原生模式下作为模型以文本形式输出调用时的兜底）
             tool_calls = self.tool_parser.parse_tool_calls(llm_response)
             
             if not tool_calls:
@@ -368,26 +428,149 @@ class FunctionCallingAgent(ABC):
                 result_message = self._format_tool_result(tool_call, tool_result)
                 conversation.append({"role": "user", "content": result_message})
         
-        # 达到最大迭代次数
+        # 达到最大迭代次数（对话中含原生工具消息时仍需携带tools定义）
+        if native:
+            final_response, _ = await self._call_llm_with_tools(conversation)
+            return final_response
         final_response = await self._call_llm(conversation)
         return final_response
     
-    def _build_system_prompt(self) -> str:
-        """构建包含工具说明的system prompt"""
+    def _build_system_prompt(self, include_tools: bool = True) -> str:
+        """构建system prompt，include_tools为True时附带文本工具说明"""
         base_prompt = self._get_base_system_prompt()
+        if not include_tools:
+            return base_prompt
         tools_prompt = self.tool_registry.get_tools_prompt()
         
         return f"{base_prompt}\n\n{tools_prompt}"
     
+    def _use_native_tool_calling(self) -> bool:
+        """是否启用原生工具调用"""
+        if self.native_tool_calling is not None:
+            return self.native_tool_calling
+        llm_client = getattr(self, "llm_client", None)
+        return bool(llm_client is not None and
+                    hasattr(llm_client, "send_messages_with_tools") and
+                    getattr(llm_client.config, "native_tool_calling", False))
+    
+    @staticmethod
+    def _is_tools_rejected(error: Exception) -> bool:
+        """原生工具请求是否被提供商拒绝（4xx响应，429限流除外）"""
+        if isinstance(error, NotImplementedError):
+            return True
+        status = getattr(error, "status", None)
+        return isinstance(status, int) and 400 <= status < 500 and status != 429
+    
+    async def _call_llm_with_tools(self, conversation: List[Dict[str, Any]]):
+        """以原生tools字段调用LLM，返回 (文本内容, 工具调用列表)"""
+        response = await self.llm_client.send_messages_with_tools(
+            conversation,
+            tools=self.tool_registry.get_openai_tools(),
+            temperature=self.llm_temperature,
+            max_tokens=self.llm_max_tokens,
+            purpose=self.llm_purpose
+        )
+        tool_calls = [
+            ToolCall(tool_name=call["name"], parameters=call["arguments"], call_id=call["id"])
+            for call in response.tool_calls
+        ]
+        return response.content, tool_calls
+    
+    async def _execute_native_tool_calls(self, conversation: List[Dict[str, Any]],
+                                         content: str, tool_calls: List[ToolCall]):
+        """执行原生工具调用，并按assistant/tool角色追加到对话中"""
+        conversation.append({
+            "role": "assistant",
+            "content": content or None,
+            "tool_calls": [
+                {
+                    "id": tool_call.call_id,
+                    "type": "function",
+                    "function": {
+                        "name": tool_call.tool_name,
+                        "arguments": json.dumps(tool_call.parameters, ensure_ascii=False)
+                    }
+                }
+                for tool_call in tool_calls
+            ]
+        })
+        
+        for tool_call in tool_calls:
+            self.logger.info(f"🔧 执行工具调用: {tool_call.tool_name}")
+            tool_result = await self.tool_registry.execute_tool(tool_call)
+            conversation.append({
+                "role": "tool",
+                "tool_call_id": tool_call.call_id,
+                "content": json.dumps({
+                    "success": tool_result.success,
+                    "result": tool_result.result,
+                    "error": tool_result.error
+                }, ensure_ascii=False, default=str)
+            })
+    
+    def _to_text_protocol(self, conversation: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        """将原生工具对话改写为文本协议：system prompt附带工具目录，
+        assistant的tool_calls改为JSON调用代码块，tool角色的结果改为user消息，
+        使退回文本模式后的请求不含需要tools定义才能解析的消息"""
+        calls: Dict[str, ToolCall] = {}
+        converted = []
+        for message in conversation:
+            role = message.get("role")
+            if role == "system" and not converted:
+                converted.append({"role": "system", "content": self._build_system_prompt()})
+            elif role == "assistant" and message.get("tool_calls"):
+                blocks = [message["content"]] if message.get("content") else []
+                for call in message["tool_calls"]:
+                    function = call.get("function", {})
+                    arguments = function.get("arguments") or {}
+                    if isinstance(arguments, str):
+                        try:
+                            arguments = json.loads(arguments)
+                        except json.JSONDecodeError:
+                            arguments = {}
+                    tool_call = ToolCall(tool_name=function.get("name", ""),
+                                         parameters=arguments, call_id=call.get("id"))
+                    calls[tool_call.call_id] = tool_call
+                    blocks.append("```json\n" + json.dumps({
+                        "tool_name": tool_call.tool_name,
+                        "parameters": tool_call.parameters,
+                        "call_id": tool_call.call_id
+                    }, ensure_ascii=False, indent=2) + "\n```")
+                converted.append({"role": "assistant", "content": "\n\n".join(blocks)})
+            elif role == "tool":
+                call_id = message.get("tool_call_id")
+                tool_call = calls.get(call_id) or ToolCall(tool_name="unknown", parameters={}, call_id=call_id)
+                try:
+                    payload = json.loads(message.get("content") or "{}")
+                except json.JSONDecodeError:
+                    payload = {"success": True, "result": message.get("content")}
+                tool_result = ToolResult(call_id=call_id, success=bool(payload.get("success")),
+                                         result=payload.get("result"), error=payload.get("error"))
+                converted.append({"role": "user", "content": self._format_tool_result(tool_call, tool_result)})
+            else:
+                converted.append({"role": role, "content": message.get("content") or ""})
+        return converted
+    
     @abstractmethod
     def _get_base_system_prompt(self) -> str:
         """子类实现：获取基础system prompt"""
         pass
     
-    @abstractmethod
     async def _call_llm(self, conversation: List[Dict[str, str]]) -> str:
-        """子类实现：调用LLM"""
-        pass
+        """调用LLM：以角色分离的消息数组发送完整对话
+        
+        默认使用子类的 self.llm_client（EnhancedLLMClient），子类可覆盖。
+        """
+        try:
+            return await self.llm_client.send_messages(
+                conversation,
+                temperature=self.llm_temperature,
+                max_tokens=self.llm_max_tokens,
+                purpose=self.llm_purpose
+            )
+        except Exception as e:
+            self.logger.error(f"❌ LLM调用失败: {str(e)}")
+            raise
     
     def _format_tool_result(self, tool_call: ToolCall, tool_result: ToolResult) -> str:
         """格式化工具调用结果"""
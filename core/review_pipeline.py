@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+设计→评审流水线 - 监听设计智能体保存的文件，经队列流式交给评审智能体
+
+Pipelined Design→Review Hand-off via File Listeners and asyncio.Queue
+"""
+
+import asyncio
+import logging
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Iterable
+
+from .base_agent import BaseAgent, FileReference
+
+
+# 处理单个文件的函数：文件引用 -> 结果字典
+FileHandler = Callable[[FileReference], Awaitable[Dict[str, Any]]]
+
+
+class ReviewPipeline:
+    """
+    文件流水线
+
+    在上游智能体上注册文件监听器：每保存一个匹配类型、属于本对话（含子对话）的文件，
+    就放入asyncio.Queue，由max_workers个后台任务调用handler处理。
+    这样模块N的评审/测试与模块N+1的设计重叠执行，而不必等待设计阶段全部结束。
+    """
+
+    def __init__(self, conversation_id: str, sources: Iterable[BaseAgent], handler: FileHandler,
+                 file_types: Iterable[str] = ("verilog",), max_workers: int = 2):
+        self.conversation_id = conversation_id
+        self.sources = list(sources)
+        self.handler = handler
+        self.file_types = set(file_types)
+        self.max_workers = max(1, max_workers)
+        self.logger = logging.getLogger("ReviewPipeline")
+
+        self._queue: "asyncio.Queue[Optional[FileReference]]" = asyncio.Queue()
+        self._latest: Dict[str, FileReference] = {}
+        self._workers: List[asyncio.Task] = []
+        self.results: List[Dict[str, Any]] = []
+        self.stats = {"queued": 0, "processed": 0, "superseded": 0, "failed": 0}
+
+    def _matches(self, file_ref: FileReference) -> bool:
+        if file_ref.file_type not in self.file_types:
+            return False
+        conversation_id = (file_ref.metadata or {}).get("conversation_id") or ""
+        return (conversation_id == self.conversation_id or
+                conversation_id.startswith(f"{self.conversation_id}."))
+
+    def _on_file_saved(self, file_ref: FileReference):
+        """文件监听器：匹配的文件立即入队"""
+        if not self._matches(file_ref):
+            return
+        self._latest[file_ref.file_path] = file_ref
+        self._queue.put_nowait(file_ref)
+        self.stats["queued"] += 1
+        self.logger.info(f"📤 流水线入队: {file_ref.file_path} (待处理: {self._queue.qsize()})")
+
+    async def start(self):
+        """注册监听器并启动后台处理任务"""
+        for agent in self.sources:
+            agent.add_file_listener(self._on_file_saved)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_workers)]
+
+    async def _worker(self):
+        while True:
+            file_ref = await self._queue.get()
+            try:
+                if file_ref is None:
+                    return
+                # 同一文件在处理前被重新保存时只处理最新版本
+                if self._latest.get(file_ref.file_path) is not file_ref:
+                    self.stats["superseded"] += 1
+                    continue
+                try:
+                    result = await self.handler(file_ref)
+                except Exception as e:
+                    self.logger.error(f"❌ 流水线处理失败 {file_ref.file_path}: {str(e)}")
+                    result = {"success": False, "error": str(e)}
+                if not result.get("success", False):
+                    self.stats["failed"] += 1
+                self.stats["processed"] += 1
+                self.results.append({"file_path": file_ref.file_path, **result})
+            finally:
+                self._queue.task_done()
+
+    def _detach(self):
+        for agent in self.sources:
+            agent.remove_file_listener(self._on_file_saved)
+
+    async def finish(self) -> List[Dict[str, Any]]:
+        """停止接收新文件，等待已入队的文件处理完毕，返回处理结果"""
+        self._detach()
+        for _ in self._workers:
+            self._queue.put_nowait(None)
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        return self.results
+
+    async def cancel(self):
+        """停止接收新文件并取消未完成的处理"""
+        self._detach()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "pending": self._queue.qsize()}
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+任务分析缓存 - 按归一化的任务描述持久化缓存LLM任务分析结果
+
+Task-Analysis Cache Keyed on Normalized Task Descriptions
+"""
+
+import json
+import re
+from typing import Dict, Any, Optional
+
+from llm_integration.response_cache import LLMResponseCache
+
+
+# 分析提示或结果格式变化时递增，使旧缓存失效
+ANALYSIS_CACHE_VERSION = 1
+
+_VERILOG_LITERAL_RE = re.compile(r"\d*'[sS]?[bBoOdDhH][0-9a-fA-F_xXzZ?]+")
+_HEX_RE = re.compile(r"(?<![a-z0-9_])0x[0-9a-f]+(?![a-z0-9_])")
+_QUOTED_IDENTIFIER_RE = re.compile(r"`[^`\n]+`")
+_IDENTIFIER_RE = re.compile(r"(?<![a-z0-9_])[a-z][a-z0-9]*(?:_[a-z0-9]+)+(?![a-z0-9_])")
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+_WHITESPACE_RE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = " 。．.!！?？;；"
+
+
+def normalize_task_description(task_description: str) -> str:
+    """
+    归一化任务描述：统一大小写与空白，将数值（位宽、常量）替换为<n>，
+    将模块/信号名等标识符替换为<id>，使同一模板的任务得到相同的键
+    """
+    text = task_description.lower()
+    text = _QUOTED_IDENTIFIER_RE.sub("<id>", text)
+    text = _VERILOG_LITERAL_RE.sub("<n>", text)
+    text = _HEX_RE.sub("<n>", text)
+    text = _IDENTIFIER_RE.sub("<id>", text)
+    text = _NUMBER_RE.sub("<n>", text)
+    text = _WHITESPACE_RE.sub(" ", text)
+    return text.strip(_TRAILING_PUNCTUATION)
+
+
+class TaskAnalysisCache:
+    """
+    任务分析结果缓存
+
+    以归一化任务描述（加模型名与缓存版本）为键，存放在独立SQLite文件的task_analysis
+    数据表中（默认./output/task_analysis_cache.db）；命中率见get_stats()。
+    协程中使用aget/aput，SQLite读写在线程池中执行，不阻塞事件循环。
+    """
+
+    def __init__(self, db_path: str, ttl_seconds: float = 604800, max_entries: int = 1000,
+                 model_name: Optional[str] = None):
+        self.model_name = model_name
+        self.cache = LLMResponseCache(db_path, ttl_seconds=ttl_seconds,
+                                      max_entries=max_entries, table="task_analysis")
+
+    def make_key(self, task_description: str) -> str:
+        return LLMResponseCache.make_key(
+            task=normalize_task_description(task_description),
+            model=self.model_name,
+            version=ANALYSIS_CACHE_VERSION
+        )
+
+    def get(self, task_description: str) -> Optional[Dict[str, Any]]:
+        """读取缓存的分析结果（不含上下文），未命中返回None"""
+        return self._decode(self.cache.get(self.make_key(task_description)))
+
+    def put(self, task_description: str, analysis: Dict[str, Any]):
+        """写入分析结果；上下文随请求变化，不写入缓存"""
+        self.cache.put(self.make_key(task_description), self._encode(analysis))
+
+    async def aget(self, task_description: str) -> Optional[Dict[str, Any]]:
+        """在线程池中读取缓存的分析结果，未命中返回None"""
+        return self._decode(await self.cache.aget(self.make_key(task_description)))
+
+    async def aput(self, task_description: str, analysis: Dict[str, Any]):
+        """在线程池中写入分析结果"""
+        await self.cache.aput(self.make_key(task_description), self._encode(analysis))
+
+    @staticmethod
+    def _decode(value: Optional[str]) -> Optional[Dict[str, Any]]:
+        if value is None:
+            return None
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            return None
+
+    @staticmethod
+    def _encode(analysis: Dict[str, Any]) -> str:
+        cached = {key: value for key, value in analysis.items() if key != "context"}
+        return json.dumps(cached, ensure_ascii=False, default=str)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return self.cache.get_stats()
+
+    def close(self):
+        self.cache.close()
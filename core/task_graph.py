@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+任务依赖图 - 将大任务分解为子任务DAG，上游就绪后立即并行调度
+
+Task Dependency Graph (DAG) Decomposition and Parallel Subtask Scheduling
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Iterator
+
+from .base_agent import FileReference
+from .enums import SubTaskStatus
+
+
+class TaskGraphError(ValueError):
+    """子任务依赖图无效（重复ID、未知依赖或存在环）"""
+    pass
+
+
+@dataclass
+class SubTask:
+    """子任务节点"""
+    task_id: str
+    description: str
+    task_type: str = "design"
+    required_capabilities: List[str] = field(default_factory=list)
+    depends_on: List[str] = field(default_factory=list)
+    status: SubTaskStatus = SubTaskStatus.PENDING
+    agent_id: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def file_references(self) -> List[FileReference]:
+        """子任务产出的文件引用"""
+        return (self.result or {}).get("file_references", [])
+
+    def to_analysis(self) -> Dict[str, Any]:
+        """转换为select_best_agent使用的任务分析格式"""
+        return {
+            "task_type": self.task_type,
+            "required_capabilities": list(self.required_capabilities),
+            "description": self.description,
+            "dependencies": list(self.depends_on)
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "task_id": self.task_id,
+            "description": self.description,
+            "task_type": self.task_type,
+            "required_capabilities": self.required_capabilities,
+            "depends_on": self.depends_on,
+            "status": self.status.value,
+            "agent_id": self.agent_id,
+            "duration": (self.finished_at - self.started_at
+                         if self.started_at and self.finished_at else None),
+            "file_references": [ref.file_path for ref in self.file_references]
+        }
+
+
+# 子任务执行函数：(子任务, 已完成的上游子任务列表) -> 结果字典（含success与file_references）
+SubTaskRunner = Callable[[SubTask, List[SubTask]], Awaitable[Dict[str, Any]]]
+
+
+class TaskGraph:
+    """
+    子任务依赖图
+
+    execute() 在子任务的全部上游完成后立即调度它，独立分支并发执行
+    （最多max_parallel个）；上游失败时下游子任务标记为SKIPPED。
+    """
+
+    def __init__(self, subtasks: List[SubTask] = None):
+        self.subtasks: Dict[str, SubTask] = {}
+        self.logger = logging.getLogger("TaskGraph")
+        for subtask in subtasks or []:
+            self.add(subtask)
+
+    def __len__(self) -> int:
+        return len(self.subtasks)
+
+    def __iter__(self) -> Iterator[SubTask]:
+        return iter(self.subtasks.values())
+
+    def add(self, subtask: SubTask):
+        if subtask.task_id in self.subtasks:
+            raise TaskGraphError(f"子任务ID重复: {subtask.task_id}")
+        self.subtasks[subtask.task_id] = subtask
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'TaskGraph':
+        """从LLM分解结果构建：{"subtasks": [{"id", "description", "task_type",
+        "required_capabilities", "depends_on"}]}"""
+        items = data.get("subtasks", []) if isinstance(data, dict) else data
+        if not isinstance(items, list):
+            raise TaskGraphError("分解结果中缺少subtasks列表")
+        graph = cls()
+        for index, item in enumerate(items):
+            if not isinstance(item, dict) or not item.get("description"):
+                raise TaskGraphError(f"第{index + 1}个子任务缺少description")
+            depends_on = item.get("depends_on", item.get("dependencies")) or []
+            if isinstance(depends_on, str):
+                depends_on = [depends_on]
+            graph.add(SubTask(
+                task_id=str(item.get("id") or item.get("task_id") or f"subtask_{index + 1}"),
+                description=item["description"],
+                task_type=item.get("task_type", "design"),
+                required_capabilities=list(item.get("required_capabilities") or []),
+                depends_on=[str(dependency) for dependency in depends_on]
+            ))
+        graph.validate()
+        return graph
+
+    def validate(self):
+        """检查未知依赖与环"""
+        for subtask in self.subtasks.values():
+            unknown = [dep for dep in subtask.depends_on if dep not in self.subtasks]
+            if unknown:
+                raise TaskGraphError(f"子任务 {subtask.task_id} 依赖未知子任务: {unknown}")
+        if len(self.topological_order()) != len(self.subtasks):
+            raise TaskGraphError("子任务依赖存在环")
+
+    def topological_order(self) -> List[str]:
+        """按依赖排序的子任务ID（存在环时只返回无环部分）"""
+        remaining = {task_id: set(subtask.depends_on) for task_id, subtask in self.subtasks.items()}
+        order = []
+        ready = [task_id for task_id, deps in remaining.items() if not deps]
+        while ready:
+            task_id = ready.pop(0)
+            order.append(task_id)
+            for other_id, deps in remaining.items():
+                if task_id in deps:
+                    deps.discard(task_id)
+                    if not deps:
+                        ready.append(other_id)
+        return order
+
+    def ready(self) -> List[SubTask]:
+        """上游全部完成、尚未开始的子任务"""
+        return [
+            subtask for subtask in self.subtasks.values()
+            if subtask.status == SubTaskStatus.PENDING and all(
+                self.subtasks[dep].status == SubTaskStatus.COMPLETED for dep in subtask.depends_on)
+        ]
+
+    def upstream(self, subtask: SubTask) -> List[SubTask]:
+        return [self.subtasks[dep] for dep in subtask.depends_on]
+
+    def _skip_blocked(self):
+        """上游失败或被跳过的子任务标记为SKIPPED（按拓扑序传播）"""
+        blocked = (SubTaskStatus.FAILED, SubTaskStatus.SKIPPED)
+        for task_id in self.topological_order():
+            subtask = self.subtasks[task_id]
+            if subtask.status == SubTaskStatus.PENDING and any(
+                    self.subtasks[dep].status in blocked for dep in subtask.depends_on):
+                subtask.status = SubTaskStatus.SKIPPED
+                self.logger.warning(f"⏭️ 上游失败，跳过子任务: {task_id}")
+
+    async def execute(self, runner: SubTaskRunner, max_parallel: int = 4) -> bool:
+        """执行依赖图，返回是否全部子任务成功"""
+        self.validate()
+        max_parallel = max(1, max_parallel)
+        running: Dict[asyncio.Task, SubTask] = {}
+        try:
+            while True:
+                self._skip_blocked()
+                for subtask in self.ready()[:max_parallel - len(running)]:
+                    subtask.status = SubTaskStatus.RUNNING
+                    subtask.started_at = time.time()
+                    self.logger.info(f"▶️ 调度子任务: {subtask.task_id} (并行: {len(running) + 1})")
+                    running[asyncio.create_task(runner(subtask, self.upstream(subtask)))] = subtask
+                if not running:
+                    break
+
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    subtask = running.pop(task)
+                    subtask.finished_at = time.time()
+                    try:
+                        subtask.result = task.result()
+                    except Exception as e:
+                        self.logger.error(f"❌ 子任务异常 {subtask.task_id}: {str(e)}")
+                        subtask.result = {"success": False, "error": str(e)}
+                    subtask.status = (SubTaskStatus.COMPLETED if subtask.result.get("success", False)
+                                      else SubTaskStatus.FAILED)
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+        return all(subtask.status == SubTaskStatus.COMPLETED for subtask in self.subtasks.values())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "order": self.topological_order(),
+            "subtasks": [subtask.to_dict() for subtask in self.subtasks.values()]
+        }
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+夜间批处理审查示例
+
+Nightly Batch Review Driver: queues reviews for every Verilog file under the
+given directories and submits them as a few provider batch jobs.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from config.config import FrameworkConfig
+from agents.real_code_reviewer import RealCodeReviewAgent
+
+
+VERILOG_SUFFIXES = (".v", ".sv")
+
+
+def collect_modules(roots):
+    """按所在目录分组收集Verilog文件，每个目录作为一次审查"""
+    modules = defaultdict(dict)
+    for root in roots:
+        for path in sorted(Path(root).rglob("*")):
+            if path.suffix in VERILOG_SUFFIXES and path.is_file():
+                modules[str(path.parent)][str(path)] = path.read_text(encoding="utf-8", errors="replace")
+    return modules
+
+
+async def main():
+    """将所有模块的文件审查累积后统一提交批处理作业"""
+    parser = argparse.ArgumentParser(description="夜间回归批处理代码审查")
+    parser.add_argument("roots", nargs="+", help="包含Verilog文件的目录")
+    parser.add_argument("--output", default="./output/nightly_review.json", help="审查报告路径")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    config = FrameworkConfig.from_env()
+    reviewer = RealCodeReviewAgent(config)
+
+    try:
+        # 1. 跨模块累积审查请求（不提交）
+        modules = collect_modules(args.roots)
+        for module_dir, code_files in modules.items():
+            reviewer.queue_batch_reviews(code_files, task_context=f"夜间回归审查: {module_dir}")
+        print(f"📦 已累积 {sum(len(files) for files in modules.values())} 个文件审查，"
+              f"处理器: {config.llm.batch_processor}")
+
+        # 2. 统一提交批处理作业并等待结果（不受交互式对话截止时间约束）
+        start = time.time()
+        results = await reviewer.flush_batch_reviews()
+        print(f"✅ 批处理审查完成: {len(results)} 个文件，耗时 {time.time() - start:.1f}s")
+
+        # 3. 保存审查报告
+        output = Path(args.output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump({
+                "generated_at": time.time(),
+                "results": results,
+                "batch_stats": reviewer.batch_queue.get_stats()
+            }, f, ensure_ascii=False, indent=2, default=str)
+        print(f"💾 审查报告已保存: {output}")
+    finally:
+        await reviewer.llm_client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -5,8 +5,52 @@ LLM集成模块
 LLM Integration Module for Centralized Agent Framework
 """
 
-from .enhanced_llm_client import EnhancedLLMClient
+from .enhanced_llm_client import EnhancedLLMClient, BatchPromptResult, RateLimitError
+from .response_cache import LLMResponseCache
+from .rate_limiter import EndpointRateLimiter, TokenBucket, get_endpoint_limiter
+from .endpoint_pool import EndpointPool, LLMEndpoint, get_endpoint
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
+from .hedging import LatencyTracker, latency_tracker
+from .cassette import LLMCassette, CassetteMissError
+from .call_context import (LLMCallContext, DeadlineExceededError, get_call_context,
+                           llm_call_scope, time_remaining, check_deadline)
+from .token_ledger import TokenLedger, token_ledger
+from .json_repair import JSONRepairError, parse_llm_json, repair_json
+from .batch_jobs import (LLMBatchQueue, LocalBatchProcessor, OpenAIBatchProcessor,
+                         BatchJobError, BatchDeadlineError, create_batch_queue)
 
 __all__ = [
-    'EnhancedLLMClient'
+    'EnhancedLLMClient',
+    'BatchPromptResult',
+    'RateLimitError',
+    'LLMResponseCache',
+    'EndpointRateLimiter',
+    'TokenBucket',
+    'get_endpoint_limiter',
+    'EndpointPool',
+    'LLMEndpoint',
+    'get_endpoint',
+    'CircuitBreaker',
+    'CircuitOpenError',
+    'LatencyTracker',
+    'latency_tracker',
+    'LLMCassette',
+    'CassetteMissError',
+    'LLMCallContext',
+    'DeadlineExceededError',
+    'get_call_context',
+    'llm_call_scope',
+    'time_remaining',
+    'check_deadline',
+    'TokenLedger',
+    'token_ledger',
+    'JSONRepairError',
+    'parse_llm_json',
+    'repair_json',
+    'LLMBatchQueue',
+    'LocalBatchProcessor',
+    'OpenAIBatchProcessor',
+    'BatchJobError',
+    'BatchDeadlineError',
+    'create_batch_queue'
 ]
\ No newline at end of file
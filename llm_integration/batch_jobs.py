@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+LLM批处理作业 - 离线累积请求，经提供商批处理接口高吞吐执行
+
+Offline Batch-Job Mode for Bulk LLM Workloads (JSONL job files,
+OpenAI-compatible /files + /batches, and a local stand-in processor)
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import time
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Any, Optional, List, Union
+
+import aiohttp
+
+from .call_context import time_remaining
+
+
+class BatchJobError(Exception):
+    """批处理作业失败，或作业中的单个请求失败"""
+    pass
+
+
+class BatchDeadlineError(BatchJobError):
+    """调用截止时间前批处理作业未完成（作业已尝试取消）"""
+    pass
+
+
+@dataclass
+class _PendingRequest:
+    """队列中等待提交的请求"""
+    custom_id: str
+    body: Dict[str, Any]
+    future: asyncio.Future
+
+
+class BatchProcessor(ABC):
+    """批处理执行器：读取JSONL作业文件，写出同格式的结果文件"""
+
+    @abstractmethod
+    async def process(self, job_file: Path, output_file: Path) -> Path:
+        """执行作业，返回结果文件路径"""
+        pass
+
+
+class LocalBatchProcessor(BatchProcessor):
+    """
+    本地替代处理器
+
+    逐行读取作业文件，通过EnhancedLLMClient并发执行，并按OpenAI批处理输出格式
+    写出结果，用于测试以及没有批处理接口的提供商（如本地Ollama）。
+    """
+
+    def __init__(self, llm_client, max_concurrency: int = 8):
+        self.llm_client = llm_client
+        self.max_concurrency = max_concurrency
+
+    async def process(self, job_file: Path, output_file: Path) -> Path:
+        with open(job_file, 'r', encoding='utf-8') as f:
+            lines = [json.loads(line) for line in f if line.strip()]
+
+        results = await self.llm_client.send_prompts_batch(
+            [
+                {
+                    "messages": line["body"]["messages"],
+                    "temperature": line["body"].get("temperature"),
+                    "max_tokens": line["body"].get("max_tokens"),
+                    "json_mode": (line["body"].get("response_format") or {}).get("type") == "json_object",
+                    "purpose": purpose_from_custom_id(line["custom_id"])
+                }
+                for line in lines
+            ],
+            max_concurrency=self.max_concurrency
+        )
+
+        with open(output_file, 'w', encoding='utf-8') as f:
+            for line, result in zip(lines, results):
+                if result.success:
+                    record = {
+                        "custom_id": line["custom_id"],
+                        "response": {
+                            "status_code": 200,
+                            "body": {"choices": [{
+                                "index": 0,
+                                "finish_reason": "stop",
+                                "message": {"role": "assistant", "content": result.response}
+                            }]}
+                        },
+                        "error": None
+                    }
+                else:
+                    record = {
+                        "custom_id": line["custom_id"],
+                        "response": None,
+                        "error": {"code": "local_error", "message": result.error}
+                    }
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return output_file
+
+
+class OpenAIBatchProcessor(BatchProcessor):
+    """
+    OpenAI兼容批处理接口
+
+    上传作业文件（POST /files, purpose=batch），创建批处理（POST /batches），
+    轮询直到结束，再下载结果文件与错误文件。
+
+    轮询受当前调用截止时间约束：剩余时间不足fallback_reserve秒时取消作业并抛出
+    BatchDeadlineError，为调用方改走交互式请求留出时间。
+    """
+
+    TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+    def __init__(self, base_url: str, api_key: Optional[str], poll_interval: float = 30.0,
+                 completion_window: str = "24h", fallback_reserve: float = 60.0):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.poll_interval = poll_interval
+        self.completion_window = completion_window
+        self.fallback_reserve = fallback_reserve
+        self.logger = logging.getLogger("OpenAIBatchProcessor")
+
+    async def process(self, job_file: Path, output_file: Path) -> Path:
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        async with aiohttp.ClientSession(headers=headers) as session:
+            form = aiohttp.FormData()
+            form.add_field("purpose", "batch")
+            with open(job_file, 'rb') as f:
+                form.add_field("file", f.read(), filename=job_file.name,
+                               content_type="application/jsonl")
+            uploaded = await self._request_json(session, "POST", "/files", data=form)
+
+            batch = await self._request_json(session, "POST", "/batches", json={
+                "input_file_id": uploaded["id"],
+                "endpoint": "/v1/chat/completions",
+                "completion_window": self.completion_window
+            })
+            self.logger.info(f"📤 已提交批处理作业: {batch['id']} ({job_file.name})")
+
+            while batch.get("status") not in self.TERMINAL_STATUSES:
+                remaining = time_remaining()
+                if remaining is not None and remaining - self.fallback_reserve <= 0:
+                    await self._cancel(session, batch["id"])
+                    raise BatchDeadlineError(f"批处理作业 {batch['id']} 未能在截止时间前完成")
+                interval = self.poll_interval
+                if remaining is not None:
+                    interval = min(interval, remaining - self.fallback_reserve)
+                await asyncio.sleep(interval)
+                batch = await self._request_json(session, "GET", f"/batches/{batch['id']}")
+
+            self.logger.info(f"📥 批处理作业结束: {batch['id']} 状态={batch['status']}")
+            if not batch.get("output_file_id") and not batch.get("error_file_id"):
+                raise BatchJobError(f"批处理作业 {batch['id']} 未产生结果: {batch.get('status')}")
+
+            with open(output_file, 'w', encoding='utf-8') as f:
+                for file_id in (batch.get("output_file_id"), batch.get("error_file_id")):
+                    if file_id:
+                        async with session.get(f"{self.base_url}/files/{file_id}/content") as response:
+                            response.raise_for_status()
+                            f.write(await response.text())
+        return output_file
+
+    async def _cancel(self, session: aiohttp.ClientSession, batch_id: str):
+        """尽力取消作业，避免截止时间后仍在提供商侧计费执行"""
+        try:
+            await self._request_json(session, "POST", f"/batches/{batch_id}/cancel")
+            self.logger.warning(f"⏹️ 已取消超过截止时间的批处理作业: {batch_id}")
+        except (BatchJobError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.logger.warning(f"⚠️ 取消批处理作业失败 {batch_id}: {str(e)}")
+
+    async def _request_json(self, session: aiohttp.ClientSession, method: str,
+                            path: str, **kwargs) -> Dict[str, Any]:
+        async with session.request(method, f"{self.base_url}{path}", **kwargs) as response:
+            if response.status >= 400:
+                raise BatchJobError(f"批处理接口请求失败 {method} {path}: "
+                                    f"{response.status} {await response.text()}")
+            return await response.json()
+
+
+def purpose_from_custom_id(custom_id: str) -> str:
+    """custom_id格式为 {purpose}-{序号}，本地处理器据此恢复调用类型"""
+    return custom_id.rsplit("-", 1)[0] if "-" in custom_id else "default"
+
+
+class LLMBatchQueue:
+    """
+    批处理作业队列
+
+    submit() 立即返回Future；flush() 将累积的请求按 max_batch_size 切分为JSONL作业文件，
+    提交给处理器并在结果返回后完成各Future。适合不要求交互延迟的大批量评审。
+
+    批处理作业的完成窗口可达数小时，应由离线/夜间驱动程序跨多次评审累积请求后统一flush()，
+    而不是在交互式对话中逐次提交并等待。在调用截止时间内flush()时，处理器因截止时间
+    放弃的作业由有llm_client的队列改用send_prompts_batch交互式执行。
+    """
+
+    def __init__(self, processor: BatchProcessor, llm_client=None,
+                 job_dir: str = "./output/batch_jobs", max_batch_size: int = 1000):
+        self.processor = processor
+        self.llm_client = llm_client
+        self.job_dir = Path(job_dir)
+        self.max_batch_size = max(1, max_batch_size)
+        self.logger = logging.getLogger("LLMBatchQueue")
+
+        self._pending: List[_PendingRequest] = []
+        self._sequence = itertools.count()
+        self.stats = {"submitted": 0, "jobs": 0, "succeeded": 0, "failed": 0, "fallbacks": 0}
+
+    def submit(self, messages: List[Dict[str, str]], temperature: float = 0.3,
+               max_tokens: int = 3000, json_mode: bool = False,
+               purpose: str = "review") -> asyncio.Future:
+        """加入一个请求，返回在作业完成后得到响应文本的Future"""
+        body = {
+            "model": self._model_name(purpose),
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }
+        if json_mode:
+            body["response_format"] = {"type": "json_object"}
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(_PendingRequest(
+            custom_id=f"{purpose}-{next(self._sequence)}", body=body, future=future))
+        self.stats["submitted"] += 1
+        return future
+
+    async def flush(self) -> List[Path]:
+        """提交所有累积的请求，等待结果并完成对应的Future，返回结果文件列表"""
+        pending, self._pending = self._pending, []
+        if not pending:
+            return []
+        chunks = [pending[i:i + self.max_batch_size]
+                  for i in range(0, len(pending), self.max_batch_size)]
+        return list(await asyncio.gather(*(self._run_job(chunk) for chunk in chunks)))
+
+    def submit_prompt(self, item: Union[str, Dict[str, Any]]) -> asyncio.Future:
+        """加入一个提示，参数格式同 EnhancedLLMClient.send_prompts_batch 的元素
+        （提示字符串，或 send_prompt/send_messages 的关键字参数字典）"""
+        kwargs = {"prompt": item} if isinstance(item, str) else dict(item)
+        messages = kwargs.pop("messages", None) or [
+            *([{"role": "system", "content": kwargs["system_prompt"]}]
+              if kwargs.get("system_prompt") else []),
+            {"role": "user", "content": kwargs["prompt"]}
+        ]
+        return self.submit(
+            messages,
+            temperature=kwargs.get("temperature", 0.3),
+            max_tokens=kwargs.get("max_tokens", 3000),
+            json_mode=kwargs.get("json_mode", False),
+            purpose=kwargs.get("purpose", "review")
+        )
+
+    async def _run_job(self, requests: List[_PendingRequest]) -> Path:
+        self.job_dir.mkdir(parents=True, exist_ok=True)
+        job_id = f"batch_{int(time.time())}_{uuid.uuid4().hex[:8]}"
+        job_file = self.job_dir / f"{job_id}.jsonl"
+        output_file = self.job_dir / f"{job_id}_output.jsonl"
+
+        with open(job_file, 'w', encoding='utf-8') as f:
+            for request in requests:
+                f.write(json.dumps({
+                    "custom_id": request.custom_id,
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": request.body
+                }, ensure_ascii=False) + "\n")
+        self.stats["jobs"] += 1
+        self.logger.info(f"📦 批处理作业 {job_id}: {len(requests)} 个请求")
+
+        try:
+            await self.processor.process(job_file, output_file)
+            outputs = self._read_outputs(output_file)
+        except BatchDeadlineError as e:
+            if self.llm_client is None:
+                self._fail_all(requests, e, job_id)
+                return output_file
+            self.logger.warning(f"⏱️ 批处理作业 {job_id} 超过截止时间，改为交互式请求")
+            await self._run_interactive(requests)
+            return output_file
+        except Exception as e:
+            self._fail_all(requests, e, job_id)
+            return output_file
+
+        for request in requests:
+            if request.future.done():
+                continue
+            output = outputs.get(request.custom_id)
+            error = self._output_error(output)
+            if error is None:
+                request.future.set_result(output["response"]["body"]["choices"][0]["message"]["content"])
+                self.stats["succeeded"] += 1
+            else:
+                request.future.set_exception(BatchJobError(error))
+                self.stats["failed"] += 1
+        return output_file
+
+    def _fail_all(self, requests: List[_PendingRequest], error: Exception, job_id: str):
+        self.logger.error(f"❌ 批处理作业失败 {job_id}: {str(error)}")
+        for request in requests:
+            if not request.future.done():
+                request.future.set_exception(BatchJobError(str(error)))
+        self.stats["failed"] += len(requests)
+
+    async def _run_interactive(self, requests: List[_PendingRequest]):
+        """通过EnhancedLLMClient.send_prompts_batch执行作业中的请求"""
+        results = await self.llm_client.send_prompts_batch([
+            {
+                "messages": request.body["messages"],
+                "temperature": request.body.get("temperature"),
+                "max_tokens": request.body.get("max_tokens"),
+                "json_mode": (request.body.get("response_format") or {}).get("type") == "json_object",
+                "purpose": purpose_from_custom_id(request.custom_id)
+            }
+            for request in requests
+        ])
+        self.stats["fallbacks"] += len(requests)
+        for request, result in zip(requests, results):
+            if request.future.done():
+                continue
+            if result.success:
+                request.future.set_result(result.response)
+                self.stats["succeeded"] += 1
+            else:
+                request.future.set_exception(BatchJobError(result.error))
+                self.stats["failed"] += 1
+
+    @staticmethod
+    def _read_outputs(output_file: Path) -> Dict[str, Dict[str, Any]]:
+        outputs = {}
+        with open(output_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    outputs[record["custom_id"]] = record
+        return outputs
+
+    @staticmethod
+    def _output_error(output: Optional[Dict[str, Any]]) -> Optional[str]:
+        """结果行的错误信息，成功时返回None"""
+        if output is None:
+            return "批处理结果中缺少该请求"
+        if output.get("error"):
+            return output["error"].get("message") or str(output["error"])
+        response = output.get("response") or {}
+        if response.get("status_code") != 200:
+            return f"请求失败: HTTP {response.get('status_code')}"
+        return None
+
+    def _model_name(self, purpose: str) -> Optional[str]:
+        if self.llm_client is None:
+            return None
+        return self.llm_client._get_model_name(purpose)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "pending": len(self._pending)}
+
+
+def create_batch_queue(llm_client, config=None) -> LLMBatchQueue:
+    """根据LLMConfig创建批处理队列：batch_processor为openai时使用提供商批处理接口，否则本地执行"""
+    config = config or llm_client.config
+    if config.batch_processor == "openai":
+        processor = OpenAIBatchProcessor(
+            base_url=config.api_base_url,
+            api_key=config.api_key,
+            poll_interval=config.batch_poll_interval
+        )
+    else:
+        processor = LocalBatchProcessor(llm_client)
+    return LLMBatchQueue(processor, llm_client=llm_client, job_dir=config.batch_job_dir,
+                         max_batch_size=config.batch_max_size)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+LLM调用上下文 - 在异步调用链中传递调用方信息
+
+LLM Call Context Propagated Through the Async Call Chain
+"""
+
+import asyncio
+import contextvars
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field, replace
+from typing import Any, List, Optional
+
+
+class DeadlineExceededError(asyncio.TimeoutError):
+    """当前调用链的截止时间已过"""
+    pass
+
+
+@dataclass(frozen=True)
+class LLMCallContext:
+    """当前LLM调用的归属信息与截止时间（time.time()时间戳）"""
+    agent_id: Optional[str] = None
+    conversation_id: Optional[str] = None
+    deadline: Optional[float] = None
+    # 设置时token用量暂存于此而不记账（合并请求的共享任务），由各调用方在自己的上下文中记账
+    usage_sink: Optional[List[Any]] = field(default=None, compare=False)
+
+
+_current_call_context: ContextVar[LLMCallContext] = ContextVar(
+    "llm_call_context", default=LLMCallContext()
+)
+
+
+def get_call_context() -> LLMCallContext:
+    """获取当前异步上下文中的调用信息"""
+    return _current_call_context.get()
+
+
+def time_remaining() -> Optional[float]:
+    """距当前截止时间的剩余秒数，未设置截止时间时返回None"""
+    deadline = _current_call_context.get().deadline
+    if deadline is None:
+        return None
+    return deadline - time.time()
+
+
+def check_deadline():
+    """截止时间已过时抛出DeadlineExceededError"""
+    remaining = time_remaining()
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceededError("已超过调用截止时间")
+
+
+def detached_context(**fields) -> contextvars.Context:
+    """创建仅保留调用归属（agent_id/conversation_id）、不带截止时间的新上下文
+
+    用于多个调用方共享的后台任务：不继承首个调用方的截止时间，
+    各调用方在等待时自行按各自的截止时间超时。fields可覆盖其他上下文字段。
+    """
+    current = _current_call_context.get()
+    context = contextvars.Context()
+    context.run(_current_call_context.set, replace(current, deadline=None, **fields))
+    return context
+
+
+@contextmanager
+def llm_call_scope(**fields):
+    """在作用域内覆盖调用上下文字段，asyncio任务会自动继承
+    
+    截止时间只会收紧：嵌套作用域给出更晚的deadline时保留外层的deadline。
+    """
+    current = _current_call_context.get()
+    if fields.get("deadline") is None:
+        fields.pop("deadline", None)
+    elif current.deadline is not None:
+        fields["deadline"] = min(fields["deadline"], current.deadline)
+    token = _current_call_context.set(replace(current, **fields))
+    try:
+        yield _current_call_context.get()
+    finally:
+        _current_call_context.reset(token)
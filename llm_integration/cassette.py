@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+LLM请求录制/回放 - 基于JSONL磁带文件
+
+Record/Replay Cassette for Deterministic Offline LLM Runs
+"""
+
+import json
+import logging
+import threading
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Any, Optional, List
+
+
+class CassetteMissError(Exception):
+    """回放模式下磁带中没有对应的请求记录"""
+    pass
+
+
+class LLMCassette:
+    """
+    LLM请求磁带
+
+    - record: 每次成功的请求/响应追加写入JSONL文件
+    - replay: 按请求键返回录制的响应，不访问网络；
+      同一请求录制了多次时按录制顺序依次返回，用尽后重复最后一条
+    """
+
+    MODES = ("off", "record", "replay")
+
+    def __init__(self, path: str, mode: str = "record"):
+        if mode not in self.MODES:
+            raise ValueError(f"无效的磁带模式: {mode}，可选: {', '.join(self.MODES)}")
+        self.path = Path(path)
+        self.mode = mode
+        self.logger = logging.getLogger("LLMCassette")
+
+        self._lock = threading.Lock()
+        self._entries: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._cursor: Dict[str, int] = defaultdict(int)
+        self.stats = {"recorded": 0, "replayed": 0, "misses": 0}
+
+        if mode == "replay":
+            self._load()
+        elif mode == "record":
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def _load(self):
+        """加载磁带文件"""
+        if not self.path.exists():
+            raise FileNotFoundError(f"磁带文件不存在: {self.path}")
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    entry = json.loads(line)
+                    self._entries[entry["key"]].append(entry)
+        self.logger.info(f"📼 加载磁带: {self.path} ({len(self._entries)} 个请求)")
+
+    def record(self, key: str, request: Dict[str, Any], response: Dict[str, Any]):
+        """追加一条请求/响应记录"""
+        entry = {"key": key, "request": request, "response": response}
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._entries[key].append(entry)
+            self.stats["recorded"] += 1
+
+    def replay(self, key: str) -> Dict[str, Any]:
+        """返回录制的响应，未录制时抛出CassetteMissError"""
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                self.stats["misses"] += 1
+                raise CassetteMissError(f"磁带中没有该请求的记录: {key[:12]}")
+            index = min(self._cursor[key], len(entries) - 1)
+            self._cursor[key] += 1
+            self.stats["replayed"] += 1
+            return entries[index]["response"]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "mode": self.mode, "path": str(self.path)}
+
+
+def create_cassette(mode: str, path: str) -> Optional[LLMCassette]:
+    """根据配置创建磁带，mode为off时返回None"""
+    if not mode or mode == "off":
+        return None
+    return LLMCassette(path, mode)
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+LLM端点熔断器 - 连续失败后快速失败，冷却后单探针恢复
+
+Per-Endpoint Circuit Breaker with Half-Open Probing
+"""
+
+import threading
+import time
+from typing import Dict, Any, Optional, Tuple
+
+
+class CircuitOpenError(Exception):
+    """端点熔断中，请求未发出即失败"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    端点熔断器（同一端点的所有客户端共享）
+
+    - closed: 正常放行，连续失败达到 failure_threshold 次后进入 open
+    - open: 冷却期内拒绝所有请求，冷却结束后进入 half_open
+    - half_open: 只放行一个探针请求；探针成功则关闭熔断，失败则重新打开
+
+    failure_threshold 为0时不启用熔断。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.stats = {"opened": 0, "rejected": 0, "probes": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.failure_threshold > 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _current_state(self, now: float) -> str:
+        if self._state == self.OPEN and now - self._opened_at >= self.cooldown:
+            self._state = self.HALF_OPEN
+        return self._state
+
+    def retry_after(self) -> float:
+        """距熔断冷却结束的秒数"""
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0.0
+            return max(0.0, self._opened_at + self.cooldown - time.monotonic())
+
+    def is_available(self) -> bool:
+        """当前是否可能放行请求（不占用探针名额，供路由判断）"""
+        if not self.enabled:
+            return True
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            return state == self.CLOSED or (state == self.HALF_OPEN and not self._probe_in_flight)
+
+    def acquire(self) -> Tuple[bool, bool]:
+        """申请放行一次请求，返回 (是否放行, 是否为探针)
+
+        half_open状态下只有第一个调用者获得探针名额，持有者须以
+        record_success / record_failure / release_probe 之一结束探针。
+        """
+        if not self.enabled:
+            return True, False
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == self.CLOSED:
+                return True, False
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                self.stats["probes"] += 1
+                return True, True
+            self.stats["rejected"] += 1
+            return False, False
+
+    def allow_request(self) -> bool:
+        return self.acquire()[0]
+
+    def record_success(self):
+        with self._lock:
+            self._consecutive_failures = 0
+            self._probe_in_flight = False
+            self._state = self.CLOSED
+
+    def record_failure(self):
+        """记录一次连接错误或5xx"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._consecutive_failures += 1
+            state = self._current_state(time.monotonic())
+            # 已熔断时不再延长冷却期（熔断前发出的请求可能陆续失败）
+            if state != self.OPEN and (state == self.HALF_OPEN or
+                                       self._consecutive_failures >= self.failure_threshold):
+                self.stats["opened"] += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def release_probe(self):
+        """探针请求以中性结果结束（如429、4xx或被取消）时归还探针名额"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            return {
+                **self.stats,
+                "state": state,
+                "consecutive_failures": self._consecutive_failures
+            }
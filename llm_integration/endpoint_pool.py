@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+LLM端点池 - 多端点延迟感知路由与故障转移
+
+Multi-Endpoint Provider Pool with Latency-Aware Routing and Failover
+"""
+
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional, List, Iterable
+
+from .circuit_breaker import CircuitBreaker
+from .rate_limiter import EndpointRateLimiter, endpoint_key, get_endpoint_limiter
+
+
+@dataclass
+class LLMEndpoint:
+    """单个LLM端点（同一进程内所有客户端共享其延迟与负载状态）"""
+    base_url: str
+    api_key: Optional[str] = None
+    provider: Optional[str] = None
+    model_name: Optional[str] = None
+    limiter: Optional[EndpointRateLimiter] = None
+    breaker: CircuitBreaker = field(default_factory=lambda: CircuitBreaker(failure_threshold=0))
+
+    # 路由状态
+    ewma_latency: Optional[float] = None
+    in_flight: int = 0
+    consecutive_failures: int = 0
+    unhealthy_until: float = 0.0
+
+    stats: Dict[str, Any] = field(default_factory=lambda: {
+        "requests": 0,
+        "failures": 0,
+        "failovers": 0
+    })
+
+    @property
+    def key(self) -> str:
+        return model_endpoint_key(self.base_url, self.api_key, self.model_name)
+
+    def is_healthy(self, now: Optional[float] = None) -> bool:
+        """不在失败冷却期内，未因429处于暂停窗口，且熔断器可放行"""
+        now = now or time.monotonic()
+        paused_until = self.limiter.paused_until if self.limiter else 0.0
+        return now >= self.unhealthy_until and now >= paused_until and self.breaker.is_available()
+
+    def score(self, default_latency: float = 0.0) -> float:
+        """路由评分（越小越优）：近期延迟 × (进行中请求数 + 1)
+
+        尚无延迟样本的端点使用 default_latency，使新端点也按负载分摊请求。
+        """
+        latency = self.ewma_latency if self.ewma_latency is not None else default_latency
+        return latency * (self.in_flight + 1)
+
+    def record_success(self, latency: float, alpha: float):
+        self.stats["requests"] += 1
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+        if self.ewma_latency is None:
+            self.ewma_latency = latency
+        else:
+            self.ewma_latency = alpha * latency + (1 - alpha) * self.ewma_latency
+
+    def record_failure(self, cooldown: float):
+        self.stats["requests"] += 1
+        self.stats["failures"] += 1
+        self.consecutive_failures += 1
+        self.unhealthy_until = time.monotonic() + cooldown
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "base_url": self.base_url,
+            "model_name": self.model_name,
+            "ewma_latency": self.ewma_latency,
+            "in_flight": self.in_flight,
+            "healthy": self.is_healthy(),
+            "circuit_breaker": self.breaker.get_stats(),
+            "rate_limiter": self.limiter.get_stats() if self.limiter else None
+        }
+
+
+# 进程内共享的端点状态，多个智能体的客户端看到一致的延迟和负载
+_endpoints: Dict[str, LLMEndpoint] = {}
+
+
+def model_endpoint_key(base_url: Optional[str], api_key: Optional[str] = None,
+                       model_name: Optional[str] = None) -> str:
+    """端点+模型标识：同一主机上的不同模型分别统计延迟，但共享限流器"""
+    return f"{endpoint_key(base_url, api_key)}@{model_name or ''}"
+
+
+def get_endpoint(base_url: str, api_key: Optional[str] = None,
+                 provider: Optional[str] = None, model_name: Optional[str] = None,
+                 max_concurrent: int = 0, requests_per_minute: int = 0,
+                 tokens_per_minute: int = 0, breaker_threshold: int = 0,
+                 breaker_cooldown: float = 30.0) -> LLMEndpoint:
+    """获取（或创建）共享的端点对象（熔断器与限流器一样由首次创建者的配置决定）"""
+    key = model_endpoint_key(base_url, api_key, model_name)
+    endpoint = _endpoints.get(key)
+    if endpoint is None:
+        endpoint = LLMEndpoint(
+            base_url=(base_url or "").rstrip('/'),
+            api_key=api_key,
+            provider=provider,
+            model_name=model_name,
+            limiter=get_endpoint_limiter(
+                base_url=base_url,
+                api_key=api_key,
+                max_concurrent=max_concurrent,
+                requests_per_minute=requests_per_minute,
+                tokens_per_minute=tokens_per_minute
+            ),
+            breaker=CircuitBreaker(breaker_threshold, breaker_cooldown)
+        )
+        _endpoints[key] = endpoint
+    return endpoint
+
+
+class EndpointPool:
+    """
+    端点池
+
+    - 选择近期延迟×负载最低的健康端点
+    - 失败的端点进入冷却期，期间优先路由到其他端点
+    - 熔断中的端点不参与路由（半开状态下仅在探针名额空闲时参与）
+    - 所有端点都不健康时选择最早恢复的端点
+    """
+
+    def __init__(self, endpoints: List[LLMEndpoint], ewma_alpha: float = 0.3,
+                 failure_cooldown: float = 30.0):
+        if not endpoints:
+            raise ValueError("端点池至少需要一个端点")
+        self.endpoints = endpoints
+        self.ewma_alpha = ewma_alpha
+        self.failure_cooldown = failure_cooldown
+        self.logger = logging.getLogger("EndpointPool")
+
+    @classmethod
+    def from_config(cls, config, tier: Optional[Dict[str, Any]] = None) -> "EndpointPool":
+        """根据LLMConfig构建端点池
+
+        tier为模型档位配置 {"model_name", "base_url"/"endpoints", "api_key", "provider"}；
+        档位未指定端点时沿用默认端点（config.endpoints或api_base_url）。
+        """
+        tier = tier or {}
+        if tier.get("endpoints"):
+            specs = tier["endpoints"]
+        elif tier.get("base_url"):
+            specs = [{"base_url": tier["base_url"], "api_key": tier.get("api_key", config.api_key)}]
+        else:
+            specs = config.endpoints or [{"base_url": config.api_base_url, "api_key": config.api_key}]
+
+        endpoints = []
+        for spec in specs:
+            # 未设置并发上限时以每主机连接数为槽位数：请求先按优先级获得槽位，
+            # 不会在连接池中先来先得地排队
+            max_concurrent = (spec.get("max_concurrent_requests", config.max_concurrent_requests)
+                              or config.connections_per_host)
+            endpoints.append(get_endpoint(
+                base_url=spec.get("base_url") or config.api_base_url,
+                api_key=spec.get("api_key", config.api_key),
+                provider=spec.get("provider") or tier.get("provider"),
+                model_name=spec.get("model_name") or tier.get("model_name"),
+                max_concurrent=max_concurrent,
+                requests_per_minute=spec.get("requests_per_minute", config.requests_per_minute),
+                tokens_per_minute=spec.get("tokens_per_minute", config.tokens_per_minute),
+                breaker_threshold=config.circuit_breaker_threshold,
+                breaker_cooldown=config.circuit_breaker_cooldown
+            ))
+        return cls(endpoints, failure_cooldown=config.endpoint_failure_cooldown)
+
+    def __len__(self) -> int:
+        return len(self.endpoints)
+
+    def select(self, exclude: Iterable[LLMEndpoint] = ()) -> LLMEndpoint:
+        """选择下一个请求使用的端点，exclude中的端点仅在别无选择时使用"""
+        excluded = {endpoint.key for endpoint in exclude}
+        candidates = [e for e in self.endpoints if e.key not in excluded] or self.endpoints
+
+        now = time.monotonic()
+        healthy = [e for e in candidates if e.is_healthy(now)]
+        if not healthy:
+            return min(candidates, key=lambda e: max(
+                e.unhealthy_until, e.limiter.paused_until if e.limiter else 0.0))
+        # 未测得延迟的端点按已知的最低延迟乐观估计
+        known = [e.ewma_latency for e in self.endpoints if e.ewma_latency is not None]
+        default_latency = min(known) if known else 0.0
+        return min(healthy, key=lambda e: (e.score(default_latency), e.in_flight))
+
+    def record_success(self, endpoint: LLMEndpoint, latency: float):
+        endpoint.record_success(latency, self.ewma_alpha)
+
+    def record_failure(self, endpoint: LLMEndpoint):
+        endpoint.record_failure(self.failure_cooldown)
+        if len(self.endpoints) > 1:
+            endpoint.stats["failovers"] += 1
+            self.logger.warning(f"🔀 端点失败，切换到其他端点: {endpoint.base_url}")
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        return [endpoint.get_stats() for endpoint in self.endpoints]
@@ -10,9 +10,67 @@ import aiohttp
 import json
 import time
 import logging
-from typing import Dict, Any, Optional, List
-from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional, List, AsyncIterator, Union, Set, Tuple
+from dataclasses import dataclass, field
 from config.config import LLMConfig
+from .response_cache import LLMResponseCache
+from .rate_limiter import DEFAULT_PURPOSE_PRIORITIES, PRIORITY_INTERACTIVE, parse_retry_after
+from .endpoint_pool import EndpointPool, LLMEndpoint
+from .circuit_breaker import CircuitOpenError
+from .cassette import LLMCassette, create_cassette
+from .hedging import latency_tracker
+from .max_tokens_predictor import max_tokens_predictor
+from .json_repair import JSONRepairError, is_truncated_json, parse_llm_json
+from .call_context import (DeadlineExceededError, check_deadline, detached_context,
+                           get_call_context, time_remaining)
+from .token_ledger import token_ledger
+
+
+@dataclass
+class LLMResponse:
+    """一次LLM请求的结果及元数据"""
+    content: str = ""
+    finish_reason: Optional[str] = None
+    time_to_first_byte: Optional[float] = None
+    duration: float = 0.0
+    usage: Dict[str, int] = field(default_factory=dict)
+    model: Optional[str] = None
+    endpoint: Optional[str] = None
+    # 原生工具调用：[{"id", "name", "arguments": dict}]
+    tool_calls: List[Dict[str, Any]] = field(default_factory=list)
+    # 实际发送的生成上限（自适应收紧后），回放时取录制值
+    effective_max_tokens: Optional[int] = None
+
+
+@dataclass
+class BatchPromptResult:
+    """批量请求中单个提示的结果"""
+    index: int
+    success: bool
+    response: Optional[str] = None
+    error: Optional[str] = None
+
+
+class RateLimitError(aiohttp.ClientResponseError):
+    """服务端返回429限流响应"""
+    
+    def __init__(self, *args, retry_after: Optional[float] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.retry_after = retry_after
+
+
+# 自适应生成上限截断输出后的续写指令
+CONTINUATION_PROMPT = "你的上一条回复因长度限制被截断。请从中断处直接继续输出，不要重复已输出的内容，也不要添加任何说明。"
+
+
+class _InFlightRequest:
+    """正在进行中的共享请求（single-flight）"""
+    
+    def __init__(self, task: "asyncio.Task", usage: List[Any]):
+        self.task = task
+        self.waiters = 0
+        # 共享请求产生的(messages, LLMResponse)，由每个等待方在自己的调用上下文中记账
+        self.usage = usage
 
 
 class EnhancedLLMClient:
@@ -20,6 +78,12 @@ class EnhancedLLMClient:
     增强的LLM客户端，支持异步请求和多种提供商
     """
     
+    # 进程内所有客户端共享的进行中请求表，相同请求只发送一次
+    _inflight_requests: Dict[str, _InFlightRequest] = {}
+    
+    # 进程内已预热（或正在预热）的Ollama端点+模型，避免每个智能体的客户端重复加载
+    _warmed_endpoints: Set[str] = set()
+    
     def __init__(self, config: LLMConfig):
         self.config = config
         provider_name = getattr(config, 'provider', 'unknown')
@@ -29,12 +93,62 @@ class EnhancedLLMClient:
         self.stats = {
             "total_requests": 0,
             "total_tokens": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "total_cost": 0.0,
             "total_time": 0.0,
             "errors": 0,
             "connection_errors": 0,
-            "retries": 0
+            "client_errors": 0,
+            "retries": 0,
+            "sessions_created": 0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "total_time_to_first_byte": 0.0,
+            "coalesced_hits": 0,
+            "rate_limited": 0,
+            "cassette_replays": 0,
+            "hedged_requests": 0,
+            "hedge_wins": 0,
+            "deadline_exceeded": 0,
+            "circuit_rejected": 0,
+            "warm_ups": 0,
+            "continuations": 0,
+            "json_repairs": 0,
+            "json_repair_failures": 0
         }
         
+        # 持久化响应缓存（可选）
+        self.response_cache: Optional[LLMResponseCache] = None
+        if config.enable_response_cache:
+            self.response_cache = LLMResponseCache(
+                db_path=config.response_cache_path,
+                ttl_seconds=config.response_cache_ttl,
+                max_entries=config.response_cache_max_entries
+            )
+        
+        # 录制/回放磁带（可选），回放模式下不访问网络
+        self.cassette: Optional[LLMCassette] = create_cassette(config.cassette_mode, config.cassette_path)
+        
+        # 长连接会话（连接池），按需创建，由close()关闭
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+        
+        # 端点池（每个端点带有进程内共享的并发/速率限制器）
+        self.endpoint_pool = EndpointPool.from_config(config)
+        
+        # 模型档位：按调用类型（purpose）路由到不同模型/端点
+        self.tier_pools: Dict[str, EndpointPool] = {
+            name: EndpointPool.from_config(config, tier=tier)
+            for name, tier in config.model_tiers.items()
+        }
+        for purpose, tier_name in config.purpose_tiers.items():
+            if tier_name not in self.tier_pools:
+                self.logger.warning(f"⚠️ 调用类型 {purpose} 指向未定义的模型档位: {tier_name}")
+        
+        # 后台预热任务（warm_up_on_start启用时在首次请求时启动）
+        self._warm_up_task: Optional[asyncio.Task] = None
+        
         # 连接重试配置
         self.retry_config = {
             "max_retries": config.retry_attempts,
@@ -45,72 +159,653 @@ class EnhancedLLMClient:
         
         self.logger.info(f"🚀 初始化LLM客户端 - 提供商: {provider_name}, 模型: {config.model_name}")
     
-    @asynccontextmanager
     async def _get_session(self) -> aiohttp.ClientSession:
-        """提供一个临时的、安全关闭的aiohttp会话"""
+        """获取长连接会话，复用TCP/TLS连接、限制每主机连接数并缓存DNS"""
+        loop = asyncio.get_running_loop()
+        if (self._session is not None and not self._session.closed
+                and self._session_loop is loop):
+            return self._session
+        
+        # 旧会话绑定在其他事件循环上时无法复用，直接丢弃
+        connector = aiohttp.TCPConnector(
+            limit=self.config.connection_pool_size,
+            limit_per_host=self.config.connections_per_host,
+            ttl_dns_cache=self.config.dns_cache_ttl,
+            keepalive_timeout=self.config.keepalive_timeout
+        )
         timeout = aiohttp.ClientTimeout(total=self.config.timeout)
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            yield session
+        self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        self._session_loop = loop
+        self.stats["sessions_created"] += 1
+        self.logger.debug(f"🔌 创建连接池会话: limit={self.config.connection_pool_size}, "
+                          f"per_host={self.config.connections_per_host}")
+        return self._session
     
     async def generate_async(self, prompt: str, system_prompt: str = None,
                            temperature: float = None, max_tokens: int = None) -> str:
         """异步生成响应"""
         return await self.send_prompt(prompt, system_prompt, temperature, max_tokens)
     
+    def _make_cache_key(self, messages: List[Dict[str, str]], temperature: float,
+                        max_tokens: int, json_mode: bool, model: Optional[str] = None,
+                        tools: Optional[List[Dict[str, Any]]] = None) -> str:
+        """生成响应缓存键"""
+        fields = dict(
+            provider=self.config.provider,
+            model=model or self.config.model_name,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            json_mode=json_mode
+        )
+        if tools:
+            fields["tools"] = tools
+        return LLMResponseCache.make_key(**fields)
+    
+    def _make_flight_key(self, messages: List[Dict[str, str]], temperature: float,
+                         max_tokens: int, json_mode: bool, purpose: str = "default") -> str:
+        """生成请求合并键：请求内容加端点池标识（URL与密钥摘要），
+        使指向不同服务器或使用不同密钥的客户端不会共享彼此的响应。
+        不区分对话：不同对话的相同请求同样合并，用量由各等待方分别记账"""
+        pool = self._get_endpoint_pool(purpose)
+        return LLMResponseCache.make_key(
+            request=self._make_cache_key(messages, temperature, max_tokens, json_mode,
+                                         self._get_model_name(purpose)),
+            endpoints=sorted(endpoint.key for endpoint in pool.endpoints)
+        )
+    
+    @staticmethod
+    def _build_messages(prompt: str, system_prompt: Optional[str] = None) -> List[Dict[str, str]]:
+        """将单轮提示转换为消息数组"""
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.append({"role": "user", "content": prompt})
+        return messages
+    
+    @classmethod
+    def _estimate_messages_tokens(cls, messages: List[Dict[str, str]]) -> int:
+        """估计消息数组的token数"""
+        return sum(cls._estimate_tokens(message.get("content")) for message in messages)
+    
+    @staticmethod
+    def _estimate_tokens(text: Optional[str]) -> int:
+        """粗略估计文本token数（ASCII约4字符/token，其他字符约1字符/token）"""
+        if not text:
+            return 0
+        non_ascii = sum(1 for ch in text if ord(ch) > 127)
+        return non_ascii + (len(text) - non_ascii) // 4
+    
+    def _get_endpoint_pool(self, purpose: str = "default") -> EndpointPool:
+        """调用类型对应的端点池（未配置档位时为默认端点池）"""
+        tier_name = self.config.purpose_tiers.get(purpose)
+        if tier_name is None:
+            return self.endpoint_pool
+        return self.tier_pools.get(tier_name, self.endpoint_pool)
+    
+    def _get_model_name(self, purpose: str = "default") -> str:
+        """调用类型实际使用的模型名"""
+        return self._get_endpoint_pool(purpose).endpoints[0].model_name or self.config.model_name
+    
+    def _get_priority(self, purpose: str) -> int:
+        """调用类型对应的排队优先级（数值越小越优先）"""
+        if purpose in self.config.purpose_priorities:
+            return int(self.config.purpose_priorities[purpose])
+        return DEFAULT_PURPOSE_PRIORITIES.get(purpose, PRIORITY_INTERACTIVE)
+    
+    def _is_ollama(self, endpoint: Optional[LLMEndpoint] = None) -> bool:
+        """判断端点（默认为首个端点）是否为Ollama后端"""
+        endpoint = endpoint or self.endpoint_pool.endpoints[0]
+        provider_name = endpoint.provider or self.config.provider
+        base_url = endpoint.base_url
+        return (provider_name.lower() in ["local", "ollama"] or
+                "11434" in str(base_url) or
+                "ollama" in str(base_url).lower())
+    
     async def send_prompt(self, prompt: str, system_prompt: str = None,
                          temperature: float = None, max_tokens: int = None,
-                         json_mode: bool = False) -> str:
-        """发送提示到LLM并返回响应"""
+                         json_mode: bool = False, use_cache: bool = True,
+                         purpose: str = "default") -> str:
+        """发送提示到LLM并返回响应
+        
+        基于流式请求收集完整响应。use_cache=False 时绕过响应缓存（既不读取也不写入）；
+        temperature为0时并发的相同请求会被合并为一次HTTP调用。purpose 标记调用类型，用于分类统计延迟。
+        """
+        return await self.send_messages(
+            self._build_messages(prompt, system_prompt),
+            temperature=temperature,
+            max_tokens=max_tokens,
+            json_mode=json_mode,
+            use_cache=use_cache,
+            purpose=purpose
+        )
+    
+    async def send_messages(self, messages: List[Dict[str, str]], temperature: float = None,
+                            max_tokens: int = None, json_mode: bool = False,
+                            use_cache: bool = True, purpose: str = "default") -> str:
+        """发送多轮消息数组（system/user/assistant角色分离）并返回响应
+        
+        多轮对话保持稳定的system提示和历史前缀，便于提供商侧的前缀缓存命中。
+        只合并temperature为0的确定性请求，采样请求即使提示相同也各自生成。
+        """
+        # 使用配置中的默认值（显式传入的0保持不变）
+        if temperature is None:
+            temperature = self.config.temperature
+        max_tokens = max_tokens or self.config.max_tokens
+        
+        model = self._get_model_name(purpose)
+        cache_key = None
+        if self.response_cache is not None and use_cache:
+            cache_key = self._make_cache_key(messages, temperature, max_tokens, json_mode, model)
+            cached = await self.response_cache.aget(cache_key)
+            if cached is not None:
+                self.stats["cache_hits"] += 1
+                self.logger.debug("💾 LLM响应缓存命中")
+                return cached
+            self.stats["cache_misses"] += 1
+        
+        if not self.config.enable_request_coalescing or temperature != 0:
+            content = await self._send_messages_uncached(
+                messages, temperature, max_tokens, json_mode, purpose)
+        else:
+            flight_key = self._make_flight_key(messages, temperature, max_tokens, json_mode, purpose)
+            content = await self._send_coalesced(
+                flight_key, messages, temperature, max_tokens, json_mode, purpose)
+        
+        if cache_key is not None:
+            await self.response_cache.aput(cache_key, content)
+        return content
+    
+    async def send_json_prompt(self, prompt: str, system_prompt: str = None,
+                               temperature: float = None, max_tokens: int = None,
+                               use_cache: bool = True, purpose: str = "default") -> Any:
+        """以JSON模式发送提示并容错解析，返回解析后的对象
+        
+        输出在JSON闭合前被截断时先请求续写并拼接；仍无法直接解析时修复代码块包裹、
+        尾随逗号和截断，避免为格式问题重发整个请求。无法修复时抛出JSONRepairError。
+        """
+        messages = self._build_messages(prompt, system_prompt)
+        content = await self.send_messages(messages, temperature=temperature, max_tokens=max_tokens,
+                                           json_mode=True, use_cache=use_cache, purpose=purpose)
+        
+        continuations = 0
+        while is_truncated_json(content) and continuations < self.config.max_continuations:
+            continuations += 1
+            self.stats["continuations"] += 1
+            self.logger.info(f"✂️ JSON输出被截断，请求续写 ({continuations}/{self.config.max_continuations})")
+            follow_up = messages + [
+                {"role": "assistant", "content": content},
+                {"role": "user", "content": CONTINUATION_PROMPT}
+            ]
+            # 续写内容是JSON片段，不能再以JSON模式约束输出
+            content += await self.send_messages(follow_up, temperature=temperature, max_tokens=max_tokens,
+                                                use_cache=False, purpose=purpose)
+        
+        try:
+            return json.loads(content, strict=False)
+        except json.JSONDecodeError:
+            pass
+        try:
+            result = parse_llm_json(content)
+        except JSONRepairError:
+            self.stats["json_repair_failures"] += 1
+            raise
+        self.stats["json_repairs"] += 1
+        self.logger.debug("🩹 已修复LLM输出中的JSON")
+        return result
+    
+    async def send_messages_with_tools(self, messages: List[Dict[str, Any]],
+                                       tools: List[Dict[str, Any]], temperature: float = None,
+                                       max_tokens: int = None,
+                                       purpose: str = "function_calling") -> "LLMResponse":
+        """以OpenAI兼容的tools字段发送消息，返回包含原生tool_calls的完整响应
+        
+        工具对话每轮都不同，因此不经过响应缓存、请求合并和对冲。
+        """
+        if temperature is None:
+            temperature = self.config.temperature
+        max_tokens = max_tokens or self.config.max_tokens
+        
+        response = LLMResponse()
+        async for _ in self._stream_with_retries(messages, temperature, max_tokens, False,
+                                                 response, buffered=True, purpose=purpose,
+                                                 tools=tools):
+            pass
+        return response
+    
+    async def _send_coalesced(self, flight_key: str, messages: List[Dict[str, str]],
+                              temperature: float, max_tokens: int, json_mode: bool,
+                              purpose: str) -> str:
+        """合并并发的相同请求：第一个调用方发起请求，其余调用方等待同一结果
+        
+        共享请求在不带截止时间的独立上下文中运行，不受首个调用方截止时间的影响；
+        每个调用方按自己的截止时间等待，超时时抛出DeadlineExceededError。
+        共享请求不直接记账，拿到结果的每个调用方把token用量记入自己的对话，
+        并把生成长度记为自己调用点的max_tokens样本。
+        """
+        loop = asyncio.get_running_loop()
+        inflight = self._inflight_requests.get(flight_key)
+        
+        if inflight is not None and not inflight.task.done() and inflight.task.get_loop() is loop:
+            self.stats["coalesced_hits"] += 1
+            self.logger.debug("🔗 合并进行中的相同LLM请求")
+        else:
+            check_deadline()
+            usage: List[Any] = []
+            task = detached_context(usage_sink=usage).run(
+                loop.create_task, self._generate(
+                    messages, temperature, max_tokens, json_mode, purpose))
+            inflight = _InFlightRequest(task, usage)
+            self._inflight_requests[flight_key] = inflight
+            
+            def _release(_task, key=flight_key, entry=inflight):
+                if self._inflight_requests.get(key) is entry:
+                    del self._inflight_requests[key]
+            task.add_done_callback(_release)
+        
+        inflight.waiters += 1
+        try:
+            remaining = time_remaining()
+            if remaining is None:
+                content, generated = await asyncio.shield(inflight.task)
+            else:
+                try:
+                    content, generated = await asyncio.wait_for(asyncio.shield(inflight.task),
+                                                                max(remaining, 0))
+                except asyncio.TimeoutError as e:
+                    if inflight.task.done():
+                        raise
+                    raise DeadlineExceededError("等待合并的LLM请求超过调用截止时间") from e
+            for request_messages, response in inflight.usage:
+                self._record_usage(request_messages, response)
+            max_tokens_predictor.record(get_call_context().agent_id, purpose, generated)
+            return content
+        except (asyncio.CancelledError, DeadlineExceededError):
+            # 所有等待方都取消或超时后才取消共享请求
+            if inflight.waiters == 1 and not inflight.task.done():
+                inflight.task.cancel()
+            raise
+        finally:
+            inflight.waiters -= 1
+    
+    async def _send_messages_uncached(self, messages: List[Dict[str, str]],
+                                      temperature: float, max_tokens: int, json_mode: bool,
+                                      purpose: str = "default") -> str:
+        """发送请求并收集完整响应（不经过缓存和请求合并），生成长度记入当前调用点"""
+        content, generated = await self._generate(messages, temperature, max_tokens, json_mode, purpose)
+        max_tokens_predictor.record(get_call_context().agent_id, purpose, generated)
+        return content
+    
+    async def _generate(self, messages: List[Dict[str, str]], temperature: float,
+                        max_tokens: int, json_mode: bool,
+                        purpose: str = "default") -> Tuple[str, int]:
+        """发送请求并收集完整响应，返回(内容, 生成token数)
+        
+        启用自适应max_tokens时按该调用点（智能体+调用类型）的历史输出长度收紧生成上限；
+        输出因此被截断（finish_reason为length）时自动续写，总生成量不超过调用方的max_tokens。
+        JSON模式无法拼接续写，改为以调用方的max_tokens整体重发。
+        """
+        agent_id = get_call_context().agent_id
+        budget = max_tokens
+        if self.config.adaptive_max_tokens:
+            budget = max_tokens_predictor.predict(
+                agent_id, purpose, max_tokens,
+                q=self.config.max_tokens_percentile,
+                headroom=self.config.max_tokens_headroom,
+                min_samples=self.config.max_tokens_min_samples
+            )
+        
+        response = await self._send_once(messages, temperature, budget, json_mode, purpose, max_tokens)
+        # 磁带回放时按录制时的生成上限决定是否续写，与录制时的请求序列一致
+        budget = response.effective_max_tokens or budget
+        content = response.content
+        generated = self._completion_tokens(response)
+        
+        continuations = 0
+        while (response.finish_reason == "length" and budget < max_tokens
+               and generated < max_tokens and continuations < self.config.max_continuations):
+            continuations += 1
+            self.stats["continuations"] += 1
+            self.logger.info(f"✂️ 输出达到自适应上限 {budget}，续写 ({continuations}/{self.config.max_continuations})")
+            if json_mode:
+                budget = max_tokens
+                response = await self._send_once(messages, temperature, budget, json_mode, purpose,
+                                                 max_tokens)
+                content = response.content
+                generated = self._completion_tokens(response)
+                continue
+            follow_up = messages + [
+                {"role": "assistant", "content": content},
+                {"role": "user", "content": CONTINUATION_PROMPT}
+            ]
+            budget = max_tokens - generated
+            response = await self._send_once(follow_up, temperature, budget, json_mode, purpose, max_tokens)
+            content += response.content
+            generated += self._completion_tokens(response)
+        
+        return content, generated
+    
+    async def _send_once(self, messages: List[Dict[str, str]], temperature: float,
+                         max_tokens: int, json_mode: bool, purpose: str,
+                         requested_max_tokens: Optional[int] = None) -> "LLMResponse":
+        """发送一次请求（启用对冲时走对冲路径）
+        
+        requested_max_tokens为调用方请求的生成上限（自适应收紧之前），用作磁带键。
+        """
+        if self.config.enable_hedging and not (self.cassette is not None and self.cassette.replaying):
+            return await self._send_hedged(messages, temperature, max_tokens, json_mode, purpose,
+                                           requested_max_tokens)
+        return await self._collect_response(messages, temperature, max_tokens, json_mode, purpose,
+                                            requested_max_tokens=requested_max_tokens)
+    
+    @classmethod
+    def _completion_tokens(cls, response: "LLMResponse") -> int:
+        """响应的生成token数（提供商未返回usage时按估算）"""
+        return response.usage.get("completion_tokens") or cls._estimate_tokens(response.content)
+    
+    async def _collect_response(self, messages: List[Dict[str, str]], temperature: float,
+                                max_tokens: int, json_mode: bool, purpose: str,
+                                first_endpoint: Optional[LLMEndpoint] = None,
+                                requested_max_tokens: Optional[int] = None,
+                                started: Optional[asyncio.Event] = None) -> "LLMResponse":
+        """执行一次带重试的缓冲请求并返回完整响应"""
+        response = LLMResponse()
+        async for _ in self._stream_with_retries(messages, temperature, max_tokens, json_mode,
+                                                 response, buffered=True, purpose=purpose,
+                                                 first_endpoint=first_endpoint,
+                                                 requested_max_tokens=requested_max_tokens,
+                                                 started=started):
+            pass
+        return response
+    
+    async def _send_hedged(self, messages: List[Dict[str, str]], temperature: float,
+                           max_tokens: int, json_mode: bool, purpose: str,
+                           requested_max_tokens: Optional[int] = None) -> "LLMResponse":
+        """对冲请求：主请求超过该端点/调用类型的p95耗时仍未完成时，
+        向备选端点（无备选时为同一端点）再发一份，取先成功者并取消另一个
+        
+        计时从主请求获得并发槽位开始：排队等待槽位的时间不计入阈值，
+        避免限流器繁忙时对冲请求进一步加剧拥塞。
+        """
+        pool = self._get_endpoint_pool(purpose)
+        primary_endpoint = pool.select()
+        hedge_delay = latency_tracker.hedge_delay(
+            primary_endpoint.key, purpose,
+            q=self.config.hedge_percentile,
+            min_samples=self.config.hedge_min_samples
+        )
+        started = asyncio.Event()
+        primary = asyncio.ensure_future(self._collect_response(
+            messages, temperature, max_tokens, json_mode, purpose, first_endpoint=primary_endpoint,
+            requested_max_tokens=requested_max_tokens, started=started))
+        if hedge_delay is None:
+            return await primary
+        
+        tasks = {primary}
+        started_wait = asyncio.ensure_future(started.wait())
+        try:
+            await asyncio.wait({primary, started_wait}, return_when=asyncio.FIRST_COMPLETED)
+            if primary.done():
+                return primary.result()
+            
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+            if done:
+                return primary.result()
+            
+            hedge_endpoint = pool.select(exclude=[primary_endpoint])
+            self.stats["hedged_requests"] += 1
+            self.logger.info(f"🪁 请求超过p{self.config.hedge_percentile:g}阈值 {hedge_delay:.2f}s，"
+                             f"发送对冲请求: {hedge_endpoint.base_url}")
+            hedge = asyncio.ensure_future(self._collect_response(
+                messages, temperature, max_tokens, json_mode, purpose, first_endpoint=hedge_endpoint,
+                requested_max_tokens=requested_max_tokens))
+            tasks.add(hedge)
+            
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+            # 两个请求都失败，抛出主请求的异常
+            return primary.result()
+        finally:
+            started_wait.cancel()
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+    
+    async def send_prompts_batch(self, prompts: List[Union[str, Dict[str, Any]]],
+                                 max_concurrency: int = 4) -> List[BatchPromptResult]:
+        """并发发送一批相互独立的提示，按输入顺序返回结果
+        
+        每个元素可以是提示字符串，也可以是 send_prompt（或含messages时 send_messages）
+        的关键字参数字典。单个提示失败只影响对应结果，不会中断整批请求。
+        """
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        
+        async def _run(index: int, item: Union[str, Dict[str, Any]]) -> BatchPromptResult:
+            kwargs = {"prompt": item} if isinstance(item, str) else dict(item)
+            send = self.send_messages if "messages" in kwargs else self.send_prompt
+            async with semaphore:
+                try:
+                    response = await send(**kwargs)
+                    return BatchPromptResult(index=index, success=True, response=response)
+                except Exception as e:
+                    return BatchPromptResult(index=index, success=False, error=str(e))
+        
+        results = await asyncio.gather(*[_run(i, item) for i, item in enumerate(prompts)])
+        failed = sum(1 for result in results if not result.success)
+        self.logger.info(f"📦 批量请求完成: {len(results)} 个提示, 失败 {failed} 个")
+        return list(results)
+    
+    async def stream_prompt(self, prompt: str, system_prompt: str = None,
+                            temperature: float = None, max_tokens: int = None,
+                            json_mode: bool = False, purpose: str = "default") -> AsyncIterator[str]:
+        """流式发送提示，按SSE/NDJSON行到达的顺序逐块产出文本
+        
+        仅在收到第一个数据块之前失败时重试；数据开始输出后的中断直接抛出。
+        """
+        if temperature is None:
+            temperature = self.config.temperature
+        max_tokens = max_tokens or self.config.max_tokens
+        
+        response = LLMResponse()
+        async for chunk in self._stream_with_retries(self._build_messages(prompt, system_prompt),
+                                                     temperature, max_tokens, json_mode,
+                                                     response, buffered=False, purpose=purpose):
+            yield chunk
+    
+    async def _stream_with_retries(self, messages: List[Dict[str, str]],
+                                   temperature: float, max_tokens: int, json_mode: bool,
+                                   response: "LLMResponse", buffered: bool,
+                                   purpose: str = "default",
+                                   first_endpoint: Optional[LLMEndpoint] = None,
+                                   tools: Optional[List[Dict[str, Any]]] = None,
+                                   requested_max_tokens: Optional[int] = None,
+                                   started: Optional[asyncio.Event] = None) -> AsyncIterator[str]:
+        """带重试的流式请求
+        
+        buffered=True 时每次尝试在内部缓冲，成功后一次性产出完整内容，
+        因此中途断开的尝试可以安全地整体重试。每次尝试从端点池选择端点
+        （first_endpoint指定首次尝试的端点），失败时优先立即切换到尚未尝试的健康端点。
+        started在首次获得并发槽位、即将发出请求时置位。
+        """
         start_time = time.time()
-        max_retries = self.retry_config["max_retries"]
+        pool = self._get_endpoint_pool(purpose)
+        max_retries = max(self.retry_config["max_retries"], len(pool))
         base_delay = self.retry_config["base_delay"]
         last_exception = None
+        tried_endpoints: List[LLMEndpoint] = []
+        # 按提供商的计费方式，生成上限也计入每分钟token预算
+        estimated_tokens = self._estimate_messages_tokens(messages) + max_tokens
+        priority = self._get_priority(purpose)
+        
+        # 磁带键使用调用方请求的max_tokens：自适应收紧后的上限随历史变化，回放时无法复现
+        cassette_max_tokens = requested_max_tokens or max_tokens
+        cassette_key = None
+        if self.cassette is not None:
+            cassette_key = self._make_cache_key(
+                messages, temperature, cassette_max_tokens, json_mode, self._get_model_name(purpose), tools)
+            if self.cassette.replaying:
+                self._load_from_cassette(cassette_key, response)
+                self._record_usage(messages, response)
+                yield response.content
+                return
+        
+        self.start_warm_up()
         
         for attempt in range(max_retries):
+            yielded = False
+            check_deadline()
+            if attempt == 0 and first_endpoint is not None:
+                endpoint = first_endpoint
+            else:
+                endpoint = pool.select(exclude=tried_endpoints)
+            
+            # 熔断中的端点不发出请求：有其他端点则切换，否则立即失败
+            allowed, is_probe = endpoint.breaker.acquire()
+            if not allowed:
+                self.stats["circuit_rejected"] += 1
+                tried_endpoints.append(endpoint)
+                last_exception = CircuitOpenError(
+                    f"端点熔断中: {endpoint.base_url}", retry_after=endpoint.breaker.retry_after())
+                if self._has_failover(pool, tried_endpoints):
+                    continue
+                self.stats["errors"] += 1
+                self.logger.warning(f"⚡ 端点熔断中，快速失败: {endpoint.base_url}")
+                raise last_exception
+            if is_probe:
+                self.logger.info(f"🔌 熔断半开，发送探针请求: {endpoint.base_url}")
+            
             try:
-                async with self._get_session() as session:
-                    # 使用配置中的默认值
-                    temperature = temperature or self.config.temperature
-                    max_tokens = max_tokens or self.config.max_tokens
+                session = await self._get_session()
+                chunks = []
+                
+                async with endpoint.limiter.slot(estimated_tokens, priority):
+                    attempt_start = time.time()
+                    endpoint.in_flight += 1
+                    if started is not None:
+                        started.set()
                     
                     # 判断提供商
-                    provider_name = self.config.provider
-                    base_url = self.config.api_base_url
-                    
-                    if (provider_name.lower() in ["local", "ollama"] or
-                        "11434" in str(base_url) or
-                        "ollama" in str(base_url).lower()):
-                        response_content = await self._send_ollama_request(
-                            session, prompt, system_prompt, temperature, max_tokens, json_mode)
+                    if self._is_ollama(endpoint):
+                        stream = self._stream_ollama_request(
+                            session, endpoint, messages, temperature, max_tokens, json_mode,
+                            response, tools)
                     else:
-                        response_content = await self._send_openai_compatible_request(
-                            session, prompt, system_prompt, temperature, max_tokens, json_mode)
-                    
-                    # 更新统计
-                    duration = time.time() - start_time
-                    self.stats["total_requests"] += 1
-                    self.stats["total_time"] += duration
-                    self.stats["total_tokens"] += len(prompt) + len(response_content)
-                    if attempt > 0:
-                        self.stats["retries"] += 1
-                    
-                    self.logger.debug(f"LLM请求完成，耗时: {duration:.2f}s, 尝试次数: {attempt + 1}")
-                    return response_content
+                        stream = self._stream_openai_compatible_request(
+                            session, endpoint, messages, temperature, max_tokens, json_mode,
+                            response, tools)
                     
+                    try:
+                        async for chunk in stream:
+                            if not chunks:
+                                response.time_to_first_byte = time.time() - attempt_start
+                            chunks.append(chunk)
+                            if not buffered:
+                                yielded = True
+                                yield chunk
+                    finally:
+                        endpoint.in_flight -= 1
+                        await stream.aclose()
+                
+                # 以首字节时间衡量端点延迟，避免输出长度影响路由
+                pool.record_success(
+                    endpoint, response.time_to_first_byte or (time.time() - attempt_start))
+                endpoint.breaker.record_success()
+                is_probe = False
+                latency_tracker.record(endpoint.key, purpose, time.time() - attempt_start)
+                response.content = "".join(chunks)
+                response.duration = time.time() - start_time
+                response.model = endpoint.model_name or self.config.model_name
+                response.endpoint = endpoint.base_url
+                response.effective_max_tokens = max_tokens
+                
+                # 更新统计
+                self.stats["total_requests"] += 1
+                self.stats["total_time"] += response.duration
+                self._record_usage(messages, response)
+                if response.time_to_first_byte is not None:
+                    self.stats["total_time_to_first_byte"] += response.time_to_first_byte
+                if attempt > 0:
+                    self.stats["retries"] += 1
+                
+                self.logger.debug(f"LLM请求完成，耗时: {response.duration:.2f}s, "
+                                  f"首字节: {response.time_to_first_byte or 0:.2f}s, 尝试次数: {attempt + 1}")
+                
+                if cassette_key is not None and self.cassette.recording:
+                    self._record_to_cassette(cassette_key, messages, temperature,
+                                             cassette_max_tokens, json_mode, response)
+                
+                if buffered:
+                    yield response.content
+                return
+                
+            except RateLimitError as e:
+                # 429：按Retry-After暂停整个端点，而不是各自指数退避
+                last_exception = e
+                self.stats["rate_limited"] += 1
+                delay = e.retry_after
+                if delay is None:
+                    delay = min(base_delay * (self.retry_config["exponential_base"] ** attempt),
+                                self.retry_config["max_delay"])
+                endpoint.limiter.record_rate_limited(delay)
+                tried_endpoints.append(endpoint)
+                self.logger.warning(f"LLM请求被限流 (尝试 {attempt + 1}/{max_retries}), 将在 {delay:.1f}s后重试")
+            except DeadlineExceededError:
+                raise
             except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if isinstance(e, asyncio.TimeoutError) and self._deadline_passed():
+                    # 超时由调用截止时间收紧所致，不计为端点故障
+                    self.stats["deadline_exceeded"] += 1
+                    raise DeadlineExceededError("LLM请求超过调用截止时间") from e
                 last_exception = e
+                tried_endpoints.append(endpoint)
+                if self._is_client_error(e):
+                    # 4xx是请求本身的问题（如端点不支持tools）：不计为端点或熔断故障，
+                    # 不重试同一端点，仅在还有其他端点时切换
+                    self.stats["client_errors"] += 1
+                    if not yielded and self._has_failover(pool, tried_endpoints):
+                        self.logger.warning(f"LLM请求被拒绝 (HTTP {e.status}), 切换端点重试")
+                        continue
+                    self.stats["errors"] += 1
+                    self.logger.error(f"LLM请求被拒绝: HTTP {e.status}")
+                    raise
                 self.stats["connection_errors"] += 1
+                pool.record_failure(endpoint)
+                if self._is_breaker_failure(e):
+                    endpoint.breaker.record_failure()
+                    is_probe = False
+                if yielded:
+                    # 已向调用方输出部分内容，无法透明重试
+                    self.stats["errors"] += 1
+                    self.logger.error(f"LLM流式响应中断: {type(e).__name__}")
+                    raise
+                if self._has_failover(pool, tried_endpoints):
+                    self.logger.warning(f"LLM连接失败 (尝试 {attempt + 1}/{max_retries}): {type(e).__name__}, 切换端点重试")
+                    continue
                 delay = min(base_delay * (self.retry_config["exponential_base"] ** attempt), 
                           self.retry_config["max_delay"])
                 self.logger.warning(f"LLM连接失败 (尝试 {attempt + 1}/{max_retries}): {type(e).__name__}, 将在 {delay:.1f}s后重试")
                 if attempt < max_retries - 1:
-                    await asyncio.sleep(delay)
+                    await self._sleep_before_retry(delay)
             except Exception as e:
                 last_exception = e
                 self.stats["errors"] += 1
+                pool.record_failure(endpoint)
+                tried_endpoints.append(endpoint)
+                if yielded:
+                    raise
                 self.logger.error(f"LLM请求异常 (尝试 {attempt + 1}/{max_retries}): {str(e)}")
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(base_delay)
+                if attempt < max_retries - 1 and not self._has_failover(pool, tried_endpoints):
+                    await self._sleep_before_retry(base_delay)
+            finally:
+                # 探针以中性结果结束（限流、4xx、取消等）时归还探针名额
+                if is_probe:
+                    endpoint.breaker.release_probe()
         
         # 所有重试都失败了
         self.stats["errors"] += 1
@@ -118,59 +813,230 @@ class EnhancedLLMClient:
         self.logger.error(error_msg)
         raise Exception(error_msg)
     
-    async def _send_openai_compatible_request(self, session: aiohttp.ClientSession, 
-                                            prompt: str, system_prompt: str,
-                                            temperature: float, max_tokens: int, 
-                                            json_mode: bool) -> str:
-        """发送OpenAI兼容请求"""
-        messages = []
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-        messages.append({"role": "user", "content": prompt})
+    def _load_from_cassette(self, cassette_key: str, response: "LLMResponse"):
+        """从磁带回放响应（未录制时抛出CassetteMissError）
         
+        录制的用量与生成上限一并恢复，使回放时的token记账和续写次数与录制时一致。
+        """
+        recorded = self.cassette.replay(cassette_key)
+        response.content = recorded["content"]
+        response.finish_reason = recorded.get("finish_reason")
+        response.usage = recorded.get("usage") or {}
+        response.model = recorded.get("model")
+        response.tool_calls = recorded.get("tool_calls") or []
+        response.duration = recorded.get("duration") or 0.0
+        response.effective_max_tokens = recorded.get("effective_max_tokens")
+        response.endpoint = "cassette"
+        self.stats["cassette_replays"] += 1
+    
+    def _record_to_cassette(self, cassette_key: str, messages: List[Dict[str, str]],
+                            temperature: float, max_tokens: int, json_mode: bool,
+                            response: "LLMResponse"):
+        """将请求/响应写入磁带"""
+        self.cassette.record(
+            cassette_key,
+            request={
+                "model": response.model,
+                "messages": messages,
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+                "json_mode": json_mode
+            },
+            response={
+                "content": response.content,
+                "finish_reason": response.finish_reason,
+                "usage": response.usage,
+                "model": response.model,
+                "tool_calls": response.tool_calls,
+                "duration": response.duration,
+                "effective_max_tokens": response.effective_max_tokens
+            }
+        )
+    
+    @staticmethod
+    def _is_client_error(error: Exception) -> bool:
+        """请求被端点拒绝的4xx响应（429由RateLimitError单独处理）"""
+        return isinstance(error, aiohttp.ClientResponseError) and 400 <= error.status < 500
+    
+    @staticmethod
+    def _is_breaker_failure(error: Exception) -> bool:
+        """计入熔断的失败：连接错误、超时与5xx"""
+        if isinstance(error, aiohttp.ClientResponseError):
+            return error.status >= 500
+        return isinstance(error, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError,
+                                  asyncio.TimeoutError))
+    
+    @staticmethod
+    def _deadline_passed() -> bool:
+        remaining = time_remaining()
+        return remaining is not None and remaining <= 0
+    
+    async def _sleep_before_retry(self, delay: float):
+        """重试前等待；剩余时间不足以完成等待时直接放弃"""
+        remaining = time_remaining()
+        if remaining is not None and remaining <= delay:
+            self.stats["deadline_exceeded"] += 1
+            raise DeadlineExceededError("剩余时间不足以继续重试LLM请求")
+        await asyncio.sleep(delay)
+    
+    def _request_timeout(self) -> aiohttp.ClientTimeout:
+        """单次HTTP请求的超时：配置超时与调用截止时间中的较小者"""
+        timeout = float(self.config.timeout)
+        remaining = time_remaining()
+        if remaining is not None:
+            timeout = max(0.001, min(timeout, remaining))
+        return aiohttp.ClientTimeout(total=timeout)
+    
+    @staticmethod
+    def _has_failover(pool: EndpointPool, tried_endpoints: List[LLMEndpoint]) -> bool:
+        """是否还有尚未尝试的健康端点可供立即切换"""
+        tried = {endpoint.key for endpoint in tried_endpoints}
+        return any(endpoint.key not in tried and endpoint.is_healthy()
+                   for endpoint in pool.endpoints)
+    
+    def _record_usage(self, messages: List[Dict[str, str]], response: "LLMResponse"):
+        """记录真实token用量（提供商未返回usage时按估算），并记入token账本
+        
+        合并请求的共享任务中只暂存用量，由各等待方调用本方法记账。
+        """
+        call_context = get_call_context()
+        if call_context.usage_sink is not None:
+            call_context.usage_sink.append((messages, response))
+            return
+        
+        estimated = "prompt_tokens" not in response.usage or "completion_tokens" not in response.usage
+        prompt_tokens = response.usage.get("prompt_tokens", self._estimate_messages_tokens(messages))
+        completion_tokens = response.usage.get(
+            "completion_tokens", self._estimate_tokens(response.content))
+        cost = (prompt_tokens * self.config.prompt_token_price +
+                completion_tokens * self.config.completion_token_price) / 1000.0
+        
+        self.stats["prompt_tokens"] += prompt_tokens
+        self.stats["completion_tokens"] += completion_tokens
+        self.stats["total_tokens"] += prompt_tokens + completion_tokens
+        self.stats["total_cost"] += cost
+        
+        token_ledger.record(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            conversation_id=call_context.conversation_id,
+            agent_id=call_context.agent_id,
+            model=response.model or self.config.model_name,
+            cost=cost,
+            duration=response.duration,
+            estimated=estimated
+        )
+    
+    @staticmethod
+    async def _raise_for_status(response: aiohttp.ClientResponse):
+        """非200响应转换为ClientResponseError（429转换为RateLimitError）"""
+        if response.status == 429:
+            error_text = await response.text()
+            raise RateLimitError(
+                request_info=response.request_info,
+                history=response.history,
+                status=response.status,
+                message=error_text,
+                retry_after=parse_retry_after(response.headers.get("Retry-After"))
+            )
+        if response.status != 200:
+            error_text = await response.text()
+            raise aiohttp.ClientResponseError(
+                request_info=response.request_info,
+                history=response.history,
+                status=response.status,
+                message=error_text
+            )
+    
+    async def _stream_openai_compatible_request(self, session: aiohttp.ClientSession,
+                                                endpoint: LLMEndpoint,
+                                                messages: List[Dict[str, str]],
+                                                temperature: float, max_tokens: int, 
+                                                json_mode: bool,
+                                                response: "LLMResponse",
+                                                tools: Optional[List[Dict[str, Any]]] = None
+                                                ) -> AsyncIterator[str]:
+        """发送OpenAI兼容的流式请求，逐条解析SSE事件"""
         payload = {
-            "model": self.config.model_name,
+            "model": endpoint.model_name or self.config.model_name,
             "messages": messages,
             "temperature": temperature,
             "max_tokens": max_tokens,
-            "stream": False
+            "stream": True,
+            "stream_options": {"include_usage": True}
         }
         if json_mode:
             payload["response_format"] = {"type": "json_object"}
+        if tools:
+            payload["tools"] = tools
+            payload["tool_choice"] = "auto"
+        
+        # 工具调用以增量片段下发，按index拼接
+        partial_tool_calls: Dict[int, Dict[str, Any]] = {}
         
         headers = {"Content-Type": "application/json"}
-        if self.config.api_key:
-            headers["Authorization"] = f"Bearer {self.config.api_key}"
-        
-        url = f"{self.config.api_base_url.rstrip('/')}/chat/completions"
-        
-        async with session.post(url, json=payload, headers=headers) as response:
-            if response.status != 200:
-                error_text = await response.text()
-                raise aiohttp.ClientResponseError(
-                    request_info=response.request_info,
-                    history=response.history,
-                    status=response.status,
-                    message=error_text
-                )
+        if endpoint.api_key:
+            headers["Authorization"] = f"Bearer {endpoint.api_key}"
+        
+        url = f"{endpoint.base_url}/chat/completions"
+        
+        async with session.post(url, json=payload, headers=headers,
+                                timeout=self._request_timeout()) as http_response:
+            await self._raise_for_status(http_response)
             
-            response_data = await response.json()
-            return response_data["choices"][0]["message"]["content"]
-    
-    async def _send_ollama_request(self, session: aiohttp.ClientSession,
-                                 prompt: str, system_prompt: str,
-                                 temperature: float, max_tokens: int,
-                                 json_mode: bool) -> str:
-        """发送Ollama请求"""
-        # 构建Ollama格式的prompt
-        full_prompt = prompt
-        if system_prompt:
-            full_prompt = f"System: {system_prompt}\n\nUser: {prompt}"
+            async for raw_line in http_response.content:
+                line = raw_line.decode("utf-8").strip()
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                
+                event = json.loads(data)
+                if event.get("error"):
+                    raise Exception(f"LLM流式响应错误: {event['error']}")
+                
+                # include_usage时最后一个事件携带用量（choices为空）
+                if event.get("usage"):
+                    response.usage = {
+                        "prompt_tokens": event["usage"].get("prompt_tokens", 0),
+                        "completion_tokens": event["usage"].get("completion_tokens", 0)
+                    }
+                
+                for choice in event.get("choices") or []:
+                    if choice.get("finish_reason"):
+                        response.finish_reason = choice["finish_reason"]
+                    delta = choice.get("delta") or {}
+                    for fragment in delta.get("tool_calls") or []:
+                        call = partial_tool_calls.setdefault(
+                            fragment.get("index", len(partial_tool_calls)),
+                            {"id": None, "name": "", "arguments": ""})
+                        function = fragment.get("function") or {}
+                        call["id"] = fragment.get("id") or call["id"]
+                        call["name"] += function.get("name") or ""
+                        call["arguments"] += function.get("arguments") or ""
+                    content = delta.get("content")
+                    if content:
+                        yield content
         
+        response.tool_calls = [
+            self._normalize_tool_call(partial_tool_calls[index], index)
+            for index in sorted(partial_tool_calls)
+        ]
+    
+    async def _stream_ollama_request(self, session: aiohttp.ClientSession,
+                                     endpoint: LLMEndpoint,
+                                     messages: List[Dict[str, str]],
+                                     temperature: float, max_tokens: int,
+                                     json_mode: bool,
+                                     response: "LLMResponse",
+                                     tools: Optional[List[Dict[str, Any]]] = None
+                                     ) -> AsyncIterator[str]:
+        """发送Ollama /api/chat 流式请求，逐行解析NDJSON"""
         payload = {
-            "model": self.config.model_name,
-            "prompt": full_prompt,
-            "stream": False,
+            "model": endpoint.model_name or self.config.model_name,
+            "messages": self._to_ollama_messages(messages) if tools else messages,
+            "stream": True,
             "options": {
                 "temperature": temperature,
                 "num_predict": max_tokens
@@ -179,31 +1045,186 @@ class EnhancedLLMClient:
         
         if json_mode:
             payload["format"] = "json"
+        if tools:
+            payload["tools"] = tools
+        keep_alive = self._keep_alive()
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+        response.tool_calls = []
+        
+        url = f"{endpoint.base_url}/api/chat"
         
-        url = f"{self.config.api_base_url.rstrip('/')}/api/generate"
-        
-        async with session.post(url, json=payload) as response:
-            if response.status != 200:
-                error_text = await response.text()
-                raise aiohttp.ClientResponseError(
-                    request_info=response.request_info,
-                    history=response.history,
-                    status=response.status,
-                    message=error_text
-                )
+        async with session.post(url, json=payload, timeout=self._request_timeout()) as http_response:
+            await self._raise_for_status(http_response)
             
-            response_data = await response.json()
-            return response_data.get("response", "")
+            async for raw_line in http_response.content:
+                line = raw_line.decode("utf-8").strip()
+                if not line:
+                    continue
+                
+                event = json.loads(line)
+                if event.get("error"):
+                    raise Exception(f"Ollama流式响应错误: {event['error']}")
+                
+                message = event.get("message") or {}
+                for call in message.get("tool_calls") or []:
+                    function = call.get("function") or {}
+                    response.tool_calls.append(self._normalize_tool_call(
+                        {"id": call.get("id"), "name": function.get("name", ""),
+                         "arguments": function.get("arguments", {})},
+                        len(response.tool_calls)))
+                content = message.get("content")
+                if content:
+                    yield content
+                if event.get("done"):
+                    response.finish_reason = event.get("done_reason", "stop")
+                    if "eval_count" in event:
+                        response.usage = {
+                            "prompt_tokens": event.get("prompt_eval_count", 0),
+                            "completion_tokens": event.get("eval_count", 0)
+                        }
+                    break
+    
+    def _normalize_tool_call(self, call: Dict[str, Any], index: int) -> Dict[str, Any]:
+        """统一工具调用格式：arguments解析为字典，缺少id时按序号生成"""
+        arguments = call.get("arguments") or {}
+        if isinstance(arguments, str):
+            try:
+                arguments = json.loads(arguments) if arguments.strip() else {}
+            except json.JSONDecodeError:
+                self.logger.warning(f"⚠️ 工具调用参数不是合法JSON: {call.get('name')}")
+                arguments = {}
+        return {"id": call.get("id") or f"call_{index}", "name": call.get("name", ""),
+                "arguments": arguments}
+    
+    @staticmethod
+    def _to_ollama_messages(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Ollama要求assistant消息中的工具参数为对象而非JSON字符串"""
+        converted = []
+        for message in messages:
+            if message.get("tool_calls"):
+                message = dict(message)
+                message["tool_calls"] = [
+                    {"function": {
+                        "name": call["function"]["name"],
+                        "arguments": (json.loads(call["function"]["arguments"] or "{}")
+                                      if isinstance(call["function"]["arguments"], str)
+                                      else call["function"]["arguments"])
+                    }}
+                    for call in message["tool_calls"]
+                ]
+            converted.append(message)
+        return converted
+    
+    def _keep_alive(self) -> Optional[Union[str, int]]:
+        """Ollama keep_alive参数：时长字符串（如"30m"）或秒数（-1为常驻），空值不发送"""
+        value = (self.config.ollama_keep_alive or "").strip()
+        if not value:
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            return value
+    
+    def start_warm_up(self) -> Optional["asyncio.Task"]:
+        """warm_up_on_start启用时在后台启动预热（每个客户端只启动一次），返回预热任务
+        
+        协调者初始化、注册智能体和首次请求时都会调用；没有运行中的事件循环时不启动。
+        """
+        if not self.config.warm_up_on_start:
+            return None
+        if self._warm_up_task is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return None
+            self._warm_up_task = loop.create_task(self.warm_up())
+            self._warm_up_task.add_done_callback(self._on_warm_up_done)
+        return self._warm_up_task
+    
+    def _on_warm_up_done(self, task: "asyncio.Task"):
+        """后台预热结束：记录未预期的异常（否则只会在任务被回收时以警告形式出现）"""
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            self.logger.error(f"❌ 后台模型预热异常: {type(error).__name__}: {str(error)}")
+    
+    async def warm_up(self) -> Dict[str, Dict[str, Any]]:
+        """预加载默认模型及各档位模型，并设置keep_alive使其在对话轮次间保持常驻
+        
+        仅对Ollama端点生效（托管API没有模型加载开销）；各端点并发预热，
+        同一进程内已预热的端点+模型不会重复加载。返回 {端点标识: 预热结果}。
+        """
+        endpoints: Dict[str, LLMEndpoint] = {}
+        for pool in [self.endpoint_pool, *self.tier_pools.values()]:
+            for endpoint in pool.endpoints:
+                if self._is_ollama(endpoint) and endpoint.key not in self._warmed_endpoints:
+                    endpoints.setdefault(endpoint.key, endpoint)
+        if not endpoints:
+            return {}
+        
+        self._warmed_endpoints.update(endpoints.keys())
+        session = await self._get_session()
+        results = await asyncio.gather(
+            *(self._warm_up_endpoint(session, endpoint) for endpoint in endpoints.values()))
+        return dict(zip(endpoints.keys(), results))
+    
+    async def _warm_up_endpoint(self, session: aiohttp.ClientSession,
+                                endpoint: LLMEndpoint) -> Dict[str, Any]:
+        """以空提示请求 /api/generate：Ollama只加载模型而不生成内容"""
+        model = endpoint.model_name or self.config.model_name
+        payload = {"model": model, "prompt": "", "stream": False}
+        keep_alive = self._keep_alive()
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+        
+        start = time.time()
+        try:
+            async with session.post(f"{endpoint.base_url}/api/generate", json=payload) as http_response:
+                await self._raise_for_status(http_response)
+                await http_response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # 预热失败不影响正常请求，下次预热时重试
+            self._warmed_endpoints.discard(endpoint.key)
+            self.logger.warning(f"⚠️ 模型预热失败 {model}@{endpoint.base_url}: {type(e).__name__}")
+            return {"success": False, "model": model, "error": str(e)}
+        
+        duration = time.time() - start
+        self.stats["warm_ups"] += 1
+        self.logger.info(f"🔥 模型预热完成 {model}@{endpoint.base_url}，耗时 {duration:.2f}s")
+        return {"success": True, "model": model, "duration": duration}
     
     async def close(self):
-        """关闭客户端并记录统计信息"""
+        """关闭客户端（释放连接池）并记录统计信息"""
+        if self._warm_up_task is not None and not self._warm_up_task.done():
+            self._warm_up_task.cancel()
+        if self._session is not None and not self._session.closed:
+            try:
+                await self._session.close()
+            except RuntimeError as e:
+                # 会话所属事件循环已关闭
+                self.logger.debug(f"连接池会话关闭失败: {str(e)}")
+        self._session = None
+        self._session_loop = None
         self.logger.info(f"LLM客户端已关闭 - 统计: {self.get_stats()}")
     
     def get_stats(self) -> Dict[str, Any]:
         """获取性能统计"""
         total_requests = max(1, self.stats["total_requests"])
-        return {
+        stats = {
             **self.stats,
             "average_time": self.stats["total_time"] / total_requests,
+            "average_time_to_first_byte": self.stats["total_time_to_first_byte"] / total_requests,
             "success_rate": 1 - (self.stats["errors"] / total_requests)
-        }
\ No newline at end of file
+        }
+        if self.response_cache is not None:
+            stats["response_cache"] = self.response_cache.get_stats()
+        stats["endpoints"] = self.endpoint_pool.get_stats()
+        if self.tier_pools:
+            stats["model_tiers"] = {name: pool.get_stats() for name, pool in self.tier_pools.items()}
+        if self.cassette is not None:
+            stats["cassette"] = self.cassette.get_stats()
+        stats["latency_percentiles"] = latency_tracker.get_stats()
+        stats["output_tokens_by_call_site"] = max_tokens_predictor.get_stats()
+        return stats
\ No newline at end of file
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+LLM请求延迟分位统计 - 对冲请求的触发阈值
+
+Rolling Latency Percentiles per Endpoint and Call Type for Hedged Requests
+"""
+
+import math
+import threading
+from collections import deque
+from typing import Dict, Any, Optional, Tuple
+
+
+class LatencyTracker:
+    """
+    按 (端点, 调用类型) 维护最近请求耗时的滑动窗口
+
+    窗口样本不足 min_samples 时不给出阈值，避免冷启动阶段误触发对冲。
+    """
+
+    def __init__(self, window_size: int = 200):
+        self.window_size = window_size
+        self._samples: Dict[Tuple[str, str], deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint_key: str, purpose: str, latency: float):
+        """记录一次成功请求的耗时（秒）"""
+        key = (endpoint_key, purpose)
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.window_size)
+            samples.append(latency)
+
+    def percentile(self, endpoint_key: str, purpose: str, q: float = 95.0) -> Optional[float]:
+        """窗口内耗时的q分位数（最近秩法），无样本时返回None"""
+        with self._lock:
+            samples = self._samples.get((endpoint_key, purpose))
+            if not samples:
+                return None
+            ordered = sorted(samples)
+        rank = max(1, math.ceil(q / 100.0 * len(ordered)))
+        return ordered[rank - 1]
+
+    def hedge_delay(self, endpoint_key: str, purpose: str, q: float = 95.0,
+                    min_samples: int = 20) -> Optional[float]:
+        """对冲触发延迟：样本充足时为q分位耗时，否则为None（不对冲）"""
+        with self._lock:
+            count = len(self._samples.get((endpoint_key, purpose)) or ())
+        if count < min_samples:
+            return None
+        return self.percentile(endpoint_key, purpose, q)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """各 (端点, 调用类型) 的样本数与p50/p95"""
+        with self._lock:
+            keys = list(self._samples.keys())
+        stats = {}
+        for endpoint_key, purpose in keys:
+            samples = self._samples.get((endpoint_key, purpose)) or ()
+            stats[f"{endpoint_key}:{purpose}"] = {
+                "samples": len(samples),
+                "p50": self.percentile(endpoint_key, purpose, 50.0),
+                "p95": self.percentile(endpoint_key, purpose, 95.0)
+            }
+        return stats
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+
+# 全局延迟统计（端点在进程内共享，延迟分布也随之共享）
+latency_tracker = LatencyTracker()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+LLM JSON输出容错解析 - 提取并修复代码块包裹、尾随逗号与截断的JSON
+
+Tolerant JSON Repair for json_mode LLM Responses
+"""
+
+import json
+import re
+from typing import Any, List, Optional, Tuple
+
+
+class JSONRepairError(ValueError):
+    """LLM输出中没有可修复的JSON"""
+    pass
+
+
+_FENCE_RE = re.compile(r"```[ \t]*(?:json|JSON)?[ \t]*\n?(.*?)(?:```|$)", re.DOTALL)
+_STRING_TAIL_RE = re.compile(r'"(?:[^"\\]|\\.)*"$', re.DOTALL)
+_PARTIAL_LITERAL_RE = re.compile(r'(?<=[\s,:\[{])(?:t|tr|tru|f|fa|fal|fals|n|nu|nul|-)$')
+_NUMBER_TAIL_RE = re.compile(r'(?<=\d)(?:\.|[eE][+-]?)$')
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def _extract_candidate(text: str) -> str:
+    """去掉Markdown代码块，从第一个 { 或 [ 开始截取"""
+    stripped = text.strip()
+    if not stripped.startswith(("{", "[")):
+        match = _FENCE_RE.search(stripped)
+        if match:
+            stripped = match.group(1).strip()
+    starts = [index for index in (stripped.find("{"), stripped.find("[")) if index >= 0]
+    if not starts:
+        raise JSONRepairError("输出中没有JSON对象或数组")
+    return stripped[min(starts):]
+
+
+def _scan(text: str) -> Tuple[Optional[int], List[str], bool]:
+    """扫描括号嵌套，返回 (顶层结束位置或None, 未闭合的括号栈, 是否停在字符串内)"""
+    stack: List[str] = []
+    in_string = False
+    escaped = False
+    for index, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in _CLOSERS:
+            stack.append(char)
+        elif char in "}]":
+            if stack:
+                stack.pop()
+            if not stack:
+                return index, [], False
+    return None, stack, in_string
+
+
+def _remove_trailing_commas(text: str) -> str:
+    """删除字符串之外、紧接 } 或 ] 之前的逗号"""
+    result = []
+    in_string = False
+    escaped = False
+    for index, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == ",":
+            rest = text[index + 1:].lstrip()
+            if rest[:1] in ("}", "]"):
+                continue
+        result.append(char)
+    return "".join(result)
+
+
+def _close_truncated(text: str, stack: List[str], in_string: bool) -> str:
+    """补全被截断的JSON：闭合字符串，丢弃末尾不完整的键/字面量，再补齐括号"""
+    if in_string:
+        if text.endswith("\\"):
+            text = text[:-1]
+        text += '"'
+
+    while True:
+        body = text.rstrip()
+        if body.endswith(","):
+            text = body[:-1]
+            continue
+        if body.endswith(":"):
+            # 值还没输出的键整体丢弃
+            text = _STRING_TAIL_RE.sub("", body[:-1].rstrip())
+            continue
+        partial = _PARTIAL_LITERAL_RE.search(body) or _NUMBER_TAIL_RE.search(body)
+        if partial:
+            text = body[:partial.start()]
+            continue
+        if stack and stack[-1] == "{":
+            string_tail = _STRING_TAIL_RE.search(body)
+            if string_tail and body[:string_tail.start()].rstrip()[-1:] in ("{", ","):
+                text = body[:string_tail.start()]
+                continue
+        text = body
+        break
+
+    return text + "".join(_CLOSERS[opener] for opener in reversed(stack))
+
+
+def is_truncated_json(text: Optional[str]) -> bool:
+    """输出中的JSON是否在顶层闭合之前中断（通常是达到max_tokens）"""
+    if not text:
+        return False
+    try:
+        candidate = _extract_candidate(text)
+    except JSONRepairError:
+        return False
+    end, _, _ = _scan(candidate)
+    return end is None
+
+
+def repair_json(text: str) -> str:
+    """提取并修复LLM输出中的JSON文本，返回可被json.loads解析的字符串（尽力而为）"""
+    candidate = _extract_candidate(text)
+    end, stack, in_string = _scan(candidate)
+    if end is not None:
+        body = candidate[:end + 1]
+    else:
+        body = _close_truncated(candidate, stack, in_string)
+    return _remove_trailing_commas(body)
+
+
+def parse_llm_json(text: Optional[str]) -> Any:
+    """解析LLM输出的JSON，失败时依次处理代码块、尾随逗号和截断；无法修复时抛出JSONRepairError"""
+    if not text:
+        raise JSONRepairError("LLM输出为空")
+    try:
+        return json.loads(text, strict=False)
+    except json.JSONDecodeError:
+        pass
+    repaired = repair_json(text)
+    try:
+        return json.loads(repaired, strict=False)
+    except json.JSONDecodeError as e:
+        raise JSONRepairError(f"无法修复LLM输出中的JSON: {str(e)}") from e
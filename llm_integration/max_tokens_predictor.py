@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+自适应生成上限 - 按调用点的历史输出长度预测max_tokens
+
+Adaptive max_tokens Prediction per Call Site (agent id + purpose)
+"""
+
+import math
+import threading
+from collections import deque
+from typing import Dict, Any, Optional, Tuple
+
+
+class MaxTokensPredictor:
+    """
+    按 (智能体, 调用类型) 维护最近输出token数的滑动窗口
+
+    预测值为窗口q分位数 × headroom，并限制在 [min_tokens, 调用方给出的max_tokens] 内；
+    样本不足 min_samples 时沿用调用方的max_tokens。
+    """
+
+    def __init__(self, window_size: int = 100, min_tokens: int = 64):
+        self.window_size = window_size
+        self.min_tokens = min_tokens
+        self._samples: Dict[Tuple[str, str], deque] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(agent_id: Optional[str], purpose: str) -> Tuple[str, str]:
+        return (agent_id or "unknown", purpose or "default")
+
+    def record(self, agent_id: Optional[str], purpose: str, completion_tokens: int):
+        """记录一次调用实际生成的token数（含续写）"""
+        key = self._key(agent_id, purpose)
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.window_size)
+            samples.append(completion_tokens)
+
+    def predict(self, agent_id: Optional[str], purpose: str, requested: int,
+                q: float = 95.0, headroom: float = 1.2, min_samples: int = 10) -> int:
+        """预测本次调用的生成上限，不超过调用方给出的requested"""
+        with self._lock:
+            samples = self._samples.get(self._key(agent_id, purpose))
+            if not samples or len(samples) < min_samples:
+                return requested
+            ordered = sorted(samples)
+        rank = max(1, math.ceil(q / 100.0 * len(ordered)))
+        predicted = math.ceil(ordered[rank - 1] * headroom)
+        return max(min(self.min_tokens, requested), min(requested, predicted))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """各调用点的样本数、p50与最大输出token数"""
+        with self._lock:
+            snapshot = {key: sorted(samples) for key, samples in self._samples.items()}
+        return {
+            f"{agent_id}:{purpose}": {
+                "samples": len(ordered),
+                "p50": ordered[(len(ordered) - 1) // 2],
+                "max": ordered[-1]
+            }
+            for (agent_id, purpose), ordered in snapshot.items() if ordered
+        }
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+
+# 全局预测器（同一进程内各客户端共享调用点的历史）
+max_tokens_predictor = MaxTokensPredictor()
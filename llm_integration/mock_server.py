@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+本地模拟LLM服务器 - 兼容OpenAI与Ollama协议
+
+Local Mock LLM Server speaking OpenAI /chat/completions (plus /files and
+/batches) and Ollama /api/generate, /api/chat, for offline benchmarking and
+profiling.
+
+用法:
+    python -m llm_integration.mock_server --port 8000 --latency 0.2 --jitter 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+import uuid
+from typing import Callable, Dict, Any, Optional, List, Union
+
+from aiohttp import web
+
+
+# 返回文本，或 {"content": 文本, "tool_calls": [{"name", "arguments"}]} 以模拟原生工具调用，
+# 或 {"status": HTTP状态码, "error": 错误信息} 以模拟提供商拒绝请求
+Responder = Callable[[List[Dict[str, Any]]], Union[str, Dict[str, Any]]]
+
+
+class _MockHTTPError(Exception):
+    """responder要求返回的HTTP错误"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+@web.middleware
+async def _error_middleware(request: web.Request, handler):
+    try:
+        return await handler(request)
+    except _MockHTTPError as e:
+        return web.json_response({"error": {"message": e.message, "code": e.status}}, status=e.status)
+
+
+def default_responder(messages: List[Dict[str, str]]) -> str:
+    """默认响应：确定性地回显最后一条用户消息的摘要"""
+    last_user = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+    return f"MOCK RESPONSE: {last_user[:200]}"
+
+
+class MockLLMServer:
+    """
+    模拟LLM服务器
+
+    - latency: 首字节前的固定延迟（秒）
+    - jitter: 在latency基础上叠加的均匀随机抖动（秒），由seed控制可复现
+    - chunk_size: 流式输出时每个数据块的字符数
+    - responder: 根据消息数组生成响应文本的函数
+    - batch_delay: 批处理作业从创建到完成的秒数，None表示作业一直处于进行中
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 jitter: float = 0.0, chunk_size: int = 16, seed: Optional[int] = 0,
+                 responder: Optional[Responder] = None, batch_delay: Optional[float] = 0.0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.chunk_size = max(1, chunk_size)
+        self.responder = responder or default_responder
+        self.batch_delay = batch_delay
+        self.logger = logging.getLogger("MockLLMServer")
+
+        self._random = random.Random(seed)
+        self._runner: Optional[web.AppRunner] = None
+        self._files: Dict[str, str] = {}
+        self._batches: Dict[str, Dict[str, Any]] = {}
+        self.stats = {"requests": 0, "disconnects": 0, "by_path": {}}
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def create_app(self) -> web.Application:
+        app = web.Application(middlewares=[_error_middleware])
+        app.router.add_post("/chat/completions", self._handle_openai)
+        app.router.add_post("/v1/chat/completions", self._handle_openai)
+        app.router.add_post("/api/generate", self._handle_ollama_generate)
+        app.router.add_post("/api/chat", self._handle_ollama_chat)
+        app.router.add_post("/files", self._handle_file_upload)
+        app.router.add_get("/files/{file_id}/content", self._handle_file_content)
+        app.router.add_post("/batches", self._handle_batch_create)
+        app.router.add_get("/batches/{batch_id}", self._handle_batch_get)
+        app.router.add_post("/batches/{batch_id}/cancel", self._handle_batch_cancel)
+        return app
+
+    async def start(self) -> "MockLLMServer":
+        """启动服务器；port为0时自动分配端口"""
+        self._runner = web.AppRunner(self.create_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        if self.port == 0:
+            self.port = site._server.sockets[0].getsockname()[1]
+        self.logger.info(f"🧪 模拟LLM服务器已启动: {self.base_url}")
+        return self
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "MockLLMServer":
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    async def _simulate_latency(self):
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter > 0 else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _record_request(self, path: str):
+        self.stats["requests"] += 1
+        self.stats["by_path"][path] = self.stats["by_path"].get(path, 0) + 1
+
+    def _chunks(self, text: str) -> List[str]:
+        return [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)] or [""]
+
+    @staticmethod
+    def _count_tokens(text: str) -> int:
+        return max(1, len(text) // 4)
+
+    def _respond(self, messages: List[Dict[str, Any]], max_tokens: Optional[int] = None):
+        """调用responder，返回 (文本, 工具调用列表, 是否因max_tokens截断)"""
+        reply = self.responder(messages)
+        if isinstance(reply, dict) and reply.get("status"):
+            raise _MockHTTPError(int(reply["status"]), reply.get("error") or "mock error")
+        if isinstance(reply, dict):
+            content, tool_calls = reply.get("content") or "", reply.get("tool_calls") or []
+        else:
+            content, tool_calls = reply, []
+        # 与_count_tokens一致，按4字符/token截断
+        if max_tokens and len(content) > max_tokens * 4:
+            return content[:max_tokens * 4], tool_calls, True
+        return content, tool_calls, False
+
+    async def _handle_openai(self, request: web.Request) -> web.StreamResponse:
+        self._record_request(request.path)
+        body = await request.json()
+        messages = body.get("messages", [])
+        content, tool_calls, truncated = self._respond(messages, body.get("max_tokens"))
+        usage = {
+            "prompt_tokens": sum(self._count_tokens(m.get("content") or "") for m in messages),
+            "completion_tokens": self._count_tokens(content)
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        await self._simulate_latency()
+
+        finish_reason = "length" if truncated else ("tool_calls" if tool_calls else "stop")
+        openai_tool_calls = [
+            {"index": i, "id": f"call_mock_{i}", "type": "function",
+             "function": {"name": call["name"],
+                          "arguments": json.dumps(call.get("arguments", {}), ensure_ascii=False)}}
+            for i, call in enumerate(tool_calls)
+        ]
+
+        if not body.get("stream"):
+            message = {"role": "assistant", "content": content}
+            if openai_tool_calls:
+                message["tool_calls"] = openai_tool_calls
+            return web.json_response({
+                "id": f"mock-{int(time.time() * 1000)}",
+                "object": "chat.completion",
+                "model": body.get("model"),
+                "choices": [{"index": 0, "finish_reason": finish_reason, "message": message}],
+                "usage": usage
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        try:
+            await response.prepare(request)
+            for chunk in self._chunks(content):
+                event = {"choices": [{"index": 0, "delta": {"content": chunk}, "finish_reason": None}]}
+                await response.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+            for call in openai_tool_calls:
+                event = {"choices": [{"index": 0, "delta": {"tool_calls": [call]}, "finish_reason": None}]}
+                await response.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+            final = {"choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}]}
+            await response.write(f"data: {json.dumps(final)}\n\n".encode("utf-8"))
+            if (body.get("stream_options") or {}).get("include_usage"):
+                await response.write(f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n".encode("utf-8"))
+            await response.write(b"data: [DONE]\n\n")
+        except ConnectionResetError:
+            # 客户端已断开（例如对冲请求的落败方被取消）
+            self.stats["disconnects"] += 1
+        return response
+
+    async def _handle_ollama_generate(self, request: web.Request) -> web.StreamResponse:
+        self._record_request(request.path)
+        body = await request.json()
+        messages = [{"role": "user", "content": body.get("prompt", "")}]
+        if body.get("system"):
+            messages.insert(0, {"role": "system", "content": body["system"]})
+        return await self._stream_ollama(request, body, messages,
+                                         lambda chunk: {"response": chunk})
+
+    async def _handle_ollama_chat(self, request: web.Request) -> web.StreamResponse:
+        self._record_request(request.path)
+        body = await request.json()
+        return await self._stream_ollama(
+            request, body, body.get("messages", []),
+            lambda chunk: {"message": {"role": "assistant", "content": chunk}},
+            allow_tool_calls=True)
+
+    async def _stream_ollama(self, request: web.Request, body: Dict[str, Any],
+                             messages: List[Dict[str, str]],
+                             make_event: Callable[[str], Dict[str, Any]],
+                             allow_tool_calls: bool = False) -> web.StreamResponse:
+        content, tool_calls, truncated = self._respond(
+            messages, (body.get("options") or {}).get("num_predict"))
+        done_event = {
+            "done": True,
+            "done_reason": "length" if truncated else "stop",
+            "prompt_eval_count": sum(self._count_tokens(m.get("content") or "") for m in messages),
+            "eval_count": self._count_tokens(content)
+        }
+        await self._simulate_latency()
+
+        if body.get("stream") is False:
+            return web.json_response({**make_event(content), **done_event})
+
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        try:
+            await response.prepare(request)
+            for chunk in self._chunks(content):
+                event = {**make_event(chunk), "done": False}
+                await response.write((json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8"))
+            if tool_calls and allow_tool_calls:
+                event = {"message": {"role": "assistant", "content": "", "tool_calls": [
+                    {"function": {"name": call["name"], "arguments": call.get("arguments", {})}}
+                    for call in tool_calls
+                ]}, "done": False}
+                await response.write((json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8"))
+            await response.write((json.dumps({**make_event(""), **done_event}) + "\n").encode("utf-8"))
+        except ConnectionResetError:
+            self.stats["disconnects"] += 1
+        return response
+
+
+    # ------------------------------------------------------------------
+    # OpenAI兼容批处理接口：作业在batch_delay秒后完成，结果由responder生成
+    # ------------------------------------------------------------------
+
+    async def _handle_file_upload(self, request: web.Request) -> web.Response:
+        self._record_request(request.path)
+        form = await request.post()
+        upload = form["file"]
+        content = upload.file.read() if hasattr(upload, "file") else upload
+        file_id = f"file-{uuid.uuid4().hex[:12]}"
+        self._files[file_id] = content.decode("utf-8") if isinstance(content, bytes) else content
+        return web.json_response({"id": file_id, "object": "file", "purpose": form.get("purpose")})
+
+    async def _handle_file_content(self, request: web.Request) -> web.Response:
+        self._record_request("/files/content")
+        content = self._files.get(request.match_info["file_id"])
+        if content is None:
+            return web.json_response({"error": {"message": "file not found"}}, status=404)
+        return web.Response(text=content, content_type="application/jsonl")
+
+    async def _handle_batch_create(self, request: web.Request) -> web.Response:
+        self._record_request(request.path)
+        body = await request.json()
+        if body.get("input_file_id") not in self._files:
+            return web.json_response({"error": {"message": "input file not found"}}, status=400)
+        batch = {"id": f"batch-{uuid.uuid4().hex[:12]}", "object": "batch", "status": "in_progress",
+                 "input_file_id": body["input_file_id"], "created_at": time.time()}
+        self._batches[batch["id"]] = batch
+        return web.json_response(self._public_batch(batch))
+
+    async def _handle_batch_get(self, request: web.Request) -> web.Response:
+        self._record_request("/batches/get")
+        batch = self._batches.get(request.match_info["batch_id"])
+        if batch is None:
+            return web.json_response({"error": {"message": "batch not found"}}, status=404)
+        if (batch["status"] == "in_progress" and self.batch_delay is not None
+                and time.time() - batch["created_at"] >= self.batch_delay):
+            self._complete_batch(batch)
+        return web.json_response(self._public_batch(batch))
+
+    async def _handle_batch_cancel(self, request: web.Request) -> web.Response:
+        self._record_request("/batches/cancel")
+        batch = self._batches.get(request.match_info["batch_id"])
+        if batch is None:
+            return web.json_response({"error": {"message": "batch not found"}}, status=404)
+        if batch["status"] == "in_progress":
+            batch["status"] = "cancelled"
+        return web.json_response(self._public_batch(batch))
+
+    def _complete_batch(self, batch: Dict[str, Any]):
+        lines = []
+        for line in self._files[batch["input_file_id"]].splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            content, _, truncated = self._respond(item["body"]["messages"], item["body"].get("max_tokens"))
+            lines.append(json.dumps({
+                "custom_id": item["custom_id"],
+                "response": {"status_code": 200, "body": {"choices": [{
+                    "index": 0,
+                    "finish_reason": "length" if truncated else "stop",
+                    "message": {"role": "assistant", "content": content}
+                }]}},
+                "error": None
+            }, ensure_ascii=False))
+        output_file_id = f"file-{uuid.uuid4().hex[:12]}"
+        self._files[output_file_id] = "\n".join(lines) + "\n"
+        batch.update(status="completed", output_file_id=output_file_id)
+
+    @staticmethod
+    def _public_batch(batch: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: value for key, value in batch.items() if key != "created_at"}
+
+
+async def _serve_forever(server: MockLLMServer):
+    await server.start()
+    print(f"🧪 模拟LLM服务器运行中: {server.base_url} (Ctrl+C 退出)")
+    try:
+        while True:
+            await asyncio.sleep(3600)
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟LLM服务器（OpenAI/Ollama协议）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="首字节前的固定延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="随机抖动上限（秒）")
+    parser.add_argument("--chunk-size", type=int, default=16, help="流式数据块字符数")
+    parser.add_argument("--seed", type=int, default=0, help="抖动随机种子")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = MockLLMServer(host=args.host, port=args.port, latency=args.latency,
+                           jitter=args.jitter, chunk_size=args.chunk_size, seed=args.seed)
+    try:
+        asyncio.run(_serve_forever(server))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+LLM请求限流器 - 按端点的并发限制与令牌桶限速
+
+Per-Endpoint Concurrency Limiter and Token-Bucket Rate Limiter
+"""
+
+import asyncio
+import hashlib
+import heapq
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, Optional, List, Tuple
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析Retry-After头（秒数或HTTP日期），返回需要等待的秒数"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    令牌桶限速器
+
+    采用预留方式：先扣减令牌，余额为负时按欠额等待，
+    从而在并发调用方之间保持先来先得，且不依赖特定事件循环。
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate_per_second)
+        self.updated_at = now
+
+    def reserve(self, amount: float) -> float:
+        """预留令牌，返回需要等待的秒数"""
+        self._refill()
+        self.tokens -= amount
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate_per_second
+
+    async def acquire(self, amount: float = 1.0) -> float:
+        """获取令牌，必要时等待；返回实际等待时间"""
+        wait_time = self.reserve(amount)
+        if wait_time > 0:
+            await asyncio.sleep(wait_time)
+        return wait_time
+
+
+# 请求优先级（数值越小越优先）：控制面调用（路由、下一发言者决策、任务分析）
+# 优先于批量工作（评审、代码/测试台生成、仿真分析）
+PRIORITY_CONTROL = 0
+PRIORITY_INTERACTIVE = 1
+PRIORITY_BULK = 2
+
+DEFAULT_PURPOSE_PRIORITIES: Dict[str, int] = {
+    "routing": PRIORITY_CONTROL,
+    "decision": PRIORITY_CONTROL,
+    "analysis": PRIORITY_CONTROL,
+    "default": PRIORITY_INTERACTIVE,
+    "function_calling": PRIORITY_INTERACTIVE,
+    "generation": PRIORITY_BULK,
+    "review": PRIORITY_BULK,
+    "simulation_analysis": PRIORITY_BULK
+}
+
+
+class ConcurrencyLimiter:
+    """按优先级排队的并发槽位限制器，同一优先级内先进先出"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+
+    async def acquire(self, priority: int = PRIORITY_INTERACTIVE):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._sequence), waiter)
+        heapq.heappush(self._waiters, entry)
+        try:
+            # 被唤醒时槽位已直接转交给当前等待方
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # 取消前槽位已转交给本等待方，继续转交给下一个
+                self.release()
+            elif entry in self._waiters:
+                # release()可能已弹出被取消的条目，此时无需再移除
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def queued_by_priority(self) -> Dict[int, int]:
+        counts: Dict[int, int] = {}
+        for priority, _, waiter in self._waiters:
+            if not waiter.done():
+                counts[priority] = counts.get(priority, 0) + 1
+        return counts
+
+
+class EndpointRateLimiter:
+    """
+    单个端点的请求整形器
+
+    - 并发槽位限制（max_concurrent），槽位不足时按请求优先级排队
+    - 每分钟请求数令牌桶（requests_per_minute）
+    - 每分钟token数令牌桶（tokens_per_minute）
+    - 收到429后按Retry-After暂停该端点的所有请求
+
+    配置了速率限制时，等待令牌的请求也按优先级逐个放行：
+    队首请求等到令牌足够后才轮到下一个，后到的高优先级请求可越过仍在排队的低优先级请求。
+    """
+
+    def __init__(self, name: str, max_concurrent: int = 0,
+                 requests_per_minute: int = 0, tokens_per_minute: int = 0):
+        self.name = name
+        self.logger = logging.getLogger(f"RateLimiter.{name}")
+        self.concurrency = ConcurrencyLimiter(max_concurrent) if max_concurrent > 0 else None
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.paused_until = 0.0
+        # 速率令牌的准入队列：同一时刻只有一个请求预留令牌并等待
+        self.admission = ConcurrencyLimiter(1)
+
+        self.stats = {
+            "acquired": 0,
+            "throttled": 0,
+            "throttle_wait_time": 0.0,
+            "rate_limited_responses": 0
+        }
+
+    @asynccontextmanager
+    async def slot(self, estimated_tokens: int = 0, priority: int = PRIORITY_INTERACTIVE):
+        """占用一个请求槽位，退出时释放；排队时优先级数值小的请求先获得槽位"""
+        await self._wait_for_clearance(estimated_tokens, priority)
+        if self.concurrency is not None:
+            wait_start = time.monotonic()
+            await self.concurrency.acquire(priority)
+            self._record_wait(time.monotonic() - wait_start)
+        self.stats["acquired"] += 1
+        try:
+            yield
+        finally:
+            if self.concurrency is not None:
+                self.concurrency.release()
+
+    async def _wait_for_clearance(self, estimated_tokens: int,
+                                  priority: int = PRIORITY_INTERACTIVE):
+        """按优先级排队，等待暂停窗口结束并获取速率令牌"""
+        if self.request_bucket is None and self.token_bucket is None:
+            self._record_wait(await self._wait_for_pause())
+            return
+
+        queued = self.admission.active > 0
+        wait_start = time.monotonic()
+        await self.admission.acquire(priority)
+        waited = time.monotonic() - wait_start if queued else 0.0
+        try:
+            waited += await self._wait_for_pause()
+            if self.request_bucket is not None:
+                waited += await self.request_bucket.acquire(1)
+            if self.token_bucket is not None and estimated_tokens > 0:
+                # 单个请求超过桶容量时按容量计，避免永久等待
+                amount = min(estimated_tokens, self.token_bucket.capacity)
+                waited += await self.token_bucket.acquire(amount)
+        finally:
+            self.admission.release()
+        self._record_wait(waited)
+
+    async def _wait_for_pause(self) -> float:
+        """等待429暂停窗口结束，返回等待时间"""
+        pause = self.paused_until - time.monotonic()
+        if pause <= 0:
+            return 0.0
+        await asyncio.sleep(pause)
+        return pause
+
+    def _record_wait(self, wait_time: float):
+        if wait_time > 0:
+            self.stats["throttled"] += 1
+            self.stats["throttle_wait_time"] += wait_time
+
+    def record_rate_limited(self, retry_after: float):
+        """记录429响应，在Retry-After期间暂停该端点"""
+        self.stats["rate_limited_responses"] += 1
+        self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+        self.logger.warning(f"⏳ 端点被限流，暂停 {retry_after:.1f}s")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "active": self.concurrency.active if self.concurrency else None,
+            "queued": len(self.concurrency._waiters) if self.concurrency else 0,
+            "queued_by_priority": self.concurrency.queued_by_priority() if self.concurrency else {},
+            "rate_queued_by_priority": self.admission.queued_by_priority()
+        }
+
+
+def endpoint_key(base_url: Optional[str], api_key: Optional[str] = None) -> str:
+    """端点标识：URL加密钥摘要（同一URL使用不同密钥时分别限流）"""
+    key_digest = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:8]
+    return f"{(base_url or '').rstrip('/')}#{key_digest}"
+
+
+# 进程内按端点共享的限流器，多个智能体共用同一API密钥时协同整形
+_endpoint_limiters: Dict[str, EndpointRateLimiter] = {}
+
+
+def get_endpoint_limiter(base_url: str, api_key: Optional[str] = None,
+                         max_concurrent: int = 0, requests_per_minute: int = 0,
+                         tokens_per_minute: int = 0) -> EndpointRateLimiter:
+    """获取（或创建）端点对应的共享限流器"""
+    limiter_key = endpoint_key(base_url, api_key)
+    limiter = _endpoint_limiters.get(limiter_key)
+    if limiter is None:
+        limiter = EndpointRateLimiter(
+            name=(base_url or "default").rstrip('/'),
+            max_concurrent=max_concurrent,
+            requests_per_minute=requests_per_minute,
+            tokens_per_minute=tokens_per_minute
+        )
+        _endpoint_limiters[limiter_key] = limiter
+    return limiter
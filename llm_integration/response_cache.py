@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+LLM响应缓存 - 基于SQLite(WAL)的持久化内容寻址缓存
+
+Persistent Content-Addressed LLM Response Cache
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+
+class LLMResponseCache:
+    """
+    持久化LLM响应缓存
+
+    - 以请求参数的哈希作为键（内容寻址）
+    - SQLite WAL模式，多个进程可共享同一个缓存文件
+    - 支持TTL过期和按最近访问时间的LRU容量淘汰
+    """
+
+    def __init__(self, db_path: str, ttl_seconds: float = 86400,
+                 max_entries: int = 5000, table: str = "llm_responses"):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.table = table
+        self.logger = logging.getLogger(f"LLMResponseCache.{table}")
+
+        self._lock = threading.Lock()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "writes": 0,
+            "evictions": 0,
+            "expired": 0
+        }
+
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=30.0, check_same_thread=False)
+        self._init_schema()
+
+    def _init_schema(self):
+        """初始化数据表（WAL模式以支持多进程并发读写）"""
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    cache_key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            self._conn.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_{self.table}_last_access "
+                f"ON {self.table}(last_access)"
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def make_key(**fields) -> str:
+        """根据请求字段生成稳定的内容哈希键"""
+        payload = json.dumps(fields, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存，过期条目视为未命中并删除"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, created_at FROM {self.table} WHERE cache_key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+
+            value, created_at = row
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE cache_key = ?", (key,))
+                self._conn.commit()
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+
+            self._conn.execute(
+                f"UPDATE {self.table} SET last_access = ? WHERE cache_key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.stats["hits"] += 1
+            return value
+
+    def put(self, key: str, value: str):
+        """写入缓存并按容量淘汰最久未访问的条目"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (cache_key, value, created_at, last_access) "
+                f"VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            self.stats["writes"] += 1
+            self._evict(now)
+            self._conn.commit()
+
+    async def aget(self, key: str) -> Optional[str]:
+        """在线程池中读取缓存，避免SQLite读写阻塞事件循环"""
+        return await asyncio.to_thread(self.get, key)
+
+    async def aput(self, key: str, value: str):
+        """在线程池中写入缓存，避免SQLite提交阻塞事件循环"""
+        await asyncio.to_thread(self.put, key, value)
+
+    def _evict(self, now: float):
+        """清理过期条目并执行LRU淘汰（调用方持有锁）"""
+        if self.ttl_seconds:
+            cursor = self._conn.execute(
+                f"DELETE FROM {self.table} WHERE created_at < ?", (now - self.ttl_seconds,)
+            )
+            self.stats["expired"] += max(cursor.rowcount, 0)
+
+        if self.max_entries and self.max_entries > 0:
+            cursor = self._conn.execute(
+                f"DELETE FROM {self.table} WHERE cache_key IN ("
+                f"SELECT cache_key FROM {self.table} ORDER BY last_access DESC "
+                f"LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self.stats["evictions"] += max(cursor.rowcount, 0)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+            self._conn.commit()
+        self.logger.info("🧹 LLM响应缓存已清空")
+
+    def size(self) -> int:
+        """当前缓存条目数"""
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": self.size(),
+            "hit_rate": self.stats["hits"] / lookups if lookups else 0.0
+        }
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Token账本 - 按对话和智能体统计真实token用量与成本
+
+Token Ledger for Per-Conversation Usage and Cost Accounting
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Iterable
+
+
+def _empty_usage() -> Dict[str, Any]:
+    return {
+        "requests": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "total_tokens": 0,
+        "estimated_requests": 0,
+        "cost": 0.0,
+        "duration": 0.0
+    }
+
+
+def _add_usage(target: Dict[str, Any], usage: Dict[str, Any]):
+    for key, value in usage.items():
+        target[key] += value
+
+
+class TokenLedger:
+    """
+    Token用量账本
+
+    所有LLM客户端共享一个账本；用量按对话ID汇总，并在对话内按智能体和模型细分。
+    只保存聚合结果，最多保留 max_conversations 个对话。
+    """
+
+    UNATTRIBUTED = "unattributed"
+
+    def __init__(self, max_conversations: int = 1000):
+        self.max_conversations = max_conversations
+        self._lock = threading.Lock()
+        self._conversations: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._agents: Dict[str, Dict[str, Any]] = {}
+        self._total = _empty_usage()
+
+    def record(self, prompt_tokens: int, completion_tokens: int,
+               conversation_id: Optional[str] = None, agent_id: Optional[str] = None,
+               model: Optional[str] = None, cost: float = 0.0,
+               duration: float = 0.0, estimated: bool = False):
+        """记录一次LLM调用的用量"""
+        conversation_id = conversation_id or self.UNATTRIBUTED
+        agent_id = agent_id or self.UNATTRIBUTED
+        model = model or "unknown"
+
+        with self._lock:
+            conversation = self._conversations.get(conversation_id)
+            if conversation is None:
+                conversation = {
+                    "first_seen": time.time(),
+                    "total": _empty_usage(),
+                    "by_agent": {},
+                    "by_model": {}
+                }
+                self._conversations[conversation_id] = conversation
+                while len(self._conversations) > self.max_conversations:
+                    self._conversations.popitem(last=False)
+
+            buckets = [
+                self._total,
+                self._agents.setdefault(agent_id, _empty_usage()),
+                conversation["total"],
+                conversation["by_agent"].setdefault(agent_id, _empty_usage()),
+                conversation["by_model"].setdefault(model, _empty_usage())
+            ]
+            for bucket in buckets:
+                bucket["requests"] += 1
+                bucket["prompt_tokens"] += prompt_tokens
+                bucket["completion_tokens"] += completion_tokens
+                bucket["total_tokens"] += prompt_tokens + completion_tokens
+                bucket["cost"] += cost
+                bucket["duration"] += duration
+                if estimated:
+                    bucket["estimated_requests"] += 1
+
+    def get_conversation_usage(self, conversation_id: str,
+                               include_children: bool = False) -> Dict[str, Any]:
+        """获取单个对话的用量明细
+
+        include_children为True时一并汇总以"{conversation_id}."为前缀的子对话
+        （子任务、流水线评审等），并在conversations中给出各对话的小计。
+        """
+        with self._lock:
+            if include_children:
+                prefix = f"{conversation_id}."
+                matched = {cid: conv for cid, conv in self._conversations.items()
+                           if cid == conversation_id or cid.startswith(prefix)}
+            else:
+                conversation = self._conversations.get(conversation_id)
+                matched = {conversation_id: conversation} if conversation is not None else {}
+
+            usage = {"total": _empty_usage(), "by_agent": {}, "by_model": {}}
+            for conversation in matched.values():
+                _add_usage(usage["total"], conversation["total"])
+                for group in ("by_agent", "by_model"):
+                    for key, bucket in conversation[group].items():
+                        _add_usage(usage[group].setdefault(key, _empty_usage()), bucket)
+            if include_children:
+                usage["conversations"] = {cid: dict(conv["total"]) for cid, conv in matched.items()}
+            return usage
+
+    def get_summary(self, conversation_ids: Optional[Iterable[str]] = None,
+                    include_children: bool = False) -> Dict[str, Any]:
+        """获取账本汇总；指定conversation_ids时只汇总这些对话（include_children同get_conversation_usage）"""
+        if conversation_ids is not None:
+            conversation_ids = set(conversation_ids)
+            if include_children:
+                # 已被其他对话作为子对话汇总的ID不再单独计入，避免重复计数
+                conversation_ids = {cid for cid in conversation_ids if not any(
+                    cid.startswith(f"{other}.") for other in conversation_ids)}
+            conversations = {cid: self.get_conversation_usage(cid, include_children)
+                             for cid in conversation_ids}
+            total = _empty_usage()
+            for usage in conversations.values():
+                _add_usage(total, usage["total"])
+            return {"total": total, "conversations": conversations}
+
+        with self._lock:
+            return {
+                "total": dict(self._total),
+                "by_agent": {k: dict(v) for k, v in self._agents.items()},
+                "conversations": {cid: dict(conv["total"])
+                                  for cid, conv in self._conversations.items()}
+            }
+
+    def reset(self):
+        """清空账本"""
+        with self._lock:
+            self._conversations.clear()
+            self._agents.clear()
+            self._total = _empty_usage()
+
+
+# 全局token账本实例
+token_ledger = TokenLedger()
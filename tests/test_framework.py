@@ -6,11 +6,13 @@ Framework Test Script for Centralized Agent Framework
 """
 
 import asyncio
+import json
 import logging
 import os
 import sys
 import tempfile
 import shutil
+import time
 from pathlib import Path
 
 # 添加项目根目录到Python路径
@@ -19,11 +21,26 @@ sys.path.insert(0, str(project_root))
 
 from config.config import FrameworkConfig, LLMConfig, CoordinatorConfig, AgentConfig
 from core.centralized_coordinator import CentralizedCoordinator
-from core.base_agent import TaskMessage, FileReference
+from core.base_agent import BaseAgent, TaskMessage, FileReference
+from core.task_graph import TaskGraph, TaskGraphError
+from core.function_calling import FunctionCallingAgent
+from core.enums import AgentCapability, SubTaskStatus
 from agents.verilog_design_agent import VerilogDesignAgent
 from agents.verilog_test_agent import VerilogTestAgent
 from agents.verilog_review_agent import VerilogReviewAgent
+from agents.real_code_reviewer import RealCodeReviewAgent
 from llm_integration.enhanced_llm_client import EnhancedLLMClient
+from llm_integration.response_cache import LLMResponseCache
+from llm_integration.max_tokens_predictor import max_tokens_predictor
+from llm_integration.mock_server import MockLLMServer, default_responder
+from llm_integration.json_repair import parse_llm_json
+from llm_integration.rate_limiter import (ConcurrencyLimiter, EndpointRateLimiter,
+                                          PRIORITY_BULK, PRIORITY_CONTROL)
+from llm_integration.call_context import DeadlineExceededError, llm_call_scope
+from llm_integration.circuit_breaker import CircuitOpenError
+from llm_integration.hedging import latency_tracker
+from llm_integration.token_ledger import token_ledger
+from llm_integration.batch_jobs import LLMBatchQueue, OpenAIBatchProcessor, create_batch_queue
 
 
 class FrameworkTester:
@@ -111,6 +128,822 @@ class FrameworkTester:
         except Exception as e:
             self.record_test_result(test_name, False, f"LLM客户端创建失败: {str(e)}")
     
+    async def test_llm_response_cache(self):
+        """测试LLM响应缓存"""
+        test_name = "LLM响应缓存测试"
+        
+        try:
+            cache = LLMResponseCache("llm_cache_test.db", ttl_seconds=3600, max_entries=2)
+            key_a = LLMResponseCache.make_key(prompt="a", temperature=0.3)
+            key_b = LLMResponseCache.make_key(prompt="b", temperature=0.3)
+            key_c = LLMResponseCache.make_key(prompt="c", temperature=0.3)
+            assert key_a == LLMResponseCache.make_key(temperature=0.3, prompt="a")
+            assert key_a != key_b
+            
+            cache.put(key_a, "response_a")
+            cache.put(key_b, "response_b")
+            assert cache.get(key_a) == "response_a"
+            
+            # 容量为2，写入c后最久未访问的b被淘汰
+            cache.put(key_c, "response_c")
+            assert cache.get(key_b) is None
+            assert cache.get(key_a) == "response_a"
+            assert cache.size() == 2
+            
+            # 另一个连接（模拟另一个进程）可以读取同一缓存
+            shared = LLMResponseCache("llm_cache_test.db", ttl_seconds=3600, max_entries=2)
+            assert shared.get(key_c) == "response_c"
+            
+            # 异步接口在线程池中执行SQLite读写
+            await shared.aput(key_b, "response_b2")
+            assert await cache.aget(key_b) == "response_b2"
+            
+            # TTL过期
+            expired = LLMResponseCache("llm_cache_test.db", ttl_seconds=0.01, max_entries=2)
+            time.sleep(0.05)
+            assert expired.get(key_a) is None
+            
+            for c in (cache, shared, expired):
+                c.close()
+            
+            self.record_test_result(test_name, True, "缓存读写、LRU淘汰和TTL正常")
+            
+        except Exception as e:
+            self.record_test_result(test_name, False, f"LLM响应缓存测试失败: {str(e)}")
+    
+    async def test_concurrency_limiter(self):
+        """测试并发槽位限制器的取消处理"""
+        test_name = "并发限制器取消测试"
+        
+        try:
+            limiter = ConcurrencyLimiter(1)
+            await limiter.acquire()
+            
+            # 排队中的请求被取消后槽位才释放：release()先弹出已取消的条目
+            queued = asyncio.create_task(limiter.acquire())
+            await asyncio.sleep(0)
+            queued.cancel()
+            limiter.release()
+            try:
+                await queued
+                assert False, "排队请求未被取消"
+            except asyncio.CancelledError:
+                pass
+            assert limiter.active == 0 and not limiter._waiters
+            
+            # 槽位已转交后再取消：槽位继续转交，不泄漏
+            await limiter.acquire()
+            queued = asyncio.create_task(limiter.acquire())
+            await asyncio.sleep(0)
+            limiter.release()
+            queued.cancel()
+            try:
+                await queued
+            except asyncio.CancelledError:
+                pass
+            assert limiter.active == 0 and not limiter._waiters
+            
+            self.record_test_result(test_name, True, "取消的排队请求不抛出ValueError且不泄漏槽位")
+            
+        except Exception as e:
+            self.record_test_result(test_name, False, f"并发限制器测试失败: {type(e).__name__}: {str(e)}")
+    
+    async def test_rate_limit_priority(self):
+        """测试速率限制下按优先级放行（未配置并发上限时同样生效）"""
+        test_name = "限速优先级测试"
+        
+        try:
+            # 每0.05s补充一个请求令牌，且桶已耗尽
+            limiter = EndpointRateLimiter("priority-test", requests_per_minute=1200)
+            limiter.request_bucket.tokens = 0
+            order = []
+            
+            async def call(name, priority):
+                async with limiter.slot(priority=priority):
+                    order.append(name)
+            
+            bulk = [asyncio.create_task(call(f"bulk{i}", PRIORITY_BULK)) for i in range(3)]
+            await asyncio.sleep(0.01)
+            control = asyncio.create_task(call("control", PRIORITY_CONTROL))
+            await asyncio.gather(*bulk, control)
+            
+            # 队首的bulk0已在等待令牌，后到的控制面调用越过其余排队的批量调用
+            assert order == ["bulk0", "control", "bulk1", "bulk2"], order
+            assert limiter.stats["throttled"] == 4
+            
+            self.record_test_result(test_name, True, "优先级0的调用先于排队的优先级2调用获得令牌")
+            
+        except Exception as e:
+            self.record_test_result(test_name, False, f"限速优先级测试失败: {type(e).__name__}: {str(e)}")
+    
+    async def test_default_priority_lanes(self):
+        """测试默认配置下的优先级排队：并发槽位取每主机连接数"""
+        test_name = "默认配置优先级排队测试"
+        
+        try:
+            arrivals = []
+            
+            def responder(messages):
+                arrivals.append(messages[-1]["content"])
+                return "ok"
+            
+            async with MockLLMServer(latency=0.2, responder=responder) as server:
+                config = LLMConfig(provider="openai", api_key="mock-default-lanes",
+                                   api_base_url=server.base_url)
+                client = EnhancedLLMClient(config)
+                limiter = client.endpoint_pool.endpoints[0].limiter
+                assert limiter.concurrency.limit == config.connections_per_host
+                
+                # 批量调用占满全部槽位并继续排队，之后到达的路由调用越过排队的批量调用
+                bulk = [asyncio.create_task(client.send_prompt(f"评审模块{i}", use_cache=False,
+                                                               purpose="review"))
+                        for i in range(config.connections_per_host + 5)]
+                await asyncio.sleep(0.05)
+                assert limiter.get_stats()["queued_by_priority"] == {PRIORITY_BULK: 5}
+                routing = asyncio.create_task(client.send_prompt("选择智能体", use_cache=False,
+                                                                 purpose="routing"))
+                await asyncio.gather(*bulk, routing)
+                
+                assert arrivals.index("选择智能体") == config.connections_per_host, arrivals
+                await client.close()
+            
+            self.record_test_result(test_name, True, "未配置限流时优先级0的调用先于排队的优先级2调用发出")
+            
+        except Exception as e:
+            self.record_test_result(test_name, False, f"默认配置优先级排队测试失败: {type(e).__name__}: {str(e)}")
+    
+    async def test_mock_server_and_cassette(self):
+        """测试模拟LLM服务器与录制/回放磁带"""
+        test_name = "模拟服务器与磁带回放测试"
+        
+        try:
+            shift_register = "".join(f"assign q[{i}] = d[{i}];\n" for i in range(40))
+            
+            def responder(messages):
+                if "移位寄存器" not in messages[0]["content"]:
+                    return default_responder(messages)
+                # 续写请求包含已输出内容，返回剩余部分
+                return shift_register[len(messages[-2]["content"]):] if len(messages) > 1 else shift_register
+            
+            async with MockLLMServer(latency=0.01, jitter=0.01, responder=responder) as server:
+                record_client = EnhancedLLMClient(LLMConfig(
+                    provider="openai", api_key="mock", api_base_url=server.base_url,
+                    cassette_mode="record", cassette_path="cassette.jsonl"
+                ))
+                recorded = await record_client.send_prompt("设计一个计数器", system_prompt="你是设计专家")
+                await record_client.close()
+                
+                # 自适应max_tokens收紧了实际发送的上限并触发续写，磁带仍按调用方请求的上限记录
+                for _ in range(10):
+                    max_tokens_predictor.record(None, "cassette_adaptive", 10)
+                adaptive_client = EnhancedLLMClient(LLMConfig(
+                    provider="openai", api_key="mock", api_base_url=server.base_url,
+                    cassette_mode="record", cassette_path="cassette.jsonl", adaptive_max_tokens=True
+                ))
+                adaptive_recorded = await adaptive_client.send_prompt("设计一个移位寄存器",
+                                                                      purpose="cassette_adaptive")
+                assert adaptive_client.stats["continuations"] >= 1
+                await adaptive_client.close()
+                
+                ollama_client = EnhancedLLMClient(LLMConfig(provider="ollama", api_base_url=server.base_url))
+                ollama_response = await ollama_client.send_prompt("设计一个计数器")
+                await ollama_client.close()
+                
+                assert server.stats["by_path"]["/api/chat"] == 1
+                assert recorded == ollama_response
+            
+            # 服务器已关闭，回放模式不访问网络
+            replay_client = EnhancedLLMClient(LLMConfig(
+                provider="openai", api_key="mock", api_base_url=server.base_url,
+                cassette_mode="replay", cassette_path="cassette.jsonl"
+            ))
+            with llm_call_scope(conversation_id="cassette_replay"):
+                replayed = await replay_client.send_prompt("设计一个计数器", system_prompt="你是设计专家")
+            assert replayed == recorded
+            assert replay_client.stats["cassette_replays"] == 1
+            # 回放的用量计入token账本
+            replay_usage = token_ledger.get_conversation_usage("cassette_replay")["total"]
+            assert replay_usage["requests"] == 1 and replay_usage["total_tokens"] > 0
+            
+            # 回放时不启用自适应上限，仍按录制时的生成上限续写，请求序列与录制一致
+            assert await replay_client.send_prompt("设计一个移位寄存器",
+                                                   purpose="cassette_adaptive") == adaptive_recorded
+            assert replay_client.stats["continuations"] == adaptive_client.stats["continuations"]
+            await replay_client.close()
+            
+            self.record_test_result(test_name, True, "模拟服务器响应正常，磁带回放结果一致")
+            
+        except Exception as e:
+            self.record_test_result(test_name, False, f"模拟服务器与磁带测试失败: {str(e)}")
+    
+    async def test_request_coalescing(self):
+        """测试并发相同请求合并（仅在同一端点内合并，仅合并temperature为0的请求）"""
+        test_name = "请求合并测试"
+        
+        try:
+            async with MockLLMServer(latency=0.1) as server_a, \
+                    MockLLMServer(latency=0.1, responder=lambda messages: "来自B") as server_b:
+                client_a1 = EnhancedLLMClient(LLMConfig(provider="openai", api_key="mock",
+                                                        api_base_url=server_a.base_url))
+                client_a2 = EnhancedLLMClient(LLMConfig(provider="openai", api_key="mock",
+                                                        api_base_url=server_a.base_url))
+                client_b = EnhancedLLMClient(LLMConfig(provider="openai", api_key="mock",
+                                                       api_base_url=server_b.base_url))
+                
+                results = await asyncio.gather(
+                    client_a1.send_prompt("设计一个加法器", temperature=0, use_cache=False),
+                    client_a2.send_prompt("设计一个加法器", temperature=0, use_cache=False),
+                    client_b.send_prompt("设计一个加法器", temperature=0, use_cache=False)
+                )
+                
+                # 同一端点的两个调用只发出一次请求；不同端点各自请求，不共享响应
+                assert server_a.stats["requests"] == 1
+                assert server_b.stats["requests"] == 1
+                assert results[0] == results[1]
+                assert results[2] == "来自B"
+                assert client_a2.stats["coalesced_hits"] == 1
+                
+                # 默认temperature下是采样请求，相同提示也各自生成
+                await asyncio.gather(
+                    client_a1.send_prompt("设计一个加法器", use_cache=False),
+                    client_a2.send_prompt("设计一个加法器", use_cache=False)
+                )
+                assert server_a.stats["requests"] == 3
+                assert client_a2.stats["coalesced_hits"] == 1
+                
+                for client in (client_a1, client_a2, client_b):
+                    await client.close()
+            
+            self.record_test_result(test_name, True, "同端点确定性请求合并，不同端点和采样请求互不共享")
+            
+        except Exception as e:
+            self.record_test_result(test_name, False, f"请求合并测试失败: {str(e)}")
+    
+    async def test_coalescing_call_context(self):
+        """测试合并请求的调用上下文：截止时间按调用方各自计算，用量与生成长度记入各自调用点"""
+        test_name = "合并请求调用上下文测试"
+        
+        try:
+            async with MockLLMServer(latency=0.3) as server:
+                client = EnhancedLLMClient(LLMConfig(provider="openai", api_key="mock",
+                                                     api_base_url=server.base_url))
+                
+                async def call(conversation_id, timeout=None, agent_id=None):
+                    deadline = time.time() + timeout if timeout else None
+                    with llm_call_scope(agent_id=agent_id, conversation_id=conversation_id,
+                                        deadline=deadline):
+                        return await client.send_prompt("设计一个译码器", temperature=0,
+                                                        use_cache=False, purpose="coalesce_ctx")
+                
+                # 首个调用方的截止时间很短：它超时，后加入的调用方仍拿到共享结果
+                results = await asyncio.gather(call("conv_ctx", timeout=0.1), call("conv_ctx"),
+                                               return_exceptions=True)
+                assert isinstance(results[0], DeadlineExceededError)
+                assert isinstance(results[1], str)
+                assert server.stats["requests"] == 1
+                
+                # 不同对话、不同智能体的相同请求同样合并，用量和生成长度记入各自的对话与调用点
+                await asyncio.gather(call("conv_ctx_a", agent_id="ctx_agent_a"),
+                                     call("conv_ctx_b", agent_id="ctx_agent_b"))
+                assert server.stats["requests"] == 2
+                usage_a = token_ledger.get_conversation_usage("conv_ctx_a")["total"]
+                usage_b = token_ledger.get_conversation_usage("conv_ctx_b")["total"]
+                assert usage_a["requests"] == 1 and usage_b["requests"] == 1
+                assert usage_a["total_tokens"] == usage_b["total_tokens"] > 0
+                predictor_stats = max_tokens_predictor.get_stats()
+                assert predictor_stats["ctx_agent_a:coalesce_ctx"]["samples"] == 1
+                assert predictor_stats["ctx_agent_b:coalesce_ctx"]["samples"] == 1
+                await client.close()
+            
+            self.record_test_result(test_name, True, "调用方各自超时，跨对话合并且用量与生成长度分别记账")
+            
+        except Exception as e:
+            self.record_test_result(test_name, False, f"合并请求调用上下文测试失败: {str(e)}")
+    
+    async def test_model_warm_up(self):
+        """测试协调者初始化时的Ollama模型预热"""
+        test_name = "模型预热测试"
+        
+        try:
+            async with MockLLMServer() as server:
+                client = EnhancedLLMClient(LLMConfig(
+                    provider="ollama", api_base_url=server.base_url, model_name="warm-model",
+                    warm_up_on_start=True, ollama_keep_alive="10m"
+                ))
+                # 在事件循环中创建协调者即开始后台预热，await warm_up()等待其完成
+                coordinator = CentralizedCoordinator(FrameworkConfig(), client)
+                assert client._warm_up_task is not None
+                results = await coordinator.warm_up()
+                
+                assert len(results) == 1 and all(r["success"] for r in results.values())
+                assert server.stats["by_path"] == {"/api/generate": 1}
+                assert client.stats["warm_ups"] == 1
+                
+                # 首次请求不再重复预热
+                await client.send_prompt("设计一个计数器", use_cache=False)
+                assert server.stats["by_path"] == {"/api/generate": 1, "/api/chat": 1}
+                await client.close()
+            
+            self.record_test_result(test_name, True, "协调者初始化时完成预热，首次请求不重复加载")
+            
+        except Exception as e:
+            self.record_test_result(test_name, False, f"模型预热测试失败: {str(e)}")
+    
+    async def test_pooled_session(self):
+        """测试长连接会话在请求间复用，关闭后重新创建"""
+        test_name = "连接池会话复用测试"
+        
+        try:
+            async with MockLLMServer() as server:
+                client = EnhancedLLMClient(LLMConfig(provider="openai", api_key="mock",
+                                                     api_base_url=server.base_url))
+                
+                # 同一事件循环内的多次请求复用同一个会话（连接池）
+                await client.send_prompt("设计一个四位计数器", use_cache=False)
+                session = client._session
+                await client.send_prompt("设计一个八位计数器", use_cache=False)
+                assert client._session is session
+                assert client.stats["sessions_created"] == 1
+                
+                # 关闭后再次请求创建新会话
+                await client.close()
+                assert client._session is None
+                await client.send_prompt("设计一个四位计数器", use_cache=False)
+                assert client.stats["sessions_created"] == 2
+                await client.close()
+            
+            self.record_test_result(test_name, True, "会话在请求间复用，关闭后重新创建")
+            
+        except Exception as e:
+            self.record_test_result(test_name, False, f"连接池会话复用测试失败: {str(e)}")
+    
+    async def test_streaming(self):
+        """测试流式输出（OpenAI SSE与Ollama NDJSON）"""
+        test_name = "流式输出测试"
+        
+        try:
+            async with MockLLMServer(chunk_size=4) as server:
+                client = EnhancedLLMClient(LLMConfig(provider="openai", api_key="mock",
+                                                     api_base_url=server.base_url))
+                full = await client.send_prompt("设计一个四位计数器", use_cache=False)
+                
+                # 流式接口逐块产出，拼接结果与非流式一致
+                chunks = [chunk async for chunk in client.stream_prompt("设计一个四位计数器")]
+                assert len(chunks) > 1 and "".join(chunks) == full
+                await client.close()
+                
+                ollama_client = EnhancedLLMClient(LLMConfig(provider="ollama", api_base_url=server.base_url))
+                ollama_chunks = [chunk async for chunk in ollama_client.stream_prompt("设计一个四位计数器")]
+                assert len(ollama_chunks) > 1 and "".join(ollama_chunks) == full
+                await ollama_client.close()
+            
+            self.record_test_result(test_name, True, "SSE与NDJSON流式输出正常")
+            
+        except Exception as e:
+            self.record_test_result(test_name, False, f"流式输出测试失败: {str(e)}")
+    
+    async def test_endpoint_rate_limiting(self):
+        """测试端点并发上限与429暂停"""
+        test_name = "端点限流测试"
+        
+        try:
+            async with MockLLMServer(latency=0.1) as server:
+                client = EnhancedLLMClient(LLMConfig(provider="openai", api_key="mock-limit",
+                                                     api_base_url=server.base_url,
+                                                     max_concurrent_requests=2))
+                
+                # 6个并发请求受限于2个并发槽位，至少分3批完成
+                start = time.time()
+                results = await client.send_prompts_batch([f"设计模块{i}" for i in range(6)],
+                                                          max_concurrency=6)
+                elapsed = time.time() - start
+                assert all(result.success for result in results)
+                assert elapsed >= 0.28, f"并发上限未生效: {elapsed:.2f}s"
+                limiter_stats = client.endpoint_pool.endpoints[0].limiter.get_stats()
+                assert limiter_stats["acquired"] == 6 and limiter_stats["throttled"] >= 4
+                await client.close()
+            
+            calls = []
+            
+            def responder(messages):
+                calls.append(messages)
+                return {"status": 429, "error": "rate limited"} if len(calls) == 1 else "限流后成功"
+            
+            async with MockLLMServer(responder=responder) as server:
+                client = EnhancedLLMClient(LLMConfig(provider="openai", api_key="mock",
+                                                     api_base_url=server.base_url, retry_delay=0.05))
+                
+                # 429后暂停端点并重试，而不计为端点故障
+                assert await client.send_prompt("设计一个加法器", use_cache=False) == "限流后成功"
+                endpoint = client.endpoint_pool.endpoints[0]
+                assert client.stats["rate_limited"] == 1
+                assert endpoint.limiter.stats["rate_limited_responses"] == 1
+                assert endpoint.breaker.get_stats()["consecutive_failures"] == 0
+                await client.close()
+            
+            self.record_test_result(test_name, True, f"并发上限生效（6个请求耗时 {elapsed:.2f}s），429后暂停重试")
+            
+        except Exception as e:
+            self.record_test_result(test_name, False, f"端点限流测试失败: {str(e)}")
+    
+    async def test_endpoint_failover(self):
+        """测试多端点故障切换与失败端点冷却"""
+        test_name = "端点切换测试"
+        
+        try:
+            async with MockLLMServer(responder=lambda messages: {"status": 500, "error": "down"}) as failing, \
+                    MockLLMServer(responder=lambda messages: "来自备用端点") as healthy:
+                client = EnhancedLLMClient(LLMConfig(
+                    provider="openai", api_key="mock", api_base_url=failing.base_url, retry_delay=0.01,
+                    endpoints=[{"base_url": failing.base_url}, {"base_url": healthy.base_url}]
+                ))
+                
+                # 首个端点返回5xx：立即切换到备用端点，失败端点进入冷却期不再参与路由
+                assert await client.send_prompt("设计一个加法器", use_cache=False) == "来自备用端点"
+                assert await client.send_prompt("设计一个减法器", use_cache=False) == "来自备用端点"
+                assert failing.stats["requests"] == 1 and healthy.stats["requests"] == 2
+                assert client.endpoint_pool.endpoints[0].stats["failovers"] == 1
+                await client.close()
+            
+            self.record_test_result(test_name, True, "5xx时切换到备用端点，失败端点进入冷却期")
+            
+        except Exception as e:
+            self.record_test_result(test_name, False, f"端点切换测试失败: {type(e).__name__}: {str(e)}")
+    
+    async def test_circuit_breaker(self):
+        """测试熔断器的打开、快速失败与半开探测"""
+        test_name = "熔断器测试"
+        
+        try:
+            state = {"healthy": False}
+            
+            def responder(messages):
+                return "探针成功" if state["healthy"] else {"status": 503, "error": "unavailable"}
+            
+            async with MockLLMServer(responder=responder) as server:
+                client = EnhancedLLMClient(LLMConfig(
+                    provider="openai", api_key="mock", api_base_url=server.base_url,
+                    retry_attempts=2, retry_delay=0.01,
+                    circuit_breaker_threshold=2, circuit_breaker_cooldown=0.2
+                ))
+                breaker = client.endpoint_pool.endpoints[0].breaker
+                
+                # 连续2次5xx后熔断
+                try:
+                    await client.send_prompt("设计一个乘法器", use_cache=False)
+                    assert False, "5xx请求应当失败"
+                except AssertionError:
+                    raise
+                except Exception:
+                    pass
+                assert breaker.state == "open" and server.stats["requests"] == 2
+                
+                # 熔断期间快速失败，不访问端点
+                try:
+                    await client.send_prompt("设计一个除法器", use_cache=False)
+                    assert False, "熔断期间的请求应当快速失败"
+                except CircuitOpenError:
+                    pass
+                assert server.stats["requests"] == 2 and client.stats["circuit_rejected"] == 1
+                
+                # 冷却结束后半开，探针成功即关闭熔断
+                state["healthy"] = True
+                await asyncio.sleep(0.25)
+                assert breaker.state == "half_open"
+                assert await client.send_prompt("设计一个除法器", use_cache=False) == "探针成功"
+                assert breaker.state == "closed" and breaker.get_stats()["probes"] == 1
+                await client.close()
+            
+            self.record_test_result(test_name, True, "连续5xx后熔断并快速失败，半开探针恢复")
+            
+        except Exception as e:
+            self.record_test_result(test_name, False, f"熔断器测试失败: {type(e).__name__}: {str(e)}")
+    
+    async def test_hedged_requests(self):
+        """测试超过延迟分位阈值时的对冲请求"""
+        test_name = "对冲请求测试"
+        
+        try:
+            async with MockLLMServer(latency=1.0, responder=lambda messages: "慢端点") as slow, \
+                    MockLLMServer(responder=lambda messages: "快端点") as fast:
+                client = EnhancedLLMClient(LLMConfig(
+                    provider="openai", api_key="mock", api_base_url=slow.base_url,
+                    endpoints=[{"base_url": slow.base_url}, {"base_url": fast.base_url}],
+                    enable_hedging=True, hedge_min_samples=5
+                ))
+                # 主端点近期p95为50ms
+                for _ in range(5):
+                    latency_tracker.record(client.endpoint_pool.endpoints[0].key, "hedge_test", 0.05)
+                
+                start = time.time()
+                result = await client.send_prompt("设计一个比较器", use_cache=False, purpose="hedge_test")
+                elapsed = time.time() - start
+                
+                assert result == "快端点"
+                assert elapsed < 0.8, f"对冲请求未生效: {elapsed:.2f}s"
+                assert client.stats["hedged_requests"] == 1 and client.stats["hedge_wins"] == 1
+                assert slow.stats["requests"] == 1 and fast.stats["requests"] == 1
+                await client.close()
+            
+            async with MockLLMServer(latency=0.1) as server:
+                client = EnhancedLLMClient(LLMConfig(
+                    provider="openai", api_key="mock-hedge-queue", api_base_url=server.base_url,
+                    max_concurrent_requests=1, enable_hedging=True, hedge_min_samples=5
+                ))
+                for _ in range(5):
+                    latency_tracker.record(client.endpoint_pool.endpoints[0].key, "hedge_queue_test", 0.2)
+                
+                # 并发槽位为1：后两个请求排队超过p95阈值，但排队时间不计入对冲计时
+                await asyncio.gather(*[
+                    client.send_prompt(f"设计模块{i}", use_cache=False, purpose="hedge_queue_test")
+                    for i in range(3)
+                ])
+                assert client.stats["hedged_requests"] == 0
+                assert server.stats["requests"] == 3
+                await client.close()
+            
+            self.record_test_result(test_name, True, f"主请求超过p95后对冲请求胜出，耗时 {elapsed:.2f}s；"
+                                                     f"排队等待槽位不触发对冲")
+            
+        except Exception as e:
+            self.record_test_result(test_name, False, f"对冲请求测试失败: {str(e)}")
+    
+    async def test_model_tiering(self):
+        """测试按调用类型路由到不同模型档位"""
+        test_name = "模型档位路由测试"
+        
+        try:
+            async with MockLLMServer(responder=lambda messages: "大模型") as large, \
+                    MockLLMServer(responder=lambda messages: "小模型") as small:
+                client = EnhancedLLMClient(LLMConfig(
+                    provider="openai", api_key="mock", api_base_url=large.base_url, model_name="large-model",
+                    model_tiers={"fast": {"model_name": "small-model", "base_url": small.base_url}},
+                    purpose_tiers={"routing": "fast", "decision": "fast"}
+                ))
+                
+                assert await client.send_prompt("选择智能体", use_cache=False, purpose="routing") == "小模型"
+                assert await client.send_prompt("决定下一位发言者", use_cache=False, purpose="decision") == "小模型"
+                assert await client.send_prompt("生成代码", use_cache=False, purpose="generation") == "大模型"
+                assert large.stats["requests"] == 1 and small.stats["requests"] == 2
+                assert client._get_model_name("routing") == "small-model"
+                assert client._get_model_name("generation") == "large-model"
+                await client.close()
+            
+            self.record_test_result(test_name, True, "控制类调用路由到小模型，生成调用使用默认模型")
+            
+        except Exception as e:
+            self.record_test_result(test_name, False, f"模型档位路由测试失败: {str(e)}")
+    
+    async def test_deadline_propagation(self):
+        """测试对话截止时间向LLM请求传递"""
+        test_name = "截止时间传递测试"
+        
+        try:
+            async with MockLLMServer(latency=2.0) as server:
+                client = EnhancedLLMClient(LLMConfig(provider="openai", api_key="mock",
+                                                     api_base_url=server.base_url))
+                
+                # 截止时间已过：不发出请求，直接抛出DeadlineExceededError
+                try:
+                    with llm_call_scope(deadline=time.time() - 1):
+                        await client.send_prompt("设计一个计数器", use_cache=False)
+                    assert False, "截止时间已过的请求应当失败"
+                except DeadlineExceededError:
+                    pass
+                assert server.stats["requests"] == 0
+                
+                # 协调者的对话超时收紧进行中的LLM请求，而不是等待完整的服务端延迟
+                coordinator_config = CoordinatorConfig(conversation_timeout=0.3)
+                coordinator = CentralizedCoordinator(
+                    FrameworkConfig(coordinator_config=coordinator_config), client)
+                start = time.time()
+                result = await coordinator.coordinate_task_execution("设计一个计数器")
+                elapsed = time.time() - start
+                
+                assert not result["success"]
+                assert elapsed < 1.0, f"截止时间未传递到LLM请求: {elapsed:.2f}s"
+                assert server.stats["requests"] == 1
+                # 唯一的等待方超时后，进行中的共享请求随之取消
+                await asyncio.sleep(0.05)
+                assert not EnhancedLLMClient._inflight_requests, "共享请求未随等待方超时取消"
+                await client.close()
+            
+            class InnerTimeoutAgent(BaseAgent):
+                def __init__(self):
+                    super().__init__("inner_timeout_agent", "test_engineer", {AgentCapability.TEST_GENERATION})
+                
+                def get_capabilities(self):
+                    return self._capabilities
+                
+                def get_specialty_description(self):
+                    return "内部操作超时测试智能体"
+                
+                async def execute_enhanced_task(self, enhanced_prompt, original_message, file_contents):
+                    raise asyncio.TimeoutError("仿真子进程超时")
+            
+            # 截止时间未到时，内部操作的超时是普通失败而不是对话超时
+            agent_result = await InnerTimeoutAgent().process_task_with_file_references(TaskMessage(
+                task_id="inner_timeout", sender_id="tester", receiver_id="inner_timeout_agent",
+                message_type="task_execution", content="运行仿真",
+                metadata={"deadline": time.time() + 60}
+            ))
+            assert not agent_result["success"] and not agent_result.get("timed_out")
+            
+            self.record_test_result(test_name, True, f"对话超时后LLM请求在 {elapsed:.2f}s 内取消")
+            
+        except Exception as e:
+            self.record_test_result(test_name, False, f"截止时间传递测试失败: {type(e).__name__}: {str(e)}")
+    
+    async def test_adaptive_max_tokens(self):
+        """测试按调用点历史收紧max_tokens并在截断时续写"""
+        test_name = "自适应生成上限测试"
+        
+        try:
+            full = "".join(f"assign out[{i}] = in[{i}];\n" for i in range(40))
+            
+            def responder(messages):
+                # 续写请求包含已输出内容，返回剩余部分
+                return full[len(messages[-2]["content"]):] if len(messages) > 1 else full
+            
+            for _ in range(10):
+                max_tokens_predictor.record(None, "adaptive_test", 50)
+            
+            async with MockLLMServer(responder=responder) as server:
+                client = EnhancedLLMClient(LLMConfig(provider="openai", api_key="mock",
+                                                     api_base_url=server.base_url,
+                                                     adaptive_max_tokens=True))
+                result = await client.send_prompt("生成赋值语句", max_tokens=2000, use_cache=False,
+                                                  purpose="adaptive_test")
+                
+                # 历史p95为50 tokens，首个请求上限被收紧并截断，续写后得到完整输出
+                assert result == full
+                assert client.stats["continuations"] == 1
+                assert server.stats["requests"] == 2
+                await client.close()
+            
+            self.record_test_result(test_name, True, "生成上限按历史收紧，截断后续写得到完整输出")
+            
+        except Exception as e:
+            self.record_test_result(test_name, False, f"自适应生成上限测试失败: {str(e)}")
+    
+    async def test_json_repair(self):
+        """测试LLM JSON输出修复与截断续写"""
+        test_name = "JSON修复与续写测试"
+        
+        try:
+            assert parse_llm_json('```json\n{"a": [1, 2,], "b": {"c": "x",},}\n```') == {"a": [1, 2], "b": {"c": "x"}}
+            assert parse_llm_json('分析结果如下：{"module": "counter"} 以上') == {"module": "counter"}
+            assert parse_llm_json('{"ports": ["clk", "rst"], "code": "module a;\nend') == {
+                "ports": ["clk", "rst"], "code": "module a;\nend"}
+            assert parse_llm_json('{"complexity": 5, "type": tr') == {"complexity": 5}
+            
+            # 截断的JSON通过续写请求补全
+            full = json.dumps({"module_name": "counter", "ports": ["clk", "rst", "en", "count"]})
+            
+            def responder(messages):
+                return full[len(full) // 2:] if len(messages) > 1 else full[:len(full) // 2]
+            
+            async with MockLLMServer(responder=responder) as server:
+                client = EnhancedLLMClient(LLMConfig(provider="openai", api_key="mock",
+                                                     api_base_url=server.base_url))
+                result = await client.send_json_prompt("分析计数器", use_cache=False)
+                assert result == json.loads(full)
+                assert client.stats["continuations"] == 1
+                await client.close()
+            
+            self.record_test_result(test_name, True, "代码块、尾随逗号、截断修复及续写正常")
+            
+        except Exception as e:
+            self.record_test_result(test_name, False, f"JSON修复测试失败: {str(e)}")
+    
+    async def test_batch_jobs(self):
+        """测试批处理作业：本地处理器、OpenAI批处理接口及截止时间回退"""
+        test_name = "批处理作业测试"
+        
+        try:
+            async with MockLLMServer() as server:
+                client = EnhancedLLMClient(LLMConfig(provider="openai", api_key="mock",
+                                                     api_base_url=server.base_url))
+                
+                # 本地处理器：多次submit后一次flush只产生一个作业
+                local_queue = create_batch_queue(client)
+                futures = [local_queue.submit([{"role": "user", "content": f"审查模块{i}"}]) for i in range(3)]
+                await local_queue.flush()
+                assert [f.result() for f in futures] == [f"MOCK RESPONSE: 审查模块{i}" for i in range(3)]
+                assert local_queue.stats["jobs"] == 1 and local_queue.stats["succeeded"] == 3
+                
+                # OpenAI兼容接口：上传作业文件、轮询、下载结果
+                processor = OpenAIBatchProcessor(server.base_url, "mock", poll_interval=0.05)
+                openai_queue = LLMBatchQueue(processor, llm_client=client, job_dir="./output/batch_jobs")
+                futures = [openai_queue.submit_prompt(prompt) for prompt in ("审查加法器", "审查计数器")]
+                await openai_queue.flush()
+                assert [f.result() for f in futures] == ["MOCK RESPONSE: 审查加法器", "MOCK RESPONSE: 审查计数器"]
+                assert server.stats["by_path"]["/batches"] == 1
+                
+                # 作业在截止时间前未完成：取消作业并改为交互式请求
+                server.batch_delay = None
+                processor.fallback_reserve = 0.2
+                interactive_before = server.stats["by_path"]["/chat/completions"]
+                with llm_call_scope(deadline=time.time() + 0.5):
+                    future = openai_queue.submit_prompt("审查译码器")
+                    await openai_queue.flush()
+                assert future.result() == "MOCK RESPONSE: 审查译码器"
+                assert openai_queue.stats["fallbacks"] == 1
+                assert server.stats["by_path"]["/batches/cancel"] == 1
+                assert server.stats["by_path"]["/chat/completions"] == interactive_before + 1
+                
+                await client.close()
+                
+                # 离线驱动跨多次审查累积文件，统一提交为一个作业
+                reviewer = RealCodeReviewAgent(FrameworkConfig(llm_config=LLMConfig(
+                    provider="openai", api_key="mock", api_base_url=server.base_url)))
+                reviewer.queue_batch_reviews({"uart/uart.v": "module uart; endmodule"}, "夜间审查: uart")
+                assert reviewer.queue_batch_reviews({"fifo/fifo.v": "module fifo; endmodule",
+                                                     "fifo/ram.v": "module ram; endmodule"}, "夜间审查: fifo") == 3
+                reviews = await reviewer.flush_batch_reviews()
+                assert [r["file_path"] for r in reviews] == ["uart/uart.v", "fifo/fifo.v", "fifo/ram.v"]
+                assert reviewer.batch_queue.stats["jobs"] == 1
+                await reviewer.llm_client.close()
+            
+            self.record_test_result(test_name, True, "批处理作业执行正常，跨审查累积后统一提交，截止时间前未完成时回退为交互式请求")
+            
+        except Exception as e:
+            self.record_test_result(test_name, False, f"批处理作业测试失败: {type(e).__name__}: {str(e)}")
+    
+    async def test_native_tool_calling_fallback(self):
+        """测试原生工具调用被拒绝后退回文本协议"""
+        test_name = "原生工具调用回退测试"
+        
+        try:
+            text_requests = []
+            
+            def responder(messages):
+                if any(m.get("role") == "tool" for m in messages):
+                    # 模拟不接受tool角色消息的提供商
+                    return {"status": 400, "error": "tool messages are not supported"}
+                if any("工具调用结果" in (m.get("content") or "") for m in messages):
+                    text_requests.append(messages)
+                    return "计算完成，结果是3"
+                return {"content": "", "tool_calls": [{"name": "add", "arguments": {"a": 1, "b": 2}}]}
+            
+            async with MockLLMServer(responder=responder) as server:
+                client = EnhancedLLMClient(LLMConfig(provider="openai", api_key="mock",
+                                                     api_base_url=server.base_url))
+                
+                class AdderAgent(FunctionCallingAgent):
+                    native_tool_calling = True
+                    
+                    def __init__(self, llm_client):
+                        self.llm_client = llm_client
+                        super().__init__()
+                    
+                    def _register_tools(self):
+                        self.tool_registry.register_tool(
+                            "add", lambda a, b: a + b, "两数相加",
+                            {"a": {"type": "integer", "required": True},
+                             "b": {"type": "integer", "required": True}})
+                    
+                    def _get_base_system_prompt(self):
+                        return "你是计算助手"
+                
+                result = await AdderAgent(client).process_with_function_calling("计算1+2")
+                assert result == "计算完成，结果是3"
+                
+                # 回退后的请求只含文本协议消息：工具目录在system prompt中，调用与结果均为文本
+                messages = text_requests[0]
+                assert {m["role"] for m in messages} <= {"system", "user", "assistant"}
+                assert not any("tool_calls" in m for m in messages)
+                assert "可用工具" in messages[0]["content"]
+                assert '"tool_name": "add"' in messages[2]["content"]
+                assert "3" in messages[3]["content"]
+                
+                # 400不计为端点故障，也不重试
+                endpoint = client.endpoint_pool.endpoints[0]
+                assert client.stats["client_errors"] == 1
+                assert endpoint.stats["failures"] == 0 and endpoint.is_healthy()
+                assert server.stats["requests"] == 3
+                await client.close()
+            
+            # 5xx等暂时性错误不切换到文本协议，直接抛出
+            async with MockLLMServer(responder=lambda messages: {"status": 503, "error": "overloaded"}) as server:
+                client = EnhancedLLMClient(LLMConfig(provider="openai", api_key="mock",
+                                                     api_base_url=server.base_url,
+                                                     retry_attempts=1, retry_delay=0.01))
+                try:
+                    await AdderAgent(client).process_with_function_calling("计算1+2")
+                    assert False, "5xx不应退回文本协议"
+                except AssertionError:
+                    raise
+                except Exception:
+                    pass
+                assert server.stats["requests"] == 1
+                await client.close()
+            
+            self.record_test_result(test_name, True, "4xx不计为端点故障，对话改写为文本协议后完成；5xx直接抛出")
+            
+        except Exception as e:
+            self.record_test_result(test_name, False, f"原生工具调用回退测试失败: {type(e).__name__}: {str(e)}")
+    
     async def test_agent_creation_and_registration(self):
         """测试智能体创建和注册"""
         test_name = "智能体创建和注册测试"
@@ -169,6 +1002,55 @@ class FrameworkTester:
         except Exception as e:
             self.record_test_result(test_name, False, f"任务分析失败: {str(e)}")
     
+    async def test_task_analysis_cache(self):
+        """测试按归一化任务描述的分析缓存"""
+        test_name = "任务分析缓存测试"
+        
+        try:
+            analysis = {"task_type": "design", "complexity": 4, "required_capabilities": ["code_generation"]}
+            async with MockLLMServer(responder=lambda messages: json.dumps(analysis)) as server:
+                llm_config = LLMConfig(provider="openai", api_key="mock", api_base_url=server.base_url)
+                coordinator_config = CoordinatorConfig(enable_analysis_cache=True,
+                                                       analysis_cache_path="analysis_cache_test.db")
+                config = FrameworkConfig(llm_config=llm_config, coordinator_config=coordinator_config)
+                client = EnhancedLLMClient(llm_config)
+                
+                coordinator = CentralizedCoordinator(config, client)
+                first = await coordinator.analyze_task_requirements("设计一个8位加法器")
+                second = await coordinator.analyze_task_requirements("  设计一个32位加法器。")
+                
+                # 新的协调者实例（模拟重启）从持久化缓存读取
+                restarted = CentralizedCoordinator(config, client)
+                third = await restarted.analyze_task_requirements("设计一个16位加法器", {"source": "test"})
+                
+                assert server.stats["requests"] == 1
+                assert first["task_type"] == second["task_type"] == third["task_type"] == "design"
+                assert third["context"] == {"source": "test"}
+                assert coordinator.analysis_cache.get_stats()["hit_rate"] == 0.5
+                
+                # 分析调用路由到小模型档位时按实际模型分键，不复用大模型的分析结果
+                tiered_config = LLMConfig(provider="openai", api_key="mock", api_base_url=server.base_url,
+                                          model_tiers={"small": {"model_name": "small-model",
+                                                                 "base_url": server.base_url}},
+                                          purpose_tiers={"analysis": "small"})
+                tiered_client = EnhancedLLMClient(tiered_config)
+                tiered = CentralizedCoordinator(
+                    FrameworkConfig(llm_config=tiered_config, coordinator_config=coordinator_config),
+                    tiered_client)
+                assert tiered.analysis_cache.model_name == "small-model"
+                await tiered.analyze_task_requirements("设计一个8位加法器")
+                assert server.stats["requests"] == 2
+                
+                for c in (coordinator, restarted, tiered):
+                    c.analysis_cache.close()
+                await client.close()
+                await tiered_client.close()
+            
+            self.record_test_result(test_name, True, "同一模板任务复用分析结果，缓存跨实例持久化并按分析模型分键")
+            
+        except Exception as e:
+            self.record_test_result(test_name, False, f"任务分析缓存测试失败: {str(e)}")
+    
     async def test_agent_selection(self):
         """测试智能体选择功能"""
         test_name = "智能体选择功能测试"
@@ -203,6 +1085,17 @@ class FrameworkTester:
             selected_agent = await coordinator.select_best_agent(test_task_analysis)
             assert selected_agent == "verilog_test_agent"
             
+            # 能力唯一匹配时不调用LLM（传入无法调用的客户端）
+            coordinator.llm_client = object()
+            selected_agent = await coordinator.select_best_agent(design_task_analysis)
+            assert selected_agent == "verilog_design_agent"
+            assert coordinator.routing_stats["llm"] == 0
+            
+            # 注销后能力索引同步更新
+            coordinator.unregister_agent("verilog_test_agent")
+            assert "verilog_test_agent" not in coordinator.capability_index.get(
+                AgentCapability.TEST_GENERATION, set())
+            
             self.record_test_result(test_name, True, "智能体选择逻辑正常")
             
         except Exception as e:
@@ -307,6 +1200,173 @@ endmodule
         except Exception as e:
             self.record_test_result(test_name, False, f"对话流程失败: {str(e)}")
     
+    async def test_concurrent_conversations(self):
+        """测试同一协调者上并发运行多个对话"""
+        test_name = "并发对话测试"
+        
+        try:
+            config = FrameworkConfig()
+            coordinator = CentralizedCoordinator(config)
+            coordinator.register_agent(VerilogDesignAgent())
+            
+            tasks = [f"设计一个{width}位计数器" for width in (4, 8, 16, 32)]
+            results = await asyncio.gather(*(coordinator.coordinate_task_execution(task) for task in tasks))
+            
+            conversation_ids = [result["conversation_id"] for result in results]
+            assert len(set(conversation_ids)) == len(tasks)
+            for result in results:
+                assert all(record["conversation_id"] == result["conversation_id"]
+                           for record in result.get("conversation_history", []))
+            assert not coordinator.conversations
+            
+            self.record_test_result(test_name, True, f"并发完成 {len(results)} 个对话，ID互不冲突")
+            
+        except Exception as e:
+            self.record_test_result(test_name, False, f"并发对话测试失败: {str(e)}")
+    
+    async def test_review_pipeline(self):
+        """测试设计→评审流水线端到端执行：每个文件只评审一次，评审用量计入对话"""
+        test_name = "评审流水线测试"
+        
+        try:
+            def responder(messages):
+                prompt = messages[-1]["content"]
+                if "Analyze the following task" in prompt:
+                    return json.dumps({"task_type": "design", "complexity": 8,
+                                       "required_capabilities": ["code_generation"]})
+                if "决定下一个最适合的智能体" in prompt:
+                    # 流水线运行期间评审智能体不应被选为发言者
+                    return "pipeline_reviewer"
+                if prompt.startswith("评审"):
+                    return "LGTM"
+                return "module m; endmodule"
+            
+            class PipelineDesigner(BaseAgent):
+                def __init__(self, llm_client):
+                    super().__init__("pipeline_designer", "design_engineer", {AgentCapability.CODE_GENERATION})
+                    self.llm_client = llm_client
+                    self.rounds = 0
+                
+                def get_capabilities(self):
+                    return self._capabilities
+                
+                def get_specialty_description(self):
+                    return "流水线测试设计智能体"
+                
+                async def execute_enhanced_task(self, enhanced_prompt, original_message, file_contents):
+                    self.rounds += 1
+                    refs = []
+                    for module in ("uart", "fifo"):
+                        code = await self.llm_client.send_prompt(f"设计{module}", use_cache=False)
+                        refs.append(await self.save_result_to_file(code, f"./output/pipeline/{module}.v", "verilog"))
+                    return {"success": True, "message": "模块已生成",
+                            "file_references": [ref.to_dict() for ref in refs]}
+            
+            class PipelineReviewer(BaseAgent):
+                def __init__(self, llm_client):
+                    super().__init__("pipeline_reviewer", "review_engineer", {AgentCapability.CODE_REVIEW})
+                    self.llm_client = llm_client
+                    self.reviewed = []
+                
+                def get_capabilities(self):
+                    return self._capabilities
+                
+                def get_specialty_description(self):
+                    return "流水线测试评审智能体"
+                
+                async def execute_enhanced_task(self, enhanced_prompt, original_message, file_contents):
+                    file_path = original_message.file_references[0].file_path
+                    self.reviewed.append(file_path)
+                    await self.llm_client.send_prompt(f"评审{file_path}", use_cache=False)
+                    return {"success": True, "message": f"已评审 {file_path}"}
+            
+            async with MockLLMServer(responder=responder) as server:
+                client = EnhancedLLMClient(LLMConfig(provider="openai", api_key="mock",
+                                                     api_base_url=server.base_url))
+                config = FrameworkConfig()
+                config.coordinator.enable_review_pipeline = True
+                config.coordinator.enable_analysis_cache = False
+                coordinator = CentralizedCoordinator(config, client)
+                designer = PipelineDesigner(client)
+                reviewer = PipelineReviewer(client)
+                coordinator.register_agent(designer)
+                coordinator.register_agent(reviewer)
+                
+                result = await coordinator.coordinate_task_execution("设计UART和FIFO模块")
+                conversation_id = result["conversation_id"]
+                
+                assert result["success"] and designer.rounds == 1
+                assert sorted(reviewer.reviewed) == ["./output/pipeline/fifo.v", "./output/pipeline/uart.v"]
+                assert [review["success"] for review in result["pipeline_reviews"]] == [True, True]
+                speakers = [record["speaker_id"] for record in result["conversation_history"]]
+                assert speakers.count("pipeline_designer") == 1 and speakers.count("pipeline_reviewer") == 2
+                
+                # 流水线中的评审智能体不会被下一发言者决策选中
+                decision = await coordinator._decide_next_speaker(
+                    {"success": True}, [], {"task_type": "design"}, excluded_agents={"pipeline_reviewer"})
+                assert decision is None
+                assert await coordinator._decide_next_speaker(
+                    {"success": True}, [], {"task_type": "design"}) == "pipeline_reviewer"
+                
+                # 评审调用记在"{对话ID}.review_*"下，对话统计中一并汇总
+                usage = coordinator.get_conversation_statistics(conversation_id)["token_usage"]
+                assert usage["by_agent"]["pipeline_reviewer"]["requests"] == 2
+                assert usage["by_agent"]["pipeline_designer"]["requests"] == 2
+                assert f"{conversation_id}.review_uart" in usage["conversations"]
+                assert result["token_usage"]["total"]["requests"] == usage["total"]["requests"]
+                await client.close()
+            
+            self.record_test_result(test_name, True, "流水线评审每个文件一次，评审用量计入对话统计")
+            
+        except Exception as e:
+            self.record_test_result(test_name, False, f"评审流水线测试失败: {type(e).__name__}: {str(e)}")
+    
+    async def test_task_graph(self):
+        """测试子任务依赖图的并行调度"""
+        test_name = "任务依赖图测试"
+        
+        try:
+            graph = TaskGraph.from_dict({"subtasks": [
+                {"id": "uart", "description": "设计UART"},
+                {"id": "fifo", "description": "设计FIFO"},
+                {"id": "alu", "description": "设计ALU"},
+                {"id": "top", "description": "集成顶层", "depends_on": ["uart", "fifo", "alu"]},
+                {"id": "tb", "description": "ALU测试台", "depends_on": ["alu"]}
+            ]})
+            
+            async def runner(subtask, upstream):
+                await asyncio.sleep(0.2)
+                return {
+                    "success": subtask.task_id != "alu",
+                    "file_references": [FileReference(f"{subtask.task_id}.v", "verilog", subtask.description)],
+                    "upstream": [task.task_id for task in upstream]
+                }
+            
+            start_time = time.time()
+            success = await graph.execute(runner, max_parallel=4)
+            elapsed = time.time() - start_time
+            
+            assert success == False
+            assert elapsed < 0.4  # 三个独立子任务并行
+            assert graph.subtasks["uart"].status == SubTaskStatus.COMPLETED
+            assert graph.subtasks["alu"].status == SubTaskStatus.FAILED
+            assert graph.subtasks["top"].status == SubTaskStatus.SKIPPED
+            assert graph.subtasks["tb"].status == SubTaskStatus.SKIPPED
+            
+            try:
+                TaskGraph.from_dict({"subtasks": [
+                    {"id": "a", "description": "A", "depends_on": ["b"]},
+                    {"id": "b", "description": "B", "depends_on": ["a"]}
+                ]})
+                assert False, "未检测到依赖环"
+            except TaskGraphError:
+                pass
+            
+            self.record_test_result(test_name, True, f"并行调度耗时 {elapsed:.2f}s，失败分支已跳过")
+            
+        except Exception as e:
+            self.record_test_result(test_name, False, f"任务依赖图测试失败: {str(e)}")
+    
     async def test_error_handling(self):
         """测试错误处理"""
         test_name = "错误处理测试"
@@ -351,12 +1411,36 @@ endmodule
             # 按顺序运行测试
             await self.test_config_loading()
             await self.test_llm_client_creation()
+            await self.test_llm_response_cache()
+            await self.test_concurrency_limiter()
+            await self.test_rate_limit_priority()
+            await self.test_default_priority_lanes()
+            await self.test_mock_server_and_cassette()
+            await self.test_request_coalescing()
+            await self.test_coalescing_call_context()
+            await self.test_model_warm_up()
+            await self.test_pooled_session()
+            await self.test_streaming()
+            await self.test_endpoint_rate_limiting()
+            await self.test_endpoint_failover()
+            await self.test_circuit_breaker()
+            await self.test_hedged_requests()
+            await self.test_model_tiering()
+            await self.test_deadline_propagation()
+            await self.test_adaptive_max_tokens()
+            await self.test_json_repair()
+            await self.test_batch_jobs()
+            await self.test_native_tool_calling_fallback()
             await self.test_agent_creation_and_registration()
             await self.test_task_analysis()
+            await self.test_task_analysis_cache()
             await self.test_agent_selection()
             await self.test_file_operations()
             await self.test_task_message_processing()
             await self.test_conversation_flow()
+            await self.test_concurrent_conversations()
+            await self.test_task_graph()
+            await self.test_review_pipeline()
             await self.test_error_handling()
             
         finally: